@@ -0,0 +1,312 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Progress callback handed to a running job: (stage, fraction done)
+Progress = Callable[[str, float], Awaitable[None]]
+
+# Table of the job store; created on first use in whatever database it is given
+_metadata = MetaData()
+analysis_jobs_table = Table(
+    "analysis_jobs",
+    _metadata,
+    Column("id", String(32), primary_key=True),
+    Column("status", String(16), nullable=False, index=True),
+    Column("stage", String(32), nullable=False),
+    Column("progress", Float, nullable=False),
+    Column("request", Text, nullable=False),
+    Column("upload_path", Text, nullable=False),
+    Column("index_path", Text, nullable=True),
+    Column("result", Text, nullable=True),
+    Column("error", Text, nullable=True),
+    Column("attempts", Integer, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+    Column("started_at", Float, nullable=True),
+    Column("finished_at", Float, nullable=True),
+    Column("heartbeat_at", Float, nullable=True),
+)
+
+
+class AnalysisJobStore:
+    """
+    Analysis jobs in an SQL table, shared by every worker process and kept across restarts
+
+    A job is queued with its request (JSON) and the path of its saved
+    upload, claimed by exactly one worker (a conditional UPDATE, so
+    concurrent claimers cannot both win), then completed with a JSON
+    result or failed with an error. Running jobs refresh heartbeat_at;
+    requeue_stale() hands jobs whose worker went away to another one.
+    """
+
+    def __init__(self, engine: Engine, clock: Callable[[], float] = time.time):
+        self.engine = engine
+        self.clock = clock
+        _metadata.create_all(engine, tables=[analysis_jobs_table])
+
+    def submit(
+        self,
+        request: Dict[str, Any],
+        upload_path: str,
+        index_path: Optional[str] = None,
+        job_id: Optional[str] = None
+    ) -> str:
+        """Queue a job and return its ID"""
+        job_id = job_id or new_job_id()
+        with self.engine.begin() as conn:
+            conn.execute(insert(analysis_jobs_table).values(
+                id=job_id, status=JOB_QUEUED, stage=JOB_QUEUED, progress=0.0, request=json.dumps(request),
+                upload_path=upload_path, index_path=index_path, attempts=0, created_at=self.clock(),
+            ))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job with its request and result decoded, or None"""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(analysis_jobs_table).where(analysis_jobs_table.c.id == job_id)).mappings().first()
+        return _decoded(row) if row is not None else None
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job for this worker, or None when the queue is empty"""
+        table = analysis_jobs_table
+        while True:
+            with self.engine.begin() as conn:
+                job_id = conn.execute(
+                    select(table.c.id).where(table.c.status == JOB_QUEUED).order_by(table.c.created_at).limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                now = self.clock()
+                claimed = conn.execute(
+                    update(table)
+                    .where(table.c.id == job_id, table.c.status == JOB_QUEUED)
+                    .values(status=JOB_RUNNING, attempts=table.c.attempts + 1, started_at=now, heartbeat_at=now)
+                ).rowcount
+            if claimed:
+                return self.get(job_id)
+
+    def progress(self, job_id: str, stage: str, fraction: float):
+        """Record a running job's stage and progress (also a heartbeat)"""
+        self._update_running(job_id, stage=stage, progress=round(fraction, 4), heartbeat_at=self.clock())
+
+    def heartbeat(self, job_id: str):
+        """Mark a running job as still being worked on"""
+        self._update_running(job_id, heartbeat_at=self.clock())
+
+    def complete(self, job_id: str, result: Any):
+        """Store a job's result"""
+        self._update_running(
+            job_id, status=JOB_COMPLETED, stage=JOB_COMPLETED, progress=1.0,
+            result=json.dumps(result), finished_at=self.clock(),
+        )
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job as failed"""
+        self._update_running(job_id, status=JOB_FAILED, stage=JOB_FAILED, error=error, finished_at=self.clock())
+
+    def _update_running(self, job_id: str, **values):
+        table = analysis_jobs_table
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id == job_id, table.c.status == JOB_RUNNING).values(**values))
+
+    def requeue_stale(self, stale_seconds: float, max_attempts: int) -> int:
+        """
+        Requeue running jobs without a heartbeat for stale_seconds
+
+        Jobs that already had max_attempts fail instead, so an upload
+        that crashes its worker is not retried forever.
+
+        Returns:
+            Number of jobs requeued or failed
+        """
+        table = analysis_jobs_table
+        now = self.clock()
+        stale = (table.c.status == JOB_RUNNING) & (table.c.heartbeat_at < now - stale_seconds)
+        with self.engine.begin() as conn:
+            failed = conn.execute(update(table).where(stale, table.c.attempts >= max_attempts).values(
+                status=JOB_FAILED, stage=JOB_FAILED, finished_at=now,
+                error=f"Abandoned after {max_attempts} attempts",
+            )).rowcount
+            requeued = conn.execute(update(table).where(stale).values(status=JOB_QUEUED, stage=JOB_QUEUED)).rowcount
+        return failed + requeued
+
+    def purge(self, older_than_seconds: float) -> List[str]:
+        """
+        Delete jobs finished more than older_than_seconds ago
+
+        Returns:
+            Upload and index paths of the deleted jobs, for cleanup
+        """
+        table = analysis_jobs_table
+        finished = table.c.status.in_([JOB_COMPLETED, JOB_FAILED]) & (
+            table.c.finished_at < self.clock() - older_than_seconds
+        )
+        with self.engine.begin() as conn:
+            rows = conn.execute(select(table.c.upload_path, table.c.index_path).where(finished)).all()
+            conn.execute(delete(table).where(finished))
+        return [path for row in rows for path in row if path]
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs by status"""
+        table = analysis_jobs_table
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(table.c.status, func.count()).group_by(table.c.status)).all()
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED)}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+
+def new_job_id() -> str:
+    return f"JOB-{uuid.uuid4().hex[:12].upper()}"
+
+
+def _decoded(row) -> Dict[str, Any]:
+    job = dict(row)
+    job["request"] = json.loads(job["request"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+def remove_files(paths: List[Optional[str]]):
+    """Delete job files that still exist"""
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+class AnalysisWorkerPool:
+    """
+    Runs queued analysis jobs on this process's event loop, at most `workers` at once
+
+    Every server process runs its own pool against the shared job store,
+    so jobs submitted to any process are picked up by whichever has a
+    free worker. Idle workers poll the store every poll_seconds (a job
+    submitted to this process wakes them at once). While a job runs its
+    heartbeat is refreshed; the pool also requeues other processes'
+    stale jobs and purges old finished ones with their files.
+    """
+
+    def __init__(
+        self,
+        store: AnalysisJobStore,
+        run_job: Callable[[Dict[str, Any], Progress], Awaitable[Any]],
+        workers: int = 2,
+        poll_seconds: float = 1.0,
+        stale_seconds: float = 300.0,
+        max_attempts: int = 3,
+        retention_seconds: float = 86400.0
+    ):
+        self.store = store
+        self.run_job = run_job
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.completed = 0
+        self.failed = 0
+        self.running: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._next_maintenance = 0.0
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; their jobs are requeued once their heartbeat goes stale"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers for a newly queued job"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._maintain()
+                job = await asyncio.to_thread(self.store.claim)
+            except Exception as e:
+                logger.warning("Analysis job queue error: %r", e)
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except Exception:
+                # Left running; requeued once its heartbeat goes stale
+                logger.exception("Analysis job %s error", job["id"])
+
+    async def _maintain(self):
+        now = time.monotonic()
+        if now < self._next_maintenance:
+            return
+        self._next_maintenance = now + self.stale_seconds / 2
+        await asyncio.to_thread(self.store.requeue_stale, self.stale_seconds, self.max_attempts)
+        paths = await asyncio.to_thread(self.store.purge, self.retention_seconds)
+        await asyncio.to_thread(remove_files, paths)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        self.running.add(job_id)
+
+        async def progress(stage: str, fraction: float):
+            await asyncio.to_thread(self.store.progress, job_id, stage, fraction)
+
+        async def beat():
+            while True:
+                await asyncio.sleep(self.stale_seconds / 3)
+                await asyncio.to_thread(self.store.heartbeat, job_id)
+
+        heartbeat = asyncio.ensure_future(beat())
+        try:
+            try:
+                result = await self.run_job(job, progress)
+            except asyncio.CancelledError:
+                # Left running, with its files, for another worker to requeue
+                raise
+            except Exception as e:
+                # HTTPException-style errors carry their message in .detail
+                await asyncio.to_thread(self.store.fail, job_id, str(getattr(e, "detail", None) or e))
+                self.failed += 1
+            else:
+                await asyncio.to_thread(self.store.complete, job_id, result)
+                self.completed += 1
+            await asyncio.to_thread(remove_files, [job["upload_path"], job["index_path"]])
+        finally:
+            heartbeat.cancel()
+            self.running.discard(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker counters and the shared queue's jobs by status"""
+        return {
+            "workers": self.workers,
+            "running_here": len(self.running),
+            "completed_here": self.completed,
+            "failed_here": self.failed,
+            "jobs": self.store.counts(),
+        }
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker over a rolling window of call outcomes and latencies
+
+    While closed, every call is allowed and its outcome recorded; once the
+    window holds at least min_calls outcomes and either the error rate or
+    the share of calls slower than slow_call_seconds reaches its threshold,
+    the breaker opens and rejects calls for open_seconds. It then turns
+    half-open and lets half_open_probes calls through: if they all succeed
+    (and are not slow) it closes with a fresh window, otherwise it opens
+    again. Thread-safe; callers use allow() before a call and record() after.
+    """
+
+    def __init__(
+        self,
+        window_size: int = 20,
+        min_calls: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self.state = CLOSED
+        self.times_opened = 0
+        self.rejected = 0
+        # (succeeded, seconds) of the most recent calls
+        self._window: Deque[Tuple[bool, float]] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probes_left = 0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; a True while half-open uses up a probe"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes_left = self.half_open_probes
+                self._probes_in_flight = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_left > 0:
+                self._probes_left -= 1
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, succeeded: bool, seconds: float):
+        """Record the outcome of an allowed call"""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not succeeded or slow:
+                    self._open()
+                elif self._probes_left == 0 and self._probes_in_flight == 0:
+                    self.state = CLOSED
+                    self._window.clear()
+                return
+            self._window.append((succeeded, seconds))
+            if self.state == CLOSED and len(self._window) >= self.min_calls:
+                errors, slow_calls = self._counts()
+                if (errors / len(self._window) >= self.error_rate_threshold
+                        or slow_calls / len(self._window) >= self.slow_call_rate_threshold):
+                    self._open()
+
+    def release(self):
+        """Give back an allowed call that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+                self._probes_left += 1
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self.times_opened += 1
+
+    def _counts(self) -> Tuple[int, int]:
+        errors = sum(1 for succeeded, _ in self._window if not succeeded)
+        slow_calls = sum(1 for _, seconds in self._window if seconds >= self.slow_call_seconds)
+        return errors, slow_calls
+
+    def stats(self) -> Dict:
+        """State and rolling-window figures for monitoring"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                state = HALF_OPEN
+            else:
+                state = self.state
+            calls = len(self._window)
+            errors, slow_calls = self._counts()
+            latencies = sorted(seconds for _, seconds in self._window)
+        return {
+            "state": state,
+            "window_calls": calls,
+            "error_rate": round(errors / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(slow_calls / calls, 4) if calls else 0.0,
+            "latency_p50_seconds": round(latencies[calls // 2], 3) if calls else None,
+            "latency_p95_seconds": round(latencies[min(calls - 1, calls * 95 // 100)], 3) if calls else None,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -70,6 +70,18 @@ class VCFRecord(Base):
     status = Column(String, default="pending")  # pending, analyzing, completed, failed
 
 
+class PharmacogenomicPassport(Base):
+    __tablename__ = "pharmacogenomic_passports"
+
+    id = Column(String, primary_key=True, index=True)
+    patient_id = Column(String, index=True)
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded VCF
+    knowledge_base_version = Column(String)
+    filename = Column(String)
+    passport = Column(Text)  # JSON: per-gene calls, per-drug outcomes, target variants
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,60 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from app.engines.drug_genotype import drug_outcome, resolve_drug_genotype
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+from app.parsers.cohort import CohortGenotypes
+
+
+def assess_cohort(
+    cohort: CohortGenotypes,
+    drugs: List[str],
+    drug_genes: Dict[str, Sequence[str]],
+    engine: Optional[RiskAssessmentEngine] = None,
+) -> Iterator[Dict]:
+    """
+    Infer phenotype and risk for every sample of a cohort
+
+    A sample's outcome for a drug depends only on how many ALT alleles it
+    carries at each relevant site. The ALT count matrix is computed once
+    with NumPy and collapsed to its distinct per-sample patterns; each
+    pattern is resolved once with the single-patient logic (carried sites
+    get the sample's zygosity) and the outcome is broadcast back to every
+    sample sharing it. A cohort row therefore matches uploading that
+    sample on its own.
+
+    Args:
+        cohort: Parsed cohort genotypes
+        drugs: Normalized drug IDs / labels
+        drug_genes: Drug -> relevant genes
+        engine: Risk engine to use; defaults to get_engine()
+
+    Yields:
+        {"sample": name, "results": [per-drug outcome, ...]} in header order
+    """
+    engine = engine or get_engine()
+    copies = cohort.alt_copies()
+    sample_count = len(cohort.samples)
+    genes = np.array([variant.gene for variant in cohort.variants], dtype=object)
+
+    per_drug = []
+    for drug in drugs:
+        rows = np.flatnonzero(np.isin(genes, drug_genes[drug])) if len(genes) else np.empty(0, dtype=np.intp)
+        patterns, inverse = np.unique(
+            copies[rows].T.reshape(sample_count, len(rows)), axis=0, return_inverse=True
+        )
+        outcomes = []
+        for pattern in patterns:
+            carried = [
+                cohort.variants[row].with_alt_copies(int(count))
+                for row, count in zip(rows, pattern) if count
+            ]
+            outcomes.append(drug_outcome(drug, resolve_drug_genotype(drug, carried, drug_genes[drug], engine), engine))
+        per_drug.append((outcomes, inverse.reshape(-1)))
+
+    for index, sample in enumerate(cohort.samples):
+        yield {
+            "sample": sample,
+            "results": [outcomes[inverse[index]] for outcomes, inverse in per_drug],
+        }
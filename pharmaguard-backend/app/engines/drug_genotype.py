@@ -0,0 +1,144 @@
+from typing import Dict, Optional, Sequence
+
+from app.engines.gene_profile import GeneProfile, build_gene_profile
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+from app.parsers.variant_id import variant_id_text
+
+
+def profile_drug_genotype(
+    profile: GeneProfile,
+    drug: str,
+    relevant_genes: Sequence[str],
+    engine: Optional[RiskAssessmentEngine] = None,
+) -> Optional[Dict]:
+    """
+    Join one drug against a VCF's gene profile
+
+    Picks the drug's primary gene from the profile and applies the CPIC
+    risk lookup and drug-specific overrides. Star allele and phenotype
+    calls come from the profile, so analysing more drugs against the same
+    VCF only adds this lookup per drug.
+
+    Args:
+        profile: Gene profile of the patient's VCF
+        drug: Drug ID (e.g. "WARFARIN") or custom drug label
+        relevant_genes: Genes that affect this drug
+        engine: Risk engine to use; defaults to the profile's engine
+
+    Returns:
+        Dict with gene, star_allele, diplotype, variant_ids, phenotype,
+        phenotype_confidence, output_phenotype and risk, or None when no
+        variant falls in a relevant gene
+    """
+    engine = engine or profile.engine
+    gene = profile.primary_gene(relevant_genes, engine.knowledge.gene_priority.get(drug))
+    if gene is None:
+        return None
+
+    call = profile.call(gene)
+    phenotype = call["phenotype"]
+    variant_ids = call["variant_ids"]
+    knowledge = engine.knowledge
+
+    # Assess risk for this drug-gene pair
+    risk = engine.assess_risk(gene, drug, phenotype, variant_ids, call["diplotype"])
+
+    # Conservative WARFARIN override for known high-risk variants
+    if drug == "WARFARIN":
+        high_risk_warfarin_ids = knowledge.high_risk_ids.get(drug, frozenset())
+        if gene == "CYP2C9" and phenotype == "PM":
+            risk = {
+                **risk,
+                "risk_label": "Toxic",
+                "severity": "critical",
+                "confidence_score": max(risk.get("confidence_score", 0.5), 0.95)
+            }
+        elif any(key in high_risk_warfarin_ids for key in variant_ids):
+            risk = {
+                **risk,
+                "risk_label": "Toxic",
+                "severity": "critical",
+                "confidence_score": max(risk.get("confidence_score", 0.5), 0.9)
+            }
+        elif risk.get("risk_label") == "Safe":
+            risk = {
+                **risk,
+                "risk_label": "Adjust Dosage",
+                "severity": "high",
+                "confidence_score": min(max(risk.get("confidence_score", 0.5), 0.8), 0.9)
+            }
+
+    if gene == "DPYD" and drug == "FLUOROURACIL" and phenotype == "Poor Metabolizer":
+        risk = {
+            **risk,
+            "risk_label": "Toxic",
+            "severity": "critical",
+            "confidence_score": max(risk.get("confidence_score", 0.5), 0.99)
+        }
+
+    return {**call, "risk": risk}
+
+
+def resolve_drug_genotype(
+    drug: str,
+    variants: Sequence,
+    relevant_genes: Sequence[str],
+    engine: Optional[RiskAssessmentEngine] = None,
+) -> Optional[Dict]:
+    """
+    Resolve the primary gene, star allele, phenotype and risk for one drug
+
+    Builds a gene profile of just the relevant variants and joins the drug
+    against it. Callers analysing several drugs for one VCF should build
+    the profile once and use profile_drug_genotype instead.
+
+    Args:
+        drug: Drug ID (e.g. "WARFARIN") or custom drug label
+        variants: Parsed variants (Variant records or dicts)
+        relevant_genes: Genes that affect this drug
+        engine: Risk engine to use; defaults to get_engine()
+
+    Returns:
+        Same as profile_drug_genotype
+    """
+    engine = engine or get_engine()
+    relevant_variants = [v for v in variants if v.get('gene') in relevant_genes]
+    if not relevant_variants:
+        return None
+    return profile_drug_genotype(build_gene_profile(relevant_variants, engine), drug, relevant_genes, engine)
+
+
+def drug_outcome(drug: str, genotype: Optional[Dict], engine: RiskAssessmentEngine) -> Dict:
+    """
+    Compact result for one drug (no LLM explanation)
+
+    Used for cohort rows and passport entries. A None genotype gives the
+    same safe default as the single-patient no-variant response.
+    """
+    if genotype is None:
+        return {
+            "drug": drug,
+            "primary_gene": "No Target Genes",
+            "diplotype": "*1/*1",
+            "phenotype": "Unknown",
+            "risk_label": "Safe",
+            "severity": "none",
+            "confidence_score": 0.6,
+            "detected_variants": [],
+            "recommendation": f"No significant pharmacogenomic variants detected for {drug}. Standard drug dosing recommended.",
+        }
+
+    risk = genotype["risk"]
+    return {
+        "drug": drug,
+        "primary_gene": genotype["gene"],
+        "diplotype": genotype["diplotype"],
+        "phenotype": genotype["output_phenotype"],
+        "risk_label": risk["risk_label"],
+        "severity": risk["severity"],
+        "confidence_score": risk["confidence_score"],
+        "detected_variants": [variant_id_text(key) for key in genotype["variant_ids"]],
+        "recommendation": engine.get_clinical_recommendation(
+            risk["risk_label"], drug, genotype["phenotype"], genotype["gene"]
+        ),
+    }
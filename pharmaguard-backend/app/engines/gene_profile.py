@@ -0,0 +1,218 @@
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from app.engines.haplotype import REFERENCE_ALLELE
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+from app.parsers.rsid_index import get_rsid_index
+from app.parsers.variant_id import BARE_RS_FLAG, rs_key, variant_id_of, variant_id_text
+
+# rs4244285 (CYP2C19*2) is called *2 whatever else the gene carries
+CYP2C19_STAR2_ID = rs_key("rs4244285")
+
+
+def indexed_star(gene: str, key: int) -> Optional[str]:
+    """Star allele the rsID index gives for a variant ID of this gene, or None"""
+    rsid_index = get_rsid_index()
+    if rsid_index is None or not 0 < key < BARE_RS_FLAG:
+        return None
+    annotation = rsid_index.lookup_number(key)
+    if annotation is None or annotation.gene != gene:
+        return None
+    return annotation.star
+
+
+def call_gene(gene: str, gene_variants: Sequence, engine: RiskAssessmentEngine) -> Dict:
+    """
+    Star allele, diplotype, reported variant IDs and phenotype for one gene
+
+    Variants are handled by integer ID (see app.parsers.variant_id)
+    throughout; variant_id_text() turns them into reported rsIDs.
+
+    When every variant has a genotype (alt_copies), zygosity is matched
+    too: a heterozygous star allele is called against the reference
+    (*4/*1) and homozygous ones as star/star. Without genotypes a carried
+    star allele is read as homozygous, as the STAR tag always was.
+
+    Args:
+        gene: Gene symbol
+        gene_variants: The gene's carried variants in file order (at least one)
+        engine: Risk engine whose knowledge base is used
+
+    Returns:
+        Dict with gene, star_allele, diplotype, variant_ids (tuple),
+        phenotype, phenotype_confidence and output_phenotype
+    """
+    knowledge = engine.knowledge
+    variant_ids = [variant_id_of(v) for v in gene_variants]
+
+    # For genes with star-defining SNPs (CYP2C9), only interpret those when present
+    star_defining_ids = knowledge.star_defining_ids.get(gene)
+    if star_defining_ids:
+        defining = [i for i, key in enumerate(variant_ids) if key in star_defining_ids]
+        if defining:
+            gene_variants = [gene_variants[i] for i in defining]
+            variant_ids = [variant_ids[i] for i in defining]
+
+    tagged_star = gene_variants[0].get('star')
+    star_allele = tagged_star or '*1'
+    copies: Dict[int, Optional[int]] = {}
+    for key, variant in zip(variant_ids, gene_variants):
+        copies.setdefault(key, variant.get('alt_copies'))
+    zygosity_known = None not in copies.values()
+    homozygous_ids = [key for key, count in copies.items() if count == 2] if zygosity_known else None
+    variant_ids = list(copies)
+    # The star allele is named by the first variant unless overridden below
+    naming_id = variant_ids[0]
+
+    # Prefer the CYP2C19 *2 call when rs4244285 is present; without a STAR
+    # tag, match the observed variants against the gene's allele definitions
+    # or, for genes without any, infer the star allele from the first rsID
+    allele_table = knowledge.allele_table(gene)
+    match = None
+    if gene == "CYP2C19" and CYP2C19_STAR2_ID in variant_ids:
+        star_allele = "*2"
+        naming_id = CYP2C19_STAR2_ID
+    elif tagged_star is None and allele_table is not None:
+        match = allele_table.match(variant_ids, homozygous_ids)
+        first, second = match.alleles
+        star_allele = second if first == REFERENCE_ALLELE else first
+    elif star_allele == "*1" and variant_ids:
+        star_allele = (
+            knowledge.star_for_id(gene, variant_ids[0])
+            or indexed_star(gene, variant_ids[0])
+            or star_allele
+        )
+
+    # Strict diplotype-to-SNP consistency filtering to prevent contamination
+    if match is None:
+        allowed_ids = knowledge.allowed_ids(gene, star_allele)
+        if zygosity_known and copies[naming_id] == 1 and star_allele != REFERENCE_ALLELE:
+            alleles = [star_allele, REFERENCE_ALLELE]
+        else:
+            alleles = [star_allele]
+        diplotype = f"{alleles[0]}/{alleles[-1]}"
+    else:
+        allowed_ids = allele_table.defining_ids(match.alleles)
+        alleles = list(match.alleles)
+        diplotype = match.diplotype
+    if allowed_ids:
+        variant_ids = [key for key in variant_ids if key in allowed_ids]
+
+    # Infer phenotype
+    if gene == "CYP2C9":
+        phenotype, phenotype_confidence = engine.infer_cyp2c9_phenotype(diplotype)
+    elif gene == "SLCO1B1":
+        phenotype, phenotype_confidence = engine.infer_slco1b1_phenotype(diplotype)
+    elif gene == "DPYD":
+        phenotype, phenotype_confidence = engine.infer_dpyd_phenotype(diplotype)
+    else:
+        phenotype, phenotype_confidence = engine.infer_phenotype(alleles)
+
+    output_phenotype = knowledge.phenotype_output.get(phenotype, phenotype)
+    if output_phenotype not in knowledge.output_phenotypes:
+        output_phenotype = "Unknown"
+
+    return {
+        "gene": gene,
+        "star_allele": star_allele,
+        "diplotype": diplotype,
+        "variant_ids": tuple(variant_ids),
+        "phenotype": phenotype,
+        "phenotype_confidence": phenotype_confidence,
+        "output_phenotype": output_phenotype,
+    }
+
+
+def reported_call(call: Mapping) -> Dict:
+    """
+    A call_gene result in reportable form
+
+    Variant IDs are an internal encoding, so calls that are stored or
+    sent anywhere carry variant_rsids strings instead.
+    """
+    reported = {key: value for key, value in call.items() if key != "variant_ids"}
+    reported["variant_rsids"] = [variant_id_text(key) for key in call["variant_ids"]]
+    return reported
+
+
+class GeneProfile:
+    """
+    Per-gene genotype calls for one VCF, shared by every drug analysed
+
+    Variants are bucketed by gene up front; each gene is called (star
+    allele, diplotype, phenotype) the first time a drug needs it and the
+    result reused for every later drug. Call dicts are shared, so treat
+    them as read-only. first_seen records where each gene's first variant
+    sits in the VCF, which breaks ties when a drug has several relevant
+    genes and no gene priority.
+    """
+
+    __slots__ = ("engine", "buckets", "first_seen", "_calls")
+
+    def __init__(self, engine: RiskAssessmentEngine, buckets: Dict[str, List], first_seen: Dict[str, int]):
+        self.engine = engine
+        self.buckets = buckets
+        self.first_seen = first_seen
+        self._calls: Dict[str, Dict] = {}
+
+    def call(self, gene: str) -> Optional[Dict]:
+        """The gene's call_gene result, or None when it has no variants"""
+        result = self._calls.get(gene)
+        if result is None:
+            gene_variants = self.buckets.get(gene)
+            if gene_variants is None:
+                return None
+            result = self._calls[gene] = call_gene(gene, gene_variants, self.engine)
+        return result
+
+    def calls(self) -> Dict[str, Dict]:
+        """Calls for every gene with variants"""
+        return {gene: self.call(gene) for gene in self.buckets}
+
+    def primary_gene(self, relevant_genes: Sequence[str], gene_rank: Optional[Mapping[str, int]] = None) -> Optional[str]:
+        """
+        Gene that drives a drug's interpretation
+
+        The relevant gene with the best priority rank (unranked genes last),
+        then the one whose first variant comes earliest in the VCF.
+
+        Returns:
+            Gene symbol, or None when no relevant gene has variants
+        """
+        best_gene = None
+        best_key = None
+        for gene in relevant_genes:
+            seen = self.first_seen.get(gene)
+            if seen is None:
+                continue
+            key = (gene_rank.get(gene, 999) if gene_rank else 999, seen)
+            if best_key is None or key < best_key:
+                best_gene, best_key = gene, key
+        return best_gene
+
+
+def build_gene_profile(variants: Sequence, engine: Optional[RiskAssessmentEngine] = None) -> GeneProfile:
+    """
+    Bucket a VCF's variants by gene for per-gene calling
+
+    Records whose genotype carries no ALT allele (0/0, ./.) are skipped,
+    as they are for cohort samples.
+
+    Args:
+        variants: Parsed variants (Variant records or dicts) in file order
+        engine: Risk engine to use; defaults to get_engine()
+
+    Returns:
+        GeneProfile covering every gene with at least one carried variant
+    """
+    buckets: Dict[str, List] = {}
+    first_seen: Dict[str, int] = {}
+    for index, variant in enumerate(variants):
+        gene = variant.get('gene')
+        if not gene or variant.get('alt_copies') == 0:
+            continue
+        bucket = buckets.get(gene)
+        if bucket is None:
+            bucket = buckets[gene] = []
+            first_seen[gene] = index
+        bucket.append(variant)
+    return GeneProfile(engine or get_engine(), buckets, first_seen)
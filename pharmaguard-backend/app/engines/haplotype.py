@@ -0,0 +1,171 @@
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from app.parsers.variant_id import rs_key
+
+
+# Allele assumed for a haplotype that carries none of the defining variants
+REFERENCE_ALLELE = "*1"
+
+
+# Variants are given by integer variant ID or, for convenience, rsID string
+VariantRef = Union[int, str]
+
+
+def _as_id(variant: VariantRef) -> Optional[int]:
+    return variant if isinstance(variant, int) else rs_key(variant.strip())
+
+
+class DiplotypeMatch(NamedTuple):
+    """One candidate diplotype and how well it explains the observed variants"""
+
+    diplotype: str
+    alleles: Tuple[str, str]
+    unexplained: int  # Observed defining variants neither allele carries
+    conflicts: int  # Variants whose known zygosity the pair contradicts
+    missing: int  # Defining variants of the pair that were not observed
+
+
+class AlleleTable:
+    """
+    Star-allele definitions for one gene as bitsets over defining variants
+
+    Every defining variant (by integer variant ID, see
+    app.parsers.variant_id) gets a bit; an allele is the mask
+    of its defining variants. Observed variants become masks the same way,
+    so testing a candidate diplotype is a handful of AND/OR/popcount
+    operations on Python ints whatever the number of positions. Only the
+    reference, alleles whose defining variants were all observed and, for
+    observed variants none of those explain, partially observed alleles
+    are paired, which keeps matching in the microseconds even for genes
+    with hundreds of definitions.
+
+    Candidates rank by, in order: observed variants left unexplained,
+    zygosity conflicts, defining variants not observed, then homozygous
+    before heterozygous (a VCF without genotypes is read as star/star, as
+    the STAR tag always was) and finally definition order.
+    """
+
+    __slots__ = ("gene", "alleles", "masks", "bits", "_index", "_carriers")
+
+    def __init__(self, gene: str, definitions: Mapping[str, Iterable[str]]):
+        self.gene = gene
+        self.alleles: Tuple[str, ...] = tuple(definitions)
+        self.bits: Dict[int, int] = {}
+        masks = []
+        for allele in self.alleles:
+            mask = 0
+            for rsid in definitions[allele]:
+                key = rs_key(rsid)
+                if key is None:
+                    raise ValueError(f"Invalid rsID {rsid!r} in {gene} {allele} definition")
+                mask |= 1 << self.bits.setdefault(key, len(self.bits))
+            masks.append(mask)
+        self.masks: Tuple[int, ...] = tuple(masks)
+        self._index = {allele: index for index, allele in enumerate(self.alleles)}
+        # Bit -> alleles defined by it
+        carriers: List[List[int]] = [[] for _ in self.bits]
+        for index, mask in enumerate(masks):
+            for bit in range(mask.bit_length()):
+                if mask >> bit & 1:
+                    carriers[bit].append(index)
+        self._carriers: Tuple[Tuple[int, ...], ...] = tuple(tuple(indices) for indices in carriers)
+
+    def mask(self, variants: Iterable[VariantRef]) -> int:
+        """Bitset of the defining variants among variant IDs or rsIDs (others are ignored)"""
+        bits = self.bits
+        mask = 0
+        for variant in variants:
+            bit = bits.get(_as_id(variant))
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def _scored(self, carried: Iterable[VariantRef], homozygous: Optional[Iterable[VariantRef]]):
+        # Observed mask and the alleles touching it, in one pass over the variants
+        bits = self.bits
+        allele_carriers = self._carriers
+        observed = 0
+        touched = set()
+        for variant in carried:
+            bit = bits.get(_as_id(variant))
+            if bit is not None:
+                observed |= 1 << bit
+                touched.update(allele_carriers[bit])
+
+        if homozygous is None:
+            hom = het = 0
+        else:
+            hom = self.mask(homozygous) & observed
+            het = observed & ~hom
+
+        candidates = [(-1, REFERENCE_ALLELE, 0)]
+        if touched:
+            masks = self.masks
+            unobserved = ~observed
+            contained = [index for index in touched if not masks[index] & unobserved]
+            covered = 0
+            for index in contained:
+                covered |= masks[index]
+            leftover = observed & ~covered
+            if leftover:
+                contained.extend(
+                    index for index in touched if masks[index] & leftover and masks[index] & unobserved
+                )
+            candidates.extend((index, self.alleles[index], masks[index]) for index in sorted(contained))
+
+        for i, (first_index, first, first_mask) in enumerate(candidates):
+            for second_index, second, second_mask in candidates[i:]:
+                union = first_mask | second_mask
+                both = first_mask & second_mask
+                unexplained = (observed & ~union).bit_count()
+                conflicts = (hom & ~both).bit_count() + (het & both).bit_count()
+                missing = (union & ~observed).bit_count()
+                key = (unexplained, conflicts, missing, first_index != second_index, first_index, second_index)
+                yield key, (first, second, unexplained, conflicts, missing)
+
+    @staticmethod
+    def _match(fields) -> DiplotypeMatch:
+        first, second, unexplained, conflicts, missing = fields
+        return DiplotypeMatch(f"{first}/{second}", (first, second), unexplained, conflicts, missing)
+
+    def rank(
+        self,
+        carried: Iterable[VariantRef],
+        homozygous: Optional[Iterable[VariantRef]] = None,
+        limit: Optional[int] = None
+    ) -> List[DiplotypeMatch]:
+        """
+        Candidate diplotypes for the observed variants, best first
+
+        Args:
+            carried: Variants with at least one ALT allele
+            homozygous: Variants carried on both haplotypes; None when the
+                zygosity is unknown (no genotypes in the VCF)
+            limit: Return at most this many candidates
+
+        Returns:
+            DiplotypeMatch list; always contains at least the reference
+            diplotype
+        """
+        scored = sorted(self._scored(carried, homozygous), key=lambda item: item[0])
+        if limit is not None:
+            scored = scored[:limit]
+        return [self._match(fields) for _, fields in scored]
+
+    def match(self, carried: Iterable[VariantRef], homozygous: Optional[Iterable[VariantRef]] = None) -> DiplotypeMatch:
+        """The best-ranked diplotype for the observed variants"""
+        return self._match(min(self._scored(carried, homozygous), key=lambda item: item[0])[1])
+
+    def defining_ids(self, alleles: Sequence[str]) -> FrozenSet[int]:
+        """Variant IDs defining any of the given alleles"""
+        mask = 0
+        for allele in alleles:
+            index = self._index.get(allele)
+            if index is not None:
+                mask |= self.masks[index]
+        return frozenset(key for key, bit in self.bits.items() if mask >> bit & 1)
+
+
+def compile_allele_tables(definitions: Mapping[str, Mapping[str, Iterable[str]]]) -> Dict[str, AlleleTable]:
+    """Gene -> allele -> defining rsIDs, as one AlleleTable per gene"""
+    return {gene: AlleleTable(gene, alleles) for gene, alleles in definitions.items()}
@@ -0,0 +1,404 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple, Union
+
+from app.engines.haplotype import AlleleTable, compile_allele_tables
+from app.parsers.variant_id import rs_key
+
+logger = logging.getLogger(__name__)
+
+
+# Knowledge base shipped with the backend
+DEFAULT_KNOWLEDGE_PATH = Path(__file__).with_name("knowledge_base.json")
+
+# Seconds between checks of the knowledge base file for changes
+DEFAULT_RELOAD_INTERVAL = 5.0
+
+# Snapshot layout: magic, SHA-256 of the JSON it was built from, pickled source
+SNAPSHOT_MAGIC = b"PGKB1\n"
+
+
+_EMPTY: Mapping = MappingProxyType({})
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively turn source data into interned, immutable structures"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return MappingProxyType({_freeze(key): _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _flatten(tree: Mapping, depth: int) -> Mapping:
+    """Nested mapping of the given depth -> read-only mapping keyed by tuples"""
+    flat: Dict[Tuple, Any] = {}
+
+    def walk(node: Mapping, prefix: Tuple, level: int):
+        for key, value in node.items():
+            if level == depth:
+                flat[prefix + (key,)] = value
+            else:
+                walk(value, prefix + (key,), level + 1)
+
+    walk(tree, (), 1)
+    return MappingProxyType(flat)
+
+
+def _rsid_sets(tree: Mapping) -> Mapping:
+    """Gene -> key -> rsID list, as read-only mappings of frozensets"""
+    return MappingProxyType({
+        gene: MappingProxyType({key: frozenset(rsids) for key, rsids in entries.items()})
+        for gene, entries in tree.items()
+    })
+
+
+def _id_set(rsids) -> FrozenSet[int]:
+    """rsIDs as a frozenset of variant IDs"""
+    return frozenset(key for key in map(rs_key, rsids) if key is not None)
+
+
+class KnowledgeBase:
+    """
+    Gene/drug/allele knowledge compiled into immutable lookup tables
+
+    Built once from the knowledge base file's data: strings are interned, mappings are
+    read-only views, rsID lists become frozensets and the CPIC table and
+    recommendation overrides are flattened to (gene, drug, phenotype)
+    keys. Every lookup on the analysis path is then a single hash probe,
+    and one instance can be shared freely across threads.
+    """
+
+    __slots__ = (
+        "version",
+        "drugs",
+        "supported_drugs",
+        "cpic_risk",
+        "star_phenotypes",
+        "cyp2c9_allele_activity",
+        "slco1b1_phenotypes",
+        "dpyd_no_function",
+        "dpyd_decreased_function",
+        "rsid_to_star",
+        "star_defining_rsids",
+        "star_allowed_rsids",
+        "star_defining_ids",
+        "star_allowed_ids",
+        "rsid_star_ids",
+        "high_risk_ids",
+        "allele_tables",
+        "gene_priority",
+        "high_risk_rsids",
+        "phenotype_output",
+        "output_phenotypes",
+        "severity_scores",
+        "recommendation_overrides",
+        "recommendation_templates",
+        "default_relevant_genes",
+    )
+
+    def __init__(self, source: Mapping[str, Any]):
+        tables = _freeze(source)
+        self.version = tables["version"]
+        self.drugs = tables["drugs"]
+        self.supported_drugs = frozenset(tables["supported_drugs"])
+        self.cpic_risk = _flatten(tables["cpic_risk"], 3)
+        self.star_phenotypes = tables["star_phenotypes"]
+        self.cyp2c9_allele_activity = tables["cyp2c9_allele_activity"]
+        self.slco1b1_phenotypes = tables["slco1b1_phenotypes"]
+        self.dpyd_no_function = frozenset(tables["dpyd_no_function"])
+        self.dpyd_decreased_function = frozenset(tables["dpyd_decreased_function"])
+        self.rsid_to_star = tables["rsid_to_star"]
+        self.star_defining_rsids = MappingProxyType({
+            gene: frozenset(rsids) for gene, rsids in tables["star_defining_rsids"].items()
+        })
+        self.star_allowed_rsids = _rsid_sets(tables["star_allowed_rsids"])
+        # The same tables keyed by integer variant IDs for the analysis path
+        self.star_defining_ids = MappingProxyType({
+            gene: _id_set(rsids) for gene, rsids in self.star_defining_rsids.items()
+        })
+        self.star_allowed_ids = MappingProxyType({
+            gene: MappingProxyType({star: _id_set(rsids) for star, rsids in entries.items()})
+            for gene, entries in self.star_allowed_rsids.items()
+        })
+        self.rsid_star_ids = MappingProxyType({
+            gene: MappingProxyType({rs_key(rsid): star for rsid, star in entries.items() if rs_key(rsid)})
+            for gene, entries in self.rsid_to_star.items()
+        })
+        # Optional, so knowledge files predating haplotype matching still load
+        self.allele_tables = MappingProxyType(compile_allele_tables(tables.get("allele_definitions", _EMPTY)))
+        # Drug -> gene -> rank, so sorting by priority is a dict probe per variant
+        self.gene_priority = MappingProxyType({
+            drug: MappingProxyType({gene: rank for rank, gene in enumerate(genes)})
+            for drug, genes in tables["gene_priority"].items()
+        })
+        self.high_risk_rsids = MappingProxyType({
+            drug: frozenset(rsids) for drug, rsids in tables["high_risk_rsids"].items()
+        })
+        self.high_risk_ids = MappingProxyType({
+            drug: _id_set(rsids) for drug, rsids in self.high_risk_rsids.items()
+        })
+        self.phenotype_output = tables["phenotype_output"]
+        self.output_phenotypes = frozenset(tables["output_phenotypes"])
+        self.severity_scores = tables["severity_scores"]
+        self.recommendation_overrides = _flatten(tables["recommendation_overrides"], 3)
+        self.recommendation_templates = tables["recommendation_templates"]
+        self.default_relevant_genes = tables["default_relevant_genes"]
+
+    def star_for_id(self, gene: str, key: int) -> Optional[str]:
+        """Star allele implied by a variant ID, or None"""
+        return self.rsid_star_ids.get(gene, _EMPTY).get(key)
+
+    def allowed_ids(self, gene: str, star_allele: str) -> Optional[FrozenSet[int]]:
+        """Variant IDs consistent with a called star allele, or None when unrestricted"""
+        return self.star_allowed_ids.get(gene, _EMPTY).get(star_allele)
+
+    def allele_table(self, gene: str) -> Optional[AlleleTable]:
+        """Bitset allele definitions for haplotype matching, or None"""
+        return self.allele_tables.get(gene)
+
+
+def read_snapshot(path: Union[str, Path], digest: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Knowledge base data from a binary snapshot
+
+    Returns:
+        The source data, or None when the snapshot is missing, unreadable or
+        was built from different JSON than digest
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(len(SNAPSHOT_MAGIC) + len(digest))
+            if header != SNAPSHOT_MAGIC + digest:
+                return None
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def write_snapshot(path: Union[str, Path], digest: bytes, source: Dict[str, Any]):
+    """Write a binary snapshot atomically (temp file + os.replace)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + digest)
+            pickle.dump(source, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def snapshot_path_for(path: Union[str, Path]) -> str:
+    """Default snapshot location next to the knowledge base file"""
+    return str(path) + ".snapshot"
+
+
+def load_knowledge(path: Union[str, Path], snapshot_path: Optional[Union[str, Path]] = None) -> KnowledgeBase:
+    """
+    Load and compile a knowledge base file
+
+    The JSON is hashed and, when a snapshot built from the same bytes
+    exists, the pickled data is used instead of parsing JSON. Otherwise the
+    JSON is parsed and a fresh snapshot written (best effort; a read-only
+    deployment just skips it).
+
+    Args:
+        path: Knowledge base JSON file
+        snapshot_path: Binary snapshot; defaults to snapshot_path_for(path)
+
+    Returns:
+        Compiled KnowledgeBase
+
+    Raises:
+        ValueError: File is not valid JSON or is missing required tables
+        OSError: File cannot be read
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(path)
+    raw = Path(path).read_bytes()
+    digest = hashlib.sha256(raw).digest()
+
+    source = read_snapshot(snapshot_path, digest)
+    if source is None:
+        try:
+            source = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid knowledge base JSON: {e}")
+        knowledge = compile_knowledge(source)
+        try:
+            write_snapshot(snapshot_path, digest, source)
+        except OSError:
+            pass
+        return knowledge
+    return compile_knowledge(source)
+
+
+def compile_knowledge(source: Mapping[str, Any]) -> KnowledgeBase:
+    """
+    Compile knowledge base data
+
+    Raises:
+        ValueError: Missing version or tables
+    """
+    if not isinstance(source, Mapping) or not isinstance(source.get("version"), str) or not source["version"]:
+        raise ValueError("Knowledge base must be an object with a non-empty 'version'")
+    try:
+        return KnowledgeBase(source)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid knowledge base: missing or malformed table {e}")
+
+
+def _file_stamp(path: Union[str, Path]) -> Tuple[int, int, int]:
+    """Identity of a file's current contents for change detection"""
+    info = os.stat(path)
+    return info.st_mtime_ns, info.st_size, info.st_ino
+
+
+class KnowledgeStore:
+    """
+    The knowledge base a process is serving, reloaded when its file changes
+
+    current() returns the loaded KnowledgeBase and, at most once per
+    check_interval, stats the file; a changed file is loaded in full and
+    then swapped in with one reference assignment. Requests that already
+    hold the old KnowledgeBase finish on it, new ones get the new version,
+    so a reload never blocks or fails a request. Each server worker process
+    has its own store and picks the change up on its own. A file that fails
+    to load leaves the current version in place.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_KNOWLEDGE_PATH,
+        snapshot_path: Optional[Union[str, Path]] = None,
+        check_interval: float = DEFAULT_RELOAD_INTERVAL,
+    ):
+        self.path = str(path)
+        self.snapshot_path = str(snapshot_path) if snapshot_path else snapshot_path_for(path)
+        self.check_interval = check_interval
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._knowledge: Optional[KnowledgeBase] = None
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> KnowledgeBase:
+        """The knowledge base to use for a new request"""
+        knowledge = self._knowledge
+        if knowledge is None:
+            return self.reload()
+        if self.check_interval >= 0 and time.monotonic() >= self._next_check:
+            self._check()
+            knowledge = self._knowledge
+        return knowledge
+
+    def reload(self) -> KnowledgeBase:
+        """
+        Load the file now and swap it in
+
+        Raises:
+            ValueError, OSError: The file could not be loaded; the current
+                version (if any) stays in place
+        """
+        with self._lock:
+            self._load()
+            return self._knowledge
+
+    def _check(self):
+        # Only one thread checks; the others keep serving the current version
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                stamp = _file_stamp(self.path)
+                if stamp != self._stamp:
+                    # Remembered even if loading fails, so a broken file is reported once
+                    self._stamp = stamp
+                    self._load()
+            except (OSError, ValueError):
+                logger.warning("Knowledge base reload failed, keeping version %s", self._knowledge.version, exc_info=True)
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        try:
+            stamp = _file_stamp(self.path)
+            knowledge = load_knowledge(self.path, self.snapshot_path)
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+            raise
+        self._stamp = stamp
+        self._knowledge = knowledge
+        self.loaded_at = time.time()
+        self.last_error = None
+        self._next_check = time.monotonic() + self.check_interval
+
+    def stats(self) -> Dict[str, Any]:
+        """Loaded version and reload state for monitoring"""
+        return {
+            "version": self._knowledge.version if self._knowledge else None,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "check_interval": self.check_interval,
+            "last_error": self.last_error,
+        }
+
+
+_store = KnowledgeStore()
+
+
+def configure_knowledge(
+    path: Union[str, Path] = DEFAULT_KNOWLEDGE_PATH,
+    check_interval: float = DEFAULT_RELOAD_INTERVAL,
+    snapshot_path: Optional[Union[str, Path]] = None,
+) -> KnowledgeStore:
+    """
+    Serve knowledge from path, loading it now so a bad file fails at startup
+
+    Args:
+        path: Knowledge base JSON file
+        check_interval: Seconds between file change checks; negative disables
+            automatic reloads
+        snapshot_path: Binary snapshot; defaults to next to path
+    """
+    global _store
+    store = KnowledgeStore(path, snapshot_path, check_interval)
+    store.reload()
+    _store = store
+    return store
+
+
+def get_knowledge_store() -> KnowledgeStore:
+    """The process-wide knowledge store"""
+    return _store
+
+
+def get_knowledge() -> KnowledgeBase:
+    """The knowledge base to use for a new request"""
+    return _store.current()
+
+
+if __name__ == "__main__":
+    # Build the binary snapshot ahead of time: python -m app.engines.knowledge [path]
+    target = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_KNOWLEDGE_PATH
+    snapshot = snapshot_path_for(target)
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    started = time.perf_counter()
+    knowledge = load_knowledge(target, snapshot)
+    print(f"Compiled knowledge base {knowledge.version} -> {snapshot} ({(time.perf_counter() - started) * 1000:.1f} ms)")
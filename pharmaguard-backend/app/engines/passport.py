@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Dict, Mapping, Optional, Sequence
+
+from app.engines.drug_genotype import drug_outcome, profile_drug_genotype
+from app.engines.gene_profile import build_gene_profile, reported_call
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+
+
+# Variant fields gene calling reads; all a passport keeps of the VCF
+PASSPORT_VARIANT_KEYS = ("chrom", "pos", "gene", "star", "rsid", "alt_copies")
+
+
+def build_passport(
+    variants: Sequence,
+    drug_genes: Mapping[str, Sequence[str]],
+    engine: Optional[RiskAssessmentEngine] = None,
+) -> Dict:
+    """
+    Whole-panel pharmacogenomic passport for one VCF
+
+    Builds one gene profile and joins every drug against it, so the whole
+    panel costs one pass over the variants plus a lookup per drug. The
+    target-gene variants are kept (only the fields gene calling reads), so
+    a passport can be recomputed for a new knowledge base version or a
+    drug outside the panel without the VCF.
+
+    Args:
+        variants: Parsed target-gene variants
+        drug_genes: Drug -> relevant genes for every drug in the panel
+        engine: Risk engine to use; defaults to get_engine()
+
+    Returns:
+        JSON-serialisable dict with knowledge_base_version, created_at,
+        genes (per-gene calls), drugs (per-drug outcome) and variants
+    """
+    engine = engine or get_engine()
+    kept = [{key: variant.get(key) for key in PASSPORT_VARIANT_KEYS} for variant in variants]
+    profile = build_gene_profile(kept, engine)
+    return {
+        "knowledge_base_version": engine.knowledge.version,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "genes": {gene: reported_call(call) for gene, call in profile.calls().items()},
+        "drugs": {
+            drug: drug_outcome(drug, profile_drug_genotype(profile, drug, genes, engine), engine)
+            for drug, genes in drug_genes.items()
+        },
+        "variants": kept,
+    }
+
+
+def passport_drug(
+    passport: Dict,
+    drug: str,
+    relevant_genes: Sequence[str],
+    engine: Optional[RiskAssessmentEngine] = None,
+) -> Dict:
+    """
+    One drug's outcome from a passport
+
+    Stored entries are returned as they are when the passport matches the
+    engine's knowledge base version. Other drugs are joined against the
+    passport's variants on the spot.
+
+    Returns:
+        Outcome dict (see drug_outcome) plus "source": "passport" or "computed"
+    """
+    engine = engine or get_engine()
+    if passport.get("knowledge_base_version") == engine.knowledge.version:
+        stored = passport["drugs"].get(drug)
+        if stored is not None:
+            return {**stored, "source": "passport"}
+
+    profile = build_gene_profile(passport.get("variants", []), engine)
+    outcome = drug_outcome(drug, profile_drug_genotype(profile, drug, relevant_genes, engine), engine)
+    return {**outcome, "source": "computed"}
@@ -1,6 +1,10 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from enum import Enum
 
+import numpy as np
+
+from app.engines.knowledge import KnowledgeBase, get_knowledge
+
 
 class Phenotype(str, Enum):
     PM = "PM"  # Poor Metabolizer
@@ -33,88 +37,110 @@ class Severity(str, Enum):
     CRITICAL = "critical"
 
 
+class RiskCodebook:
+    """
+    Integer codes and lookup tensors for batch risk assessment
+
+    Genes, drugs and phenotypes are coded by their position in the
+    codebook's tuples; each axis ends with one extra slot for names
+    outside the CPIC table, so code -1 (what encode() returns for an
+    unknown name) indexes it directly. Phenotype codes that
+    assess_risk would treat as invalid share the "Unknown" row, and
+    unlisted slots hold the UNKNOWN_RISK defaults, so a batch lookup is
+    a single fancy index per output.
+
+    Attributes:
+        genes, drugs, phenotypes, risk_labels: Names by code
+        risk_codes: int8 tensor (gene, drug, phenotype) -> risk label code
+        severity_scores: int8 tensor of severity scores
+        confidences: float64 tensor of confidence scores
+    """
+
+    __slots__ = (
+        "genes", "drugs", "phenotypes", "risk_labels",
+        "risk_codes", "severity_scores", "confidences", "_index",
+    )
+
+    def __init__(self, knowledge: KnowledgeBase, valid_phenotypes: frozenset, unknown_risk: Tuple[str, str, float]):
+        cpic_risk = knowledge.cpic_risk
+        self.genes = tuple(sorted({gene for gene, _, _ in cpic_risk}))
+        self.drugs = tuple(sorted({drug for _, drug, _ in cpic_risk}))
+        self.phenotypes = tuple(sorted(valid_phenotypes | {phenotype for _, _, phenotype in cpic_risk}))
+        self.risk_labels = tuple(sorted({label for label, _, _ in cpic_risk.values()} | {unknown_risk[0]}))
+        self._index = tuple(
+            {name: code for code, name in enumerate(names)}
+            for names in (self.genes, self.drugs, self.phenotypes, self.risk_labels)
+        )
+        label_index = self._index[3]
+
+        shape = (len(self.genes) + 1, len(self.drugs) + 1, len(self.phenotypes) + 1)
+        unknown_label, unknown_severity, unknown_confidence = unknown_risk
+        self.risk_codes = np.full(shape, label_index[unknown_label], dtype=np.int8)
+        self.severity_scores = np.full(shape, knowledge.severity_scores.get(unknown_severity, 2), dtype=np.int8)
+        self.confidences = np.full(shape, unknown_confidence, dtype=np.float64)
+
+        for (gene, drug, phenotype), (label, severity, confidence) in cpic_risk.items():
+            if phenotype not in valid_phenotypes:
+                continue
+            at = (self._index[0][gene], self._index[1][drug], self._index[2][phenotype])
+            self.risk_codes[at] = label_index[label]
+            self.severity_scores[at] = knowledge.severity_scores.get(severity, 2)
+            self.confidences[at] = confidence
+
+        # Invalid phenotypes (and the unlisted slot) read as "Unknown"
+        unknown = self._index[2]["Unknown"]
+        invalid = [code for code, name in enumerate(self.phenotypes) if name not in valid_phenotypes] + [-1]
+        for tensor in (self.risk_codes, self.severity_scores, self.confidences):
+            tensor[:, :, invalid] = tensor[:, :, unknown:unknown + 1]
+            tensor.setflags(write=False)
+
+    def _encode(self, axis: int, names: Iterable[str]) -> np.ndarray:
+        index = self._index[axis]
+        return np.fromiter((index.get(name, -1) for name in names), dtype=np.int16)
+
+    def encode_genes(self, names: Iterable[str]) -> np.ndarray:
+        """Gene codes; -1 for genes outside the CPIC table"""
+        return self._encode(0, names)
+
+    def encode_drugs(self, names: Iterable[str]) -> np.ndarray:
+        """Drug codes; -1 for drugs outside the CPIC table"""
+        return self._encode(1, names)
+
+    def encode_phenotypes(self, names: Iterable[str]) -> np.ndarray:
+        """Phenotype codes; -1 for unrecognised phenotypes"""
+        return self._encode(2, names)
+
+
 class RiskAssessmentEngine:
     """
     CPIC-aligned pharmacogenomic risk assessment engine
     Maps genotypes to phenotypes and clinical recommendations
+
+    All knowledge lives in a compiled KnowledgeBase; the engine holds no
+    per-request state, so one instance per knowledge base version (see
+    get_engine) serves every request.
     """
-    
-    # CPIC guidelines mapping: gene -> drug -> phenotype -> (risk_label, severity, confidence)
-    CPIC_RISK_MAP = {
-        "CYP2D6": {
-            "CODEINE": {
-                "PM": ("Ineffective", "high", 0.95),
-                "IM": ("Adjust Dosage", "moderate", 0.85),
-                "NM": ("Safe", "none", 0.98),
-                "RM": ("Safe", "low", 0.90),
-                "URM": ("Toxic", "critical", 0.92),
-            }
-        },
-        "CYP2C19": {
-            "WARFARIN": {
-                "PM": ("Adjust Dosage", "high", 0.88),
-                "IM": ("Adjust Dosage", "moderate", 0.85),
-                "NM": ("Safe", "none", 0.95),
-                "RM": ("Safe", "low", 0.90),
-                "URM": ("Safe", "none", 0.92),
-            },
-            "CLOPIDOGREL": {
-                "PM": ("Ineffective", "critical", 0.95),
-                "IM": ("Adjust Dosage", "high", 0.88),
-                "NM": ("Safe", "none", 0.96),
-                "RM": ("Safe", "none", 0.93),
-                "URM": ("Safe", "none", 0.91),
-            }
-        },
-        "CYP2C9": {
-            "WARFARIN": {
-                "PM": ("Toxic", "critical", 0.90),
-                "IM": ("Adjust Dosage", "high", 0.87),
-                "NM": ("Safe", "none", 0.96),
-                "RM": ("Safe", "none", 0.92),
-                "URM": ("Safe", "none", 0.90),
-            }
-        },
-        "SLCO1B1": {
-            "SIMVASTATIN": {
-                "Low function": ("Toxic", "high", 0.88),
-                "Decreased function": ("Adjust Dosage", "moderate", 0.85),
-                "Normal function": ("Safe", "none", 0.95),
-            }
-        },
-        "TPMT": {
-            "AZATHIOPRINE": {
-                "PM": ("Toxic", "critical", 0.96),
-                "IM": ("Adjust Dosage", "high", 0.90),
-                "NM": ("Safe", "none", 0.97),
-                "RM": ("Safe", "none", 0.93),
-                "URM": ("Safe", "none", 0.92),
-            }
-        },
-        "DPYD": {
-            "FLUOROURACIL": {
-                "Poor Metabolizer": ("Toxic", "critical", 0.99),
-                "Intermediate Metabolizer": ("Adjust Dosage", "high", 0.92),
-                "Normal Metabolizer": ("Safe", "none", 0.98),
-            }
-        }
-    }
-
-    CYP2C9_ALLELE_ACTIVITY = {
-        "*1": 1.0,
-        "*2": 0.5,
-        "*3": 0.0,
-        "*5": 0.0,
-        "*6": 0.0,
-        "*8": 0.5,
-        "*11": 0.5,
-        "*12": 0.0,
-    }
-    
-    def __init__(self):
-        self.valid_phenotypes = [p.value for p in Phenotype]
-        self.valid_risk_labels = [r.value for r in RiskLabel]
-        self.valid_severities = [s.value for s in Severity]
+
+    VALID_PHENOTYPES = frozenset(p.value for p in Phenotype)
+    VALID_RISK_LABELS = frozenset(r.value for r in RiskLabel)
+    VALID_SEVERITIES = frozenset(s.value for s in Severity)
+
+    # (risk_label, severity, confidence) when the CPIC table has no entry
+    UNKNOWN_RISK = ("Unknown", "moderate", 0.5)
+
+    def __init__(self, knowledge: Optional[KnowledgeBase] = None):
+        self.knowledge = knowledge or get_knowledge()
+        self.valid_phenotypes = self.VALID_PHENOTYPES
+        self.valid_risk_labels = self.VALID_RISK_LABELS
+        self.valid_severities = self.VALID_SEVERITIES
+        self._codebook: Optional[RiskCodebook] = None
+
+    def codebook(self) -> RiskCodebook:
+        """Codes and lookup tensors for assess_risk_batch, built on first use"""
+        codebook = self._codebook
+        if codebook is None:
+            codebook = self._codebook = RiskCodebook(self.knowledge, self.VALID_PHENOTYPES, self.UNKNOWN_RISK)
+        return codebook
     
     def assess_risk(
         self,
@@ -139,39 +165,49 @@ class RiskAssessmentEngine:
         """
         
         # Validate inputs
-        if phenotype not in self.valid_phenotypes:
+        if phenotype not in self.VALID_PHENOTYPES:
             phenotype = "Unknown"
         
         # Get risk from CPIC map
-        risk_data = self.CPIC_RISK_MAP.get(gene, {}).get(drug, {}).get(phenotype)
-        
-        if risk_data is None:
-            risk_label = "Unknown"
-            severity = "moderate"
-            confidence = 0.5
-        else:
-            risk_label, severity, confidence = risk_data
-        
-        # Map to severity score
-        severity_score = {
-            "none": 0,
-            "low": 1,
-            "moderate": 2,
-            "high": 3,
-            "critical": 4
-        }.get(severity, 2)
+        risk_label, severity, confidence = self.knowledge.cpic_risk.get((gene, drug, phenotype), self.UNKNOWN_RISK)
         
         return {
             "risk_label": risk_label,
             "severity": severity,
             "confidence_score": confidence,
-            "severity_score": severity_score,
+            "severity_score": self.knowledge.severity_scores.get(severity, 2),
             "gene": gene,
             "drug": drug,
             "phenotype": phenotype,
             "detected_variants_count": len(detected_variants),
         }
     
+    def assess_risk_batch(
+        self,
+        genes: np.ndarray,
+        drugs: np.ndarray,
+        phenotypes: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Assess many (gene, drug, phenotype) triples at once
+        
+        Inputs are integer codes from codebook() (see its encode_* helpers)
+        and broadcast against each other like any NumPy operation. Element
+        for element the result matches assess_risk on the decoded names.
+        
+        Args:
+            genes: Gene codes
+            drugs: Drug codes
+            phenotypes: Phenotype codes
+            
+        Returns:
+            Tuple of (risk label codes into codebook().risk_labels,
+            severity scores, confidence scores) arrays
+        """
+        codebook = self.codebook()
+        at = (np.asarray(genes), np.asarray(drugs), np.asarray(phenotypes))
+        return codebook.risk_codes[at], codebook.severity_scores[at], codebook.confidences[at]
+    
     def infer_phenotype(self, star_alleles: List[str]) -> Tuple[str, float]:
         """
         Infer phenotype from star alleles
@@ -210,42 +246,7 @@ class RiskAssessmentEngine:
         else:
             star_str = f"{normalized_alleles[0]}/{normalized_alleles[0]}"
         
-        phenotype_scores = {
-            "*1/*1": ("NM", 0.98),
-            "*1/*2": ("IM", 0.90),
-            "*1/*3": ("IM", 0.88),
-            "*2/*2": ("PM", 0.92),
-            "*2/*3": ("PM", 0.88),
-            "*3/*3": ("PM", 0.88),
-            "*3/*4": ("PM", 0.86),
-            "*4/*4": ("PM", 0.90),
-            "*1/*41": ("IM", 0.90),
-            "*2/*41": ("IM", 0.88),
-            "*41/*41": ("IM", 0.90),
-            "*4/*41": ("PM", 0.88),
-            "*1/*5": ("IM", 0.92),
-            "*5/*5": ("PM", 0.95),
-            "*1/*15": ("IM", 0.90),
-            "*5/*15": ("PM", 0.93),
-            "*15/*15": ("PM", 0.94),
-            "*1/*2A": ("IM", 0.94),
-            "*2A/*2A": ("PM", 0.97),
-            "*1/*13": ("IM", 0.92),
-            "*13/*13": ("PM", 0.96),
-            "*2A/*13": ("PM", 0.97),
-            "*1/*2": ("IM", 0.92),
-            "*2/*2": ("PM", 0.95),
-            "*1/*3A": ("IM", 0.93),
-            "*3A/*3A": ("PM", 0.97),
-            "*1/*3B": ("IM", 0.90),
-            "*3B/*3B": ("PM", 0.95),
-            "*1/*3C": ("IM", 0.93),
-            "*3C/*3C": ("PM", 0.97),
-            "*3A/*3C": ("PM", 0.96),
-            "*1/*1_*1/*1": ("URM", 0.85),  # Gene duplication
-        }
-        
-        return phenotype_scores.get(star_str, ("Unknown", 0.5))
+        return self.knowledge.star_phenotypes.get(star_str, ("Unknown", 0.5))
 
     def infer_cyp2c9_phenotype(self, diplotype: str) -> Tuple[str, float]:
         """Infer CYP2C9 phenotype from diplotype using activity score model."""
@@ -253,8 +254,9 @@ class RiskAssessmentEngine:
             return "Unknown", 0.3
 
         left_allele, right_allele = [part.strip() for part in diplotype.split("/", 1)]
-        left_score = self.CYP2C9_ALLELE_ACTIVITY.get(left_allele)
-        right_score = self.CYP2C9_ALLELE_ACTIVITY.get(right_allele)
+        allele_activity = self.knowledge.cyp2c9_allele_activity
+        left_score = allele_activity.get(left_allele)
+        right_score = allele_activity.get(right_allele)
 
         if left_score is None or right_score is None:
             return "Unknown", 0.5
@@ -278,16 +280,7 @@ class RiskAssessmentEngine:
         left_allele, right_allele = [part.strip() for part in diplotype.split("/", 1)]
         normalized = "/".join(sorted([left_allele, right_allele]))
 
-        phenotype_map = {
-            "*1/*1": ("Normal function", 0.96),
-            "*1/*5": ("Decreased function", 0.95),
-            "*5/*5": ("Low function", 0.97),
-            "*1/*15": ("Decreased function", 0.93),
-            "*5/*15": ("Low function", 0.94),
-            "*15/*15": ("Low function", 0.95),
-        }
-
-        return phenotype_map.get(normalized, ("Unknown", 0.5))
+        return self.knowledge.slco1b1_phenotypes.get(normalized, ("Unknown", 0.5))
 
     def infer_dpyd_phenotype(self, diplotype: str) -> Tuple[str, float]:
         """Infer DPYD phenotype using CPIC-aligned no/decreased function rules."""
@@ -295,8 +288,8 @@ class RiskAssessmentEngine:
             return "Unknown", 0.3
 
         left_allele, right_allele = [part.strip() for part in diplotype.split("/", 1)]
-        no_function = {"*2A", "*13", "D949V"}
-        decreased_function = {"HapB3"}
+        no_function = self.knowledge.dpyd_no_function
+        decreased_function = self.knowledge.dpyd_decreased_function
 
         function_score = 0
         for allele in (left_allele, right_allele):
@@ -328,24 +321,34 @@ class RiskAssessmentEngine:
         Generate clinical recommendation based on risk assessment
         """
         
-        if gene == "CYP2C9" and drug == "WARFARIN" and phenotype == "PM":
-            return "Substantially reduce dose (80–90%) and use genotype-guided dosing with close INR monitoring"
+        override = self.knowledge.recommendation_overrides.get((gene, drug, phenotype))
+        if override is not None:
+            return override
 
-        if gene == "CYP2C19" and drug == "CLOPIDOGREL" and phenotype == "PM":
-            return "Avoid clopidogrel and use an alternative P2Y12 inhibitor (prasugrel or ticagrelor) unless contraindicated"
+        template = self.knowledge.recommendation_templates.get(risk_label)
+        if template is None:
+            return f"Review {drug} dosing with clinical team."
+        return template.format(drug=drug, phenotype=phenotype)
 
-        if gene == "SLCO1B1" and drug == "SIMVASTATIN" and phenotype == "Low function":
-            return "Avoid simvastatin or limit to a maximum of 20 mg/day; consider alternative statins such as pravastatin or rosuvastatin with close monitoring for myopathy"
 
-        recommendations = {
-            "Safe": f"Patient can take standard dosage of {drug}. No pharmacogenomic adjustment needed.",
-            "Adjust Dosage": f"Recommend dose adjustment for {drug} based on {phenotype} phenotype. Consult clinical guidelines.",
-            "Toxic": f"CAUTION: Patient is at high risk of toxicity with {drug}. Consider alternative therapy or significantly reduce dose.",
-            "Ineffective": f"Patient may have reduced response to {drug}. Consider higher dose or alternative medication.",
-            "Unknown": f"Insufficient pharmacogenomic data for {drug}. Baseline dosing recommended with monitoring.",
-        }
-        
-        return recommendations.get(risk_label, f"Review {drug} dosing with clinical team.")
+# Shared engine; stateless, so safe to use from any thread
+_engine: Optional[RiskAssessmentEngine] = None
+
+
+def get_engine() -> RiskAssessmentEngine:
+    """
+    The process-wide risk engine for the current knowledge base
+
+    A new engine is swapped in when the knowledge base is reloaded. Take
+    it once per request and pass it along, so one request is answered
+    from a single knowledge base version.
+    """
+    global _engine
+    knowledge = get_knowledge()
+    engine = _engine
+    if engine is None or engine.knowledge is not knowledge:
+        engine = _engine = RiskAssessmentEngine(knowledge)
+    return engine
 
 
 def assess_patient_risk(
@@ -358,5 +361,4 @@ def assess_patient_risk(
     """
     Convenience function for risk assessment
     """
-    engine = RiskAssessmentEngine()
-    return engine.assess_risk(gene, drug, phenotype, detected_variants, diplotype)
+    return get_engine().assess_risk(gene, drug, phenotype, detected_variants, diplotype)
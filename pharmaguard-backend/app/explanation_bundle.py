@@ -0,0 +1,158 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Union
+
+import numpy as np
+
+
+# File layout: header, JSON metadata, then columns sorted by key
+#   magic | entry count (u64) | metadata length (u64) | text bytes (u64) | metadata JSON | pad to 8
+#   key prefixes (big-endian first 8 key bytes as u64[n]) | keys (32 bytes each) | pad to 8
+#   text offsets (u64[n + 1]) | UTF-8 texts
+BUNDLE_MAGIC = b"PGXBND1\n"
+_HEADER = struct.Struct("<8sQQQ")
+_KEY_BYTES = 32
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class ExplanationBundle:
+    """
+    Read-only explanation texts by explanation cache key over a memory-mapped file
+
+    Built offline by app.pregenerate_explanations. Keys are the SHA-256
+    explanation keys the explainer computes (app.explanation_cache), so a
+    bundled text is exactly the text a live LLM call for the same inputs,
+    model and prompt version would have been cached under. Lookups are a
+    binary search over the mapped key prefixes; the mapping is shared by
+    every worker process on a host.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, count, metadata_length, text_length = _HEADER.unpack_from(self._mmap, 0)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"Not an explanation bundle: {self.path}")
+            offset = _HEADER.size
+            self.metadata: Dict[str, Any] = json.loads(self._mmap[offset:offset + metadata_length])
+            offset = _align(offset + metadata_length)
+            self.prefixes = np.frombuffer(self._mmap, dtype=">u8", count=count, offset=offset)
+            offset += count * 8
+            self._keys_offset = offset
+            offset = _align(offset + count * _KEY_BYTES)
+            self.offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=offset)
+            self._texts_offset = offset + (count + 1) * 8
+            if self._texts_offset + text_length > len(self._mmap) or int(self.offsets[-1]) != text_length:
+                raise ValueError("truncated file")
+        except (struct.error, ValueError, TypeError) as e:
+            self._mmap.close()
+            raise ValueError(f"Invalid explanation bundle {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self.prefixes)
+
+    def get(self, key: str) -> Optional[str]:
+        """Bundled text for an explanation key (hex SHA-256), or None"""
+        digest = bytes.fromhex(key)
+        prefix = np.uint64(int.from_bytes(digest[:8], "big"))
+        row = int(np.searchsorted(self.prefixes, prefix))
+        while row < len(self.prefixes) and self.prefixes[row] == prefix:
+            start = self._keys_offset + row * _KEY_BYTES
+            if self._mmap[start:start + _KEY_BYTES] == digest:
+                begin = self._texts_offset + int(self.offsets[row])
+                end = self._texts_offset + int(self.offsets[row + 1])
+                return self._mmap[begin:end].decode("utf-8")
+            row += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Path, size and build metadata for monitoring"""
+        return {"path": self.path, "entries": len(self), **self.metadata}
+
+    def close(self):
+        """Release the mapping"""
+        self.prefixes = self.offsets = None
+        self._mmap.close()
+
+
+def write_explanation_bundle(
+    path: Union[str, Path],
+    texts: Mapping[str, str],
+    metadata: Optional[Mapping[str, Any]] = None
+) -> int:
+    """
+    Write explanation texts by explanation key as a bundle file
+
+    The file is written to a temporary name and moved into place, so
+    workers mapping an older bundle keep a consistent view.
+
+    Args:
+        path: Bundle file to write
+        texts: Explanation key (hex SHA-256) -> text
+        metadata: JSON-serialisable build information (model, prompt
+            version, knowledge base version, ...)
+
+    Returns:
+        Number of bundled texts
+    """
+    digests = sorted(bytes.fromhex(key) for key in texts)
+    if any(len(digest) != _KEY_BYTES for digest in digests):
+        raise ValueError("Explanation keys must be hex SHA-256 digests")
+    encoded = [texts[digest.hex()].encode("utf-8") for digest in digests]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    prefixes = np.array([int.from_bytes(digest[:8], "big") for digest in digests], dtype=">u8")
+    metadata_json = json.dumps(dict(metadata or {}), sort_keys=True).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(BUNDLE_MAGIC, len(digests), len(metadata_json), int(offsets[-1])))
+            f.write(metadata_json)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(prefixes.tobytes())
+            f.write(b"".join(digests))
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(offsets.tobytes())
+            f.write(b"".join(encoded))
+        # mkstemp creates the file private; every worker needs to read it
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(digests)
+
+
+_bundle: Optional[ExplanationBundle] = None
+_lock = threading.Lock()
+
+
+def configure_explanation_bundle(path: Optional[Union[str, Path]]) -> Optional[ExplanationBundle]:
+    """
+    Serve explanations from the bundle at path (None disables it)
+
+    Opening is eager, so a missing or corrupt file fails at startup.
+    """
+    global _bundle
+    bundle = ExplanationBundle(path) if path else None
+    with _lock:
+        _bundle = bundle
+    return bundle
+
+
+def get_explanation_bundle() -> Optional[ExplanationBundle]:
+    """The process-wide explanation bundle, or None"""
+    return _bundle
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+
+
+# Doses within this many significant figures share explanations
+DOSE_SIGNIFICANT_FIGURES = 3
+
+
+def dose_bucket(dose_mg: Optional[float]) -> Optional[float]:
+    """
+    Dose rounded to DOSE_SIGNIFICANT_FIGURES (half up), or None
+
+    e.g. 100.2 -> 100.0, 137.4 -> 137.0, 12.25 -> 12.3, 1234 -> 1230.0
+    """
+    if dose_mg is None:
+        return None
+    dose = Decimal(str(dose_mg))
+    if not dose.is_finite() or dose == 0:
+        return float(dose)
+    exponent = dose.adjusted() - DOSE_SIGNIFICANT_FIGURES + 1
+    return float(dose.quantize(Decimal(1).scaleb(exponent), rounding=ROUND_HALF_UP))
+
+
+def explanation_key(fields: Mapping[str, Any]) -> str:
+    """
+    Content address of an explanation: SHA-256 of its inputs as canonical JSON
+
+    fields should hold everything the generated text depends on (prompt
+    inputs, model and prompt version); key order does not matter.
+    """
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache(ABC):
+    """
+    Generated explanation texts keyed by explanation_key, with TTL and an entry bound
+
+    Entries expire ttl_seconds after they were stored; past max_entries
+    the least recently used are evicted. Subclasses implement the storage;
+    hit/miss counters live here.
+    """
+
+    backend = "none"
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached text for key, or None when missing or expired"""
+        text = self._load(key, self.clock())
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        """Store a generated text"""
+        if self.max_entries > 0:
+            self._store(key, text, self.clock())
+
+    def stats(self) -> Dict:
+        """Counters and occupancy for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.entry_count(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    @abstractmethod
+    def _load(self, key: str, now: float) -> Optional[str]:
+        """Live cached text for key (marking it used), or None"""
+
+    @abstractmethod
+    def _store(self, key: str, text: str, now: float):
+        """Store a text, evicting as needed to stay within max_entries"""
+
+    @abstractmethod
+    def entry_count(self) -> int:
+        """Number of live cached texts"""
+
+
+class MemoryExplanationCache(ExplanationCache):
+    """In-process LRU cache; each server worker process has its own"""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.time):
+        super().__init__(ttl_seconds, max_entries, clock)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def _load(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: str, text: str, now: float):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl_seconds, text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def entry_count(self) -> int:
+        return len(self._entries)
+
+
+# Table of the database backend; created on first use in whatever database it is given
+_metadata = MetaData()
+explanation_cache_table = Table(
+    "explanation_cache",
+    _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("text", Text, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+    Column("last_used_at", Float, nullable=False, index=True),
+)
+
+
+class DatabaseExplanationCache(ExplanationCache):
+    """
+    Cache in an SQL table, shared by every worker and kept across restarts
+
+    A hit refreshes the row's last_used_at; each store drops expired rows
+    and then the least recently used ones beyond max_entries. Stores are
+    rare next to the LLM calls they save, so the extra statements are cheap.
+    """
+
+    backend = "database"
+
+    def __init__(self, engine: Engine, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.time):
+        super().__init__(ttl_seconds, max_entries, clock)
+        self.engine = engine
+        _metadata.create_all(engine, tables=[explanation_cache_table])
+
+    def _load(self, key: str, now: float) -> Optional[str]:
+        table = explanation_cache_table
+        with self.engine.begin() as conn:
+            text = conn.execute(
+                select(table.c.text).where(table.c.key == key, table.c.expires_at > now)
+            ).scalar()
+            if text is not None:
+                conn.execute(update(table).where(table.c.key == key).values(last_used_at=now))
+        return text
+
+    def _store(self, key: str, text: str, now: float):
+        table = explanation_cache_table
+        with self.engine.begin() as conn:
+            conn.execute(delete(table).where((table.c.key == key) | (table.c.expires_at <= now)))
+            conn.execute(insert(table).values(
+                key=key, text=text, created_at=now, expires_at=now + self.ttl_seconds, last_used_at=now,
+            ))
+            excess = conn.execute(select(func.count()).select_from(table)).scalar() - self.max_entries
+            if excess > 0:
+                oldest = select(table.c.key).order_by(table.c.last_used_at).limit(excess).scalar_subquery()
+                conn.execute(delete(table).where(table.c.key.in_(oldest)))
+
+    def entry_count(self) -> int:
+        table = explanation_cache_table
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(table).where(table.c.expires_at > self.clock())
+            ).scalar()
+
+
+def create_explanation_cache(
+    backend: str,
+    ttl_seconds: float,
+    max_entries: int,
+    engine: Optional[Engine] = None
+) -> Optional[ExplanationCache]:
+    """
+    Build the configured explanation cache
+
+    Args:
+        backend: "database", "memory" or "none"
+        ttl_seconds: Lifetime of a cached explanation
+        max_entries: Bound on the number of cached explanations
+        engine: SQLAlchemy engine for the database backend
+
+    Returns:
+        An ExplanationCache, or None when caching is disabled
+    """
+    backend = backend.lower()
+    if backend == "database":
+        if engine is None:
+            raise ValueError("The database explanation cache needs a database engine")
+        return DatabaseExplanationCache(engine, ttl_seconds, max_entries)
+    if backend == "memory":
+        return MemoryExplanationCache(ttl_seconds, max_entries)
+    if backend in ("none", "off", ""):
+        return None
+    raise ValueError(f"Unknown explanation cache backend: {backend}")
+
+
+_cache: Optional[ExplanationCache] = None
+
+
+def configure_explanation_cache(cache: Optional[ExplanationCache]) -> Optional[ExplanationCache]:
+    """Use cache for generated explanations in this process (None disables caching)"""
+    global _cache
+    _cache = cache
+    return cache
+
+
+def get_explanation_cache() -> Optional[ExplanationCache]:
+    """The process-wide explanation cache, or None"""
+    return _cache
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+
+
+# Placeholder text of responses whose narratives are still being generated
+PENDING_EXPLANATION = "Explanation pending: it is delivered on the explanation job's stream or polling endpoint."
+
+JOB_PENDING = "pending"
+JOB_COMPLETE = "complete"
+
+# Table of the job store; created on first use in whatever database it is given
+_metadata = MetaData()
+explanation_jobs_table = Table(
+    "explanation_jobs",
+    _metadata,
+    Column("id", String(32), primary_key=True),
+    Column("patient_id", String(32), nullable=False),
+    Column("status", String(16), nullable=False, index=True),
+    Column("state", Text, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+)
+
+
+class ExplanationJob:
+    """
+    Narratives of one deferred analysis, filled in drug by drug as they finish
+
+    The analysis registers each drug's explanation with run() and awaits
+    seal() once every drug is registered; the job is done when it is
+    sealed and every registered explanation has finished. Results are
+    kept in completion order, which is the order streams deliver them.
+    Each finished drug and the seal are written to the job store, which
+    is what polls and streams read. Use from the event loop that runs
+    the explanations.
+    """
+
+    def __init__(self, store: "ExplanationJobStore", job_id: str, patient_id: str):
+        self.store = store
+        self.id = job_id
+        self.patient_id = patient_id
+        self.drugs: List[str] = []
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.completed: List[str] = []
+        self.sealed = False
+        self._saving = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def done(self) -> bool:
+        return self.sealed and len(self.completed) == len(self.drugs)
+
+    def run(self, drug: str, explain: Awaitable[Tuple[str, str]]):
+        """
+        Generate a drug's narratives in the background
+
+        Args:
+            drug: Drug the narratives are for
+            explain: Awaitable of (clinical_summary, patient_summary)
+        """
+        self.drugs.append(drug)
+
+        async def explain_drug():
+            try:
+                clinical, patient = await explain
+            except Exception as e:
+                result = {"status": "failed", "error": str(e)}
+            else:
+                result = {"status": "complete", "summary": clinical, "patient_summary": patient}
+            await self._finish(drug, result)
+
+        task = asyncio.ensure_future(explain_drug())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def seal(self):
+        """Mark every drug as registered"""
+        self.sealed = True
+        await self._save()
+
+    async def _finish(self, drug: str, result: Dict[str, Any]):
+        self.results[drug] = {"drug": drug, **result}
+        self.completed.append(drug)
+        await self._save()
+
+    async def _save(self):
+        # One write at a time, each taking the state when its turn comes, so
+        # the last write always holds the latest state
+        async with self._saving:
+            await asyncio.to_thread(self.store.save, self.id, self.state(), self.done)
+
+    def state(self) -> Dict[str, Any]:
+        """Drugs, finished results and completion order, as stored"""
+        return {"drugs": list(self.drugs), "results": dict(self.results), "completed": list(self.completed)}
+
+
+class ExplanationJobStore:
+    """
+    Explanation jobs in an SQL table, shared by every worker process
+
+    A job's explanations run on the event loop of the worker that ran its
+    analysis, which writes each change to the table; any worker answers
+    polls from it, and streams poll it every poll_seconds. Jobs older than
+    ttl_seconds are dropped, as are the oldest beyond max_jobs; dropping a
+    job does not stop its explanations, which still reach the explanation
+    cache and the stored results.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        ttl_seconds: float,
+        max_jobs: int,
+        poll_seconds: float = 0.5,
+        clock: Callable[[], float] = time.time
+    ):
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        _metadata.create_all(engine, tables=[explanation_jobs_table])
+
+    async def create(self, patient_id: str) -> ExplanationJob:
+        """Register a new job for an analysis"""
+        job = ExplanationJob(self, f"EXJ-{uuid.uuid4().hex[:12].upper()}", patient_id)
+        await asyncio.to_thread(self._insert, job)
+        return job
+
+    def _insert(self, job: ExplanationJob):
+        table = explanation_jobs_table
+        now = self.clock()
+        with self.engine.begin() as conn:
+            expired = conn.execute(delete(table).where(table.c.created_at <= now - self.ttl_seconds)).rowcount
+            conn.execute(insert(table).values(
+                id=job.id, patient_id=job.patient_id, status=JOB_PENDING,
+                state=json.dumps(job.state()), created_at=now,
+            ))
+            oldest = conn.execute(
+                select(table.c.id).order_by(table.c.created_at.desc()).offset(self.max_jobs)
+            ).scalars().all()
+            if oldest:
+                conn.execute(delete(table).where(table.c.id.in_(oldest)))
+        with self._lock:
+            self.created += 1
+            self.expired += expired
+            self.evicted += len(oldest)
+
+    def save(self, job_id: str, state: Dict[str, Any], done: bool):
+        """Write a job's state"""
+        table = explanation_jobs_table
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id == job_id).values(
+                status=JOB_COMPLETE if done else JOB_PENDING, state=json.dumps(state),
+            ))
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A live job's patient_id, status and state, or None"""
+        table = explanation_jobs_table
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.patient_id, table.c.status, table.c.state)
+                .where(table.c.id == job_id, table.c.created_at > self.clock() - self.ttl_seconds)
+            ).first()
+        if row is None:
+            return None
+        return {"job_id": job_id, "patient_id": row.patient_id, "status": row.status, "state": json.loads(row.state)}
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progress and the narratives finished so far in drug order, or None for an unknown job"""
+        job = self.load(job_id)
+        if job is None:
+            return None
+        state = job["state"]
+        return {
+            "job_id": job_id,
+            "patient_id": job["patient_id"],
+            "status": job["status"],
+            "completed": len(state["completed"]),
+            "total": len(state["drugs"]),
+            "explanations": [state["results"].get(drug) or {"drug": drug, "status": "pending"} for drug in state["drugs"]],
+        }
+
+    async def updates(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Each drug's result as it finishes (already finished ones first), until the job is done or dropped"""
+        sent = 0
+        while True:
+            job = await asyncio.to_thread(self.load, job_id)
+            if job is None:
+                return
+            state = job["state"]
+            for drug in state["completed"][sent:]:
+                yield state["results"][drug]
+            sent = len(state["completed"])
+            if job["status"] == JOB_COMPLETE:
+                return
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and occupancy for monitoring"""
+        table = explanation_jobs_table
+        with self.engine.connect() as conn:
+            rows = dict(conn.execute(
+                select(table.c.status, func.count())
+                .where(table.c.created_at > self.clock() - self.ttl_seconds)
+                .group_by(table.c.status)
+            ).all())
+        return {
+            "jobs": sum(rows.values()),
+            "pending": rows.get(JOB_PENDING, 0),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "max_jobs": self.max_jobs,
+            "ttl_seconds": self.ttl_seconds,
+            "poll_seconds": self.poll_seconds,
+        }
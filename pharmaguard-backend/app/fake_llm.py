@@ -0,0 +1,53 @@
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+
+class FakeLLMError(RuntimeError):
+    """Error injected by FakeLLM"""
+
+
+class FakeLLM:
+    """
+    Local stand-in for the Gemini model with injectable delays and errors
+
+    Answers generate_content / generate_content_async like
+    genai.GenerativeModel, after delay_seconds, failing with FakeLLMError
+    at error_rate (seeded, so runs are repeatable) and for the next
+    fail_next calls. Attributes may be changed while it is in use, e.g.
+    to simulate an outage and recovery. Select it with LLM_PROVIDER=fake.
+    """
+
+    model_name = "fake"
+
+    def __init__(self, delay_seconds: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = 0):
+        self.delay_seconds = delay_seconds
+        self.error_rate = error_rate
+        self.fail_next = 0
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _outcome(self, prompt: str) -> SimpleNamespace:
+        with self._lock:
+            self.calls += 1
+            fail = self.fail_next > 0 or self._random.random() < self.error_rate
+            if self.fail_next > 0:
+                self.fail_next -= 1
+        if fail:
+            raise FakeLLMError("Injected LLM failure")
+        subject = " ".join(line for line in prompt.splitlines()[3:9] if line)
+        return SimpleNamespace(text=f"[fake LLM] Explanation for {subject}.")
+
+    def generate_content(self, prompt: str, generation_config=None) -> SimpleNamespace:
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        return self._outcome(prompt)
+
+    async def generate_content_async(self, prompt: str, generation_config=None) -> SimpleNamespace:
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        return self._outcome(prompt)
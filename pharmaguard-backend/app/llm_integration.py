@@ -1,16 +1,164 @@
+import asyncio
+import logging
 import os
-from typing import Dict, Optional, Tuple
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 import google.generativeai as genai
 
+from app.circuit_breaker import CircuitBreaker
+from app.explanation_bundle import get_explanation_bundle
+from app.explanation_cache import ExplanationCache, dose_bucket, explanation_key, get_explanation_cache
+from app.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-pro"
+
+# Bump whenever a prompt or generation setting changes so cached explanations are not reused
+PROMPT_VERSION = "1"
+
+# Async LLM calls in flight per process, and how long one call may take
+DEFAULT_MAX_CONCURRENT_CALLS = 8
+DEFAULT_CALL_TIMEOUT_SECONDS = 20.0
+
+_settings: Dict[str, Any] = {
+    "max_concurrent_calls": DEFAULT_MAX_CONCURRENT_CALLS,
+    "call_timeout_seconds": DEFAULT_CALL_TIMEOUT_SECONDS,
+    "breaker": CircuitBreaker(),
+    "model": None,
+}
+# One semaphore per event loop (asyncio primitives are bound to the loop that first uses them)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# Concurrent requests for the same explanation layer share one LLM call
+_layer_flights = SingleFlight()
+
+# Explanation outcomes since start: explanations, generated/cached/bundled layers, fallbacks by reason
+_outcomes: Counter = Counter()
+_outcomes_lock = threading.Lock()
+
+
+class LLMUnavailableError(Exception):
+    """The LLM was not called: the circuit breaker is open or the request's latency budget is spent"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason.replace("_", " "))
+        self.reason = reason
+
+
+def configure_explainer(
+    max_concurrent_calls: int = DEFAULT_MAX_CONCURRENT_CALLS,
+    call_timeout_seconds: float = DEFAULT_CALL_TIMEOUT_SECONDS,
+    breaker: Optional[CircuitBreaker] = None,
+    model: Any = None
+):
+    """
+    Set the process-wide limits on LLM calls
+    
+    Args:
+        max_concurrent_calls: Async calls allowed in flight at once; further calls wait
+        call_timeout_seconds: Per-call deadline, after which the explanation
+            falls back to the templates
+        breaker: Circuit breaker guarding the LLM; None for a default one
+        model: Model used instead of Gemini (e.g. app.fake_llm.FakeLLM), or None
+    """
+    if max_concurrent_calls < 1:
+        raise ValueError("max_concurrent_calls must be at least 1")
+    _settings["max_concurrent_calls"] = max_concurrent_calls
+    _settings["call_timeout_seconds"] = call_timeout_seconds
+    _settings["breaker"] = breaker or CircuitBreaker()
+    _settings["model"] = model
+    _semaphores.clear()
+
+
+def explainer_stats() -> Dict:
+    """Explanation outcome counters, fallback rate and circuit breaker state"""
+    with _outcomes_lock:
+        outcomes = dict(_outcomes)
+    explanations = outcomes.pop("explanations", 0)
+    generated = outcomes.pop("generated_layers", 0)
+    cached = outcomes.pop("cached_layers", 0)
+    bundled = outcomes.pop("bundled_layers", 0)
+    fallbacks = sum(outcomes.values())
+    return {
+        "explanations": explanations,
+        "generated_layers": generated,
+        "cached_layers": cached,
+        "bundled_layers": bundled,
+        "fallbacks": fallbacks,
+        "fallback_rate": round(fallbacks / explanations, 4) if explanations else 0.0,
+        "fallback_reasons": {reason[len("fallback:"):]: count for reason, count in outcomes.items()},
+        "breaker": _settings["breaker"].stats(),
+        "single_flight": _layer_flights.stats(),
+    }
+
+
+def _count(*outcomes: str):
+    with _outcomes_lock:
+        _outcomes.update(outcomes)
+
+
+def _fallback_reason(error: BaseException) -> str:
+    if isinstance(error, LLMUnavailableError):
+        return error.reason
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+
+def _dose_note(risk_label: str, dose_mg: Optional[float]) -> str:
+    """Sentence on the current dose for a risk label (with a leading space), or "" without a dose"""
+    if dose_mg is None:
+        return ""
+    if risk_label in ["Adjust Dosage", "Toxic"]:
+        return f" Current dose is {dose_mg} mg; dose reduction or therapeutic substitution is advised."
+    if risk_label == "Safe":
+        return f" Current dose is {dose_mg} mg; this may be maintained with routine clinical monitoring."
+    return f" Current dose is {dose_mg} mg; dose should be titrated cautiously due to uncertain genotype-drug effect."
+
+
+def _call_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_settings["max_concurrent_calls"])
+    return semaphore
+
+
+class SummaryRequest(NamedTuple):
+    """One prompt to the model and how to post-process its answer"""
+    
+    label: str
+    prompt: str
+    max_output_tokens: int
+    temperature: float
+    rsids: List[str]
+    star_allele: str
+    
+    def generation_config(self):
+        return genai.types.GenerationConfig(
+            max_output_tokens=self.max_output_tokens,
+            temperature=self.temperature,
+        )
+
 
 class LLMExplainer:
     """Generate dual-layer clinical explanations using LLM (Google Gemini)"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ExplanationCache] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY", "")
-        if self.api_key:
+        self.cache = cache
+        # Part of every cache key, so texts of different models are never mixed
+        self.model_name = GEMINI_MODEL
+        if _settings["model"] is not None:
+            self.model = _settings["model"]
+            self.model_name = getattr(self.model, "model_name", type(self.model).__name__)
+        elif self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = genai.GenerativeModel(GEMINI_MODEL)
         else:
             self.model = None
     
@@ -27,33 +175,271 @@ class LLMExplainer:
         """
         Generate dual-layer explanations for pharmacogenomic findings
         
+        Texts pre-generated into the explanation bundle (see
+        app.explanation_bundle) are served first, even without a model.
+        Generated texts are looked up in and added to the explanation
+        cache, when there is one. The model is given the dose rounded by
+        dose_bucket(), so near-identical doses share one clinical text.
+        
         Returns:
             Tuple of (clinical_summary, patient_summary)
         """
         
+        _count("explanations")
         if not self.model:
+            bundled = self._bundled_explanations(
+                gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+            )
+            if bundled is not None:
+                return bundled
+            _count("fallback:no_model")
             clinical, patient = self._fallback_explanations(
                 gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
             )
             return clinical, patient
         
+        dose_mg = dose_bucket(current_dose_mg)
+        clinical_key, patient_key = self._cache_keys(
+            gene, drug, phenotype, risk_label, detected_variants, diplotype, dose_mg
+        )
+        bundled_clinical, bundled_patient = self._bundled_layers(
+            gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+        )
         try:
-            clinical = self._generate_clinical_summary(
-                gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+            clinical = self._cached(
+                clinical_key,
+                lambda: self._generate_clinical_summary(
+                    gene, drug, phenotype, risk_label, detected_variants, diplotype, dose_mg
+                ),
+                bundled_clinical
             )
             
-            patient = self._generate_patient_summary(
-                gene, drug, phenotype, risk_label, detected_variants, diplotype
+            patient = self._cached(
+                patient_key,
+                lambda: self._generate_patient_summary(
+                    gene, drug, phenotype, risk_label, detected_variants, diplotype
+                ),
+                bundled_patient
             )
             
             return clinical, patient
         except Exception as e:
-            print(f"LLM error: {e}")
+            _count(f"fallback:{_fallback_reason(e)}")
+            # Counted as a fallback; only errors the breaker does not explain are logged
+            if not isinstance(e, LLMUnavailableError):
+                logger.warning("LLM error, using template explanations: %r", e)
             clinical, patient = self._fallback_explanations(
                 gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
             )
             return clinical, patient
     
+    async def generate_explanations_async(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        current_dose_mg: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Tuple[str, str]:
+        """
+        Generate dual-layer explanations without blocking the event loop
+        
+        Same results as generate_explanations, but the clinical and patient
+        prompts run concurrently, each call is bounded by the process-wide
+        concurrency limit and per-call timeout (see configure_explainer),
+        and a timeout falls back to the template explanations like any
+        other LLM error.
+        
+        Args:
+            deadline: time.monotonic() by which the request needs its
+                explanations; calls are cut short at it and the LLM is not
+                called at all once it has passed (cached texts are still used)
+        
+        Returns:
+            Tuple of (clinical_summary, patient_summary)
+        """
+        
+        _count("explanations")
+        if not self.model:
+            bundled = self._bundled_explanations(
+                gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+            )
+            if bundled is not None:
+                return bundled
+            _count("fallback:no_model")
+            return self._fallback_explanations(
+                gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+            )
+        
+        layers = self.layer_requests(gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg)
+        bundled = self._bundled_layers(gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg)
+        
+        # Let both layers finish (a text that did generate is still cached) before falling back
+        results = await asyncio.gather(
+            *(self._cached_async(key, request, deadline, text) for (key, request), text in zip(layers, bundled)),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            _count(f"fallback:{_fallback_reason(errors[0])}")
+            # Counted as a fallback; only errors the breaker does not explain are logged
+            if not isinstance(errors[0], (LLMUnavailableError, asyncio.TimeoutError)):
+                logger.warning("LLM error, using template explanations: %r", errors[0])
+            return self._fallback_explanations(
+                gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+            )
+        clinical, patient = results
+        return clinical, patient
+    
+    def _cache_keys(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        dose_mg: Optional[float]
+    ) -> Tuple[str, str]:
+        """Explanation cache keys of the clinical and the patient summary"""
+        inputs = {
+            "model": self.model_name,
+            "prompt_version": PROMPT_VERSION,
+            "gene": gene,
+            "drug": drug,
+            "phenotype": phenotype,
+            "risk_label": risk_label,
+            "diplotype": diplotype,
+            "detected_variants": [str(v) for v in detected_variants],
+        }
+        return (
+            explanation_key({**inputs, "layer": "clinical", "dose_mg": dose_mg}),
+            explanation_key({**inputs, "layer": "patient"}),
+        )
+    
+    def layer_requests(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        current_dose_mg: Optional[float] = None
+    ) -> List[Tuple[str, SummaryRequest]]:
+        """
+        Explanation keys and model requests of the clinical and the patient summary
+        
+        The dose is rounded by dose_bucket() as in generate_explanations,
+        so the keys are the ones its texts are cached and bundled under.
+        """
+        dose_mg = dose_bucket(current_dose_mg)
+        clinical_key, patient_key = self._cache_keys(
+            gene, drug, phenotype, risk_label, detected_variants, diplotype, dose_mg
+        )
+        return [
+            (clinical_key, self._clinical_request(gene, drug, phenotype, risk_label, detected_variants, diplotype, dose_mg)),
+            (patient_key, self._patient_request(gene, drug, phenotype, risk_label, detected_variants, diplotype)),
+        ]
+    
+    def _bundled_layers(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        current_dose_mg: Optional[float] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Clinical and patient summaries from the explanation bundle, None where it has none
+        
+        Bundles are pre-generated without a dose. A clinical summary for a
+        dose the bundle lacks is its dose-free text followed by the same
+        dose note as the template explanations.
+        """
+        bundle = get_explanation_bundle()
+        if bundle is None:
+            return None, None
+        clinical_key, patient_key = self._cache_keys(
+            gene, drug, phenotype, risk_label, detected_variants, diplotype, dose_bucket(current_dose_mg)
+        )
+        clinical = bundle.get(clinical_key)
+        if clinical is None and current_dose_mg is not None:
+            dose_free_key, _ = self._cache_keys(gene, drug, phenotype, risk_label, detected_variants, diplotype, None)
+            clinical = bundle.get(dose_free_key)
+            if clinical is not None:
+                clinical = f"{clinical}\n\n{_dose_note(risk_label, current_dose_mg).strip()}"
+        return clinical, bundle.get(patient_key)
+    
+    def _bundled_explanations(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        current_dose_mg: Optional[float] = None
+    ) -> Optional[Tuple[str, str]]:
+        """Both summaries from the explanation bundle, or None unless it has both"""
+        clinical, patient = self._bundled_layers(
+            gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
+        )
+        if clinical is None or patient is None:
+            return None
+        _count("bundled_layers", "bundled_layers")
+        return clinical, patient
+    
+    def _cached(self, key: str, generate, bundled: Optional[str] = None) -> str:
+        """The bundled text when given, else the cached text for key, or generate() stored under key"""
+        if bundled is not None:
+            _count("bundled_layers")
+            return bundled
+        text = self.cache.get(key) if self.cache is not None else None
+        if text is not None:
+            _count("cached_layers")
+            return text
+        text = generate()
+        _count("generated_layers")
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+    
+    async def _cached_async(
+        self,
+        key: str,
+        request: SummaryRequest,
+        deadline: Optional[float] = None,
+        bundled: Optional[str] = None
+    ) -> str:
+        """
+        The bundled text when given, else the cached text for key, or the request's completion stored under key
+        
+        Concurrent misses on one key share a single completion (the first
+        caller's deadline applies to it).
+        """
+        if bundled is not None:
+            _count("bundled_layers")
+            return bundled
+        # The cache may be a database; keep its I/O off the event loop
+        text = await asyncio.to_thread(self.cache.get, key) if self.cache is not None else None
+        if text is not None:
+            _count("cached_layers")
+            return text
+        return await _layer_flights.run(key, lambda: self._generate_and_store(key, request, deadline))
+    
+    async def _generate_and_store(self, key: str, request: SummaryRequest, deadline: Optional[float]) -> str:
+        text = await self.complete_async(request, deadline)
+        _count("generated_layers")
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, text)
+        return text
+    
     def _generate_clinical_summary(
         self,
         gene: str,
@@ -65,6 +451,20 @@ class LLMExplainer:
         current_dose_mg: Optional[float] = None
     ) -> str:
         """Generate technical clinical summary for healthcare professionals"""
+        request = self._clinical_request(gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg)
+        return self._complete(request)
+    
+    def _clinical_request(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str,
+        current_dose_mg: Optional[float] = None
+    ) -> SummaryRequest:
+        """Prompt and generation settings of the clinical summary"""
         
         normalized_variants = [f"rs{v}" if not str(v).startswith("rs") else str(v) for v in detected_variants]
         variants_str = ", ".join(normalized_variants) if normalized_variants else "none detected"
@@ -96,19 +496,7 @@ Required structure (use clear paragraphing and clinician-facing language):
 MANDATORY citation rule: You MUST explicitly include at least one RSID from [{variants_str}] and explicitly include the STAR allele {star_allele} verbatim in the response text.
 Tone requirement: Use professional medical terminology (e.g., biotransformation, bioactivation, therapeutic index, myelosuppression, hemorrhagic risk, platelet inhibition, genotype-guided dosing). Avoid lay simplifications."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=520,
-                    temperature=0.45,
-                )
-            )
-            summary = response.text.strip()
-            return self._ensure_variant_citation(summary, normalized_variants, star_allele)
-        except Exception as e:
-            print(f"Clinical summary generation error: {e}")
-            raise
+        return SummaryRequest("Clinical summary", prompt, 520, 0.45, normalized_variants, star_allele)
     
     def _generate_patient_summary(
         self,
@@ -120,6 +508,18 @@ Tone requirement: Use professional medical terminology (e.g., biotransformation,
         diplotype: str
     ) -> str:
         """Generate simple, jargon-free summary for patients"""
+        return self._complete(self._patient_request(gene, drug, phenotype, risk_label, detected_variants, diplotype))
+    
+    def _patient_request(
+        self,
+        gene: str,
+        drug: str,
+        phenotype: str,
+        risk_label: str,
+        detected_variants: list,
+        diplotype: str
+    ) -> SummaryRequest:
+        """Prompt and generation settings of the patient summary"""
         
         normalized_variants = [f"rs{v}" if not str(v).startswith("rs") else str(v) for v in detected_variants]
         variants_str = ", ".join(normalized_variants) if normalized_variants else "none detected"
@@ -150,19 +550,64 @@ Use: Analogies, simple explanations, empathetic tone
 
 MANDATORY citation rule: Include at least one RSID (for example {normalized_variants[0] if normalized_variants else 'N/A'}) and include the STAR allele {star_allele} explicitly in plain language."""
 
+        return SummaryRequest("Patient summary", prompt, 250, 0.7, normalized_variants, star_allele)
+
+    def _complete(self, request: SummaryRequest) -> str:
+        """Run one summary request on the model, through the circuit breaker"""
+        breaker = _settings["breaker"]
+        if not breaker.allow():
+            raise LLMUnavailableError("circuit_open")
+        start = time.monotonic()
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=250,
-                    temperature=0.7,
-                )
-            )
+            response = self.model.generate_content(request.prompt, generation_config=request.generation_config())
             summary = response.text.strip()
-            return self._ensure_variant_citation(summary, normalized_variants, star_allele)
         except Exception as e:
-            print(f"Patient summary generation error: {e}")
+            breaker.record(False, time.monotonic() - start)
+            logger.debug("%s generation error: %r", request.label, e)
             raise
+        breaker.record(True, time.monotonic() - start)
+        return self._ensure_variant_citation(summary, request.rsids, request.star_allele)
+
+    async def complete_async(self, request: SummaryRequest, deadline: Optional[float] = None) -> str:
+        """
+        Run one summary request on the model without blocking the event loop
+        
+        Holds one of the process-wide call slots for the duration and gives
+        up after the per-call timeout or at the deadline, whichever is
+        first. Calls go through the circuit breaker.
+        
+        Raises:
+            LLMUnavailableError: The breaker is open or the deadline has passed
+        """
+        breaker = _settings["breaker"]
+        async with _call_slots():
+            timeout = _settings["call_timeout_seconds"]
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise LLMUnavailableError("budget_exhausted")
+            if not breaker.allow():
+                raise LLMUnavailableError("circuit_open")
+            start = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(request.prompt, generation_config=request.generation_config()),
+                    timeout
+                )
+                summary = response.text.strip()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except asyncio.TimeoutError:
+                breaker.record(False, time.monotonic() - start)
+                logger.debug("%s generation timed out after %.1fs", request.label, timeout)
+                raise
+            except Exception as e:
+                breaker.record(False, time.monotonic() - start)
+                logger.debug("%s generation error: %r", request.label, e)
+                raise
+            breaker.record(True, time.monotonic() - start)
+        return self._ensure_variant_citation(summary, request.rsids, request.star_allele)
 
     def _ensure_variant_citation(self, summary: str, rsids: list, star_allele: str) -> str:
         """Guarantee explicit RSID and STAR allele citation in generated summary."""
@@ -235,14 +680,7 @@ MANDATORY citation rule: Include at least one RSID (for example {normalized_vari
         # Generic fallback
         variants_str = ", ".join(normalized_variants) if normalized_variants else "multiple variants"
         
-        dose_text = ""
-        if current_dose_mg is not None:
-            if risk_label in ["Adjust Dosage", "Toxic"]:
-                dose_text = f" Current dose is {current_dose_mg} mg; dose reduction or therapeutic substitution is advised."
-            elif risk_label == "Safe":
-                dose_text = f" Current dose is {current_dose_mg} mg; this may be maintained with routine clinical monitoring."
-            else:
-                dose_text = f" Current dose is {current_dose_mg} mg; dose should be titrated cautiously due to uncertain genotype-drug effect."
+        dose_text = _dose_note(risk_label, current_dose_mg)
 
         phenotype_label = "functional status" if gene == "SLCO1B1" else "metabolizer status"
 
@@ -277,10 +715,35 @@ def generate_dual_explanations(
     """
     Convenience function to generate dual-layer explanations
     
+    Uses the process-wide explanation cache (see configure_explanation_cache).
+    
     Returns:
         Tuple of (clinical_summary, patient_summary)
     """
-    explainer = LLMExplainer(api_key=api_key)
+    explainer = LLMExplainer(api_key=api_key, cache=get_explanation_cache())
     return explainer.generate_explanations(
         gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg
     )
+
+
+async def generate_dual_explanations_async(
+    gene: str,
+    drug: str,
+    phenotype: str,
+    risk_label: str,
+    detected_variants: list,
+    diplotype: str,
+    current_dose_mg: Optional[float] = None,
+    api_key: Optional[str] = None,
+    deadline: Optional[float] = None
+) -> Tuple[str, str]:
+    """
+    Async generate_dual_explanations; see LLMExplainer.generate_explanations_async
+    
+    Returns:
+        Tuple of (clinical_summary, patient_summary)
+    """
+    explainer = LLMExplainer(api_key=api_key, cache=get_explanation_cache())
+    return await explainer.generate_explanations_async(
+        gene, drug, phenotype, risk_label, detected_variants, diplotype, current_dose_mg, deadline
+    )
@@ -1,23 +1,50 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query, Depends, status
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query, Depends, Request, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import shutil
+import tempfile
+import time
 import uuid
 from datetime import datetime
-from typing import Optional, List
+from contextlib import ExitStack
+from typing import Awaitable, Callable, Optional, List, Sequence, Tuple
 import os
 from dotenv import load_dotenv
 import json
 
 from app.models import PharmaGuardResponse, RiskAssessment, PharmacogenomicProfile, DetectedVariant, LLMGeneratedExplanation, QualityMetrics
-from app.parsers.vcf_parser import parse_vcf_file, VCFParser
-from app.engines.risk_engine import RiskAssessmentEngine
-from app.llm_integration import generate_dual_explanations
-from app.database import engine, Base, SessionLocal, get_db, User, VCFRecord
+from app.parsers.vcf_parser import parse_vcf_chunks, iter_chunks, iter_line_chunks, VCFEncodingError
+from app.parsers.bgzf import is_gzip_filename, open_decompressed, iter_indexed_lines
+from app.parsers.parallel import parse_vcf_parallel, resolve_workers, shared_path
+from app.parsers.cache import create_parse_cache, parse_cache_key, parse_cache_mode, sha256_stream
+from app.parsers.scanner import HashingReader, scan_vcf_chunks
+from app.parsers.cohort import parse_cohort_chunks
+from app.parsers.rsid_index import configure_rsid_index
+from app.parsers.variant_id import variant_id_text
+from app.engines.knowledge import DEFAULT_KNOWLEDGE_PATH, KnowledgeBase, configure_knowledge, get_knowledge
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+from app.engines.drug_genotype import profile_drug_genotype
+from app.engines.gene_profile import GeneProfile, build_gene_profile
+from app.engines.cohort import assess_cohort
+from app.engines.passport import build_passport, passport_drug
+from app.analysis_jobs import AnalysisJobStore, AnalysisWorkerPool, new_job_id
+from app.explanation_bundle import configure_explanation_bundle
+from app.explanation_jobs import PENDING_EXPLANATION, ExplanationJob, ExplanationJobStore
+from app.llm_integration import configure_explainer, explainer_stats, generate_dual_explanations_async
+from app.circuit_breaker import CircuitBreaker
+from app.fake_llm import FakeLLM
+from app.single_flight import SingleFlight
+from app.explanation_cache import configure_explanation_cache, create_explanation_cache
+from app.results_store import create_results_store, results_response
+from app.database import engine, Base, SessionLocal, get_db, User, VCFRecord, PharmacogenomicPassport
 from app.auth import hash_password, verify_password, create_access_token, verify_token, TokenData
 from app.schemas import UserRegister, UserLogin, AuthResponse, UserResponse, VCFRecordCreate, VCFRecordResponse, VCFRecordDetailResponse, AdminStats, AdminUserResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, text, inspect
+from sqlalchemy import func, desc, text, inspect, or_
 
 load_dotenv()
 
@@ -121,95 +148,162 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Knowledge-Base-Version"],
 )
 
-# Supported drugs for selection-first workflow with professional metadata
-DRUGS_DATABASE = {
-    "CODEINE": {
-        "name": "Codeine",
-        "category": "Analgesic (Opioid)",
-        "genes": ["CYP2D6"],
-        "description": "Opioid pain reliever"
-    },
-    "WARFARIN": {
-        "name": "Warfarin",
-        "category": "Anticoagulant",
-        "genes": ["CYP2C19", "CYP2C9", "VKORC1"],
-        "description": "Blood thinner for stroke/clot prevention"
-    },
-    "CLOPIDOGREL": {
-        "name": "Clopidogrel (Plavix)",
-        "category": "Antiplatelet",
-        "genes": ["CYP2C19"],
-        "description": "Antiplatelet agent for cardiovascular events"
-    },
-    "SIMVASTATIN": {
-        "name": "Simvastatin",
-        "category": "Statin (Lipid-Lowering)",
-        "genes": ["SLCO1B1"],
-        "description": "Cholesterol management"
-    },
-    "AZATHIOPRINE": {
-        "name": "Azathioprine",
-        "category": "Immunosuppressant",
-        "genes": ["TPMT"],
-        "description": "Immune system suppressor for autoimmune conditions"
-    },
-    "FLUOROURACIL": {
-        "name": "Fluorouracil (5-FU)",
-        "category": "Chemotherapy",
-        "genes": ["DPYD"],
-        "description": "Anticancer agent"
-    },
-    "METOPROLOL": {
-        "name": "Metoprolol",
-        "category": "Beta-Blocker",
-        "genes": ["CYP2D6"],
-        "description": "Blood pressure & heart rate control"
-    },
-    "ATENOLOL": {
-        "name": "Atenolol",
-        "category": "Beta-Blocker",
-        "genes": ["CYP2D6"],
-        "description": "Hypertension and angina management"
-    },
-    "SERTRALINE": {
-        "name": "Sertraline (Zoloft)",
-        "category": "SSRI (Antidepressant)",
-        "genes": ["CYP2D6", "CYP2C19"],
-        "description": "Depression and anxiety treatment"
-    },
-    "ESCITALOPRAM": {
-        "name": "Escitalopram (Lexapro)",
-        "category": "SSRI (Antidepressant)",
-        "genes": ["CYP2C19"],
-        "description": "Depression and anxiety management"
-    },
-    "TOPIRAMATE": {
-        "name": "Topiramate (Topamax)",
-        "category": "Anticonvulsant",
-        "genes": ["CYP2D6"],
-        "description": "Seizure control and migraine prevention"
-    },
-    "PHENYTOIN": {
-        "name": "Phenytoin (Dilantin)",
-        "category": "Anticonvulsant",
-        "genes": ["CYP2C19", "CYP2C9"],
-        "description": "Seizure prevention"
-    },
-}
-
-SUPPORTED_DRUGS = [
-    "CODEINE",
-    "WARFARIN",
-    "CLOPIDOGREL",
-    "SIMVASTATIN",
-    "AZATHIOPRINE",
-    "FLUOROURACIL",
-]
-
-# In-memory storage for results (in production, use database)
-analysis_results = {}
+
+@app.middleware("http")
+async def add_knowledge_version_header(request: Request, call_next):
+    """Tag every response with the knowledge base version it was served under"""
+    response = await call_next(request)
+    if "X-Knowledge-Base-Version" not in response.headers:
+        response.headers["X-Knowledge-Base-Version"] = get_knowledge().version
+    return response
+
+
+# Drug metadata, gene/allele tables and CPIC rules come from a versioned
+# knowledge base file, re-read when it changes (every worker checks at most
+# once per KNOWLEDGE_RELOAD_SECONDS; negative disables reloading)
+KNOWLEDGE_STORE = configure_knowledge(
+    os.getenv("KNOWLEDGE_BASE_PATH") or DEFAULT_KNOWLEDGE_PATH,
+    float(os.getenv("KNOWLEDGE_RELOAD_SECONDS", "5")),
+)
+
+# Optional memory-mapped rsID -> gene/star index (python -m app.parsers.rsid_index)
+# for VCFs without GENE= annotations; shared by all workers via the page cache
+RSID_INDEX = configure_rsid_index(os.getenv("RSID_INDEX_PATH"))
+
+# Maximum accepted upload for analysis; VCFs are streamed so this only guards disk
+MAX_UPLOAD_MB = float(os.getenv("MAX_VCF_UPLOAD_MB", "4096"))
+
+# Uploads at least this large are parsed across a process pool
+PARALLEL_PARSE_MIN_MB = float(os.getenv("PARALLEL_PARSE_MIN_MB", "256"))
+# Parse pool size (0 = one per CPU) and bytes handed to each worker task
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+PARSE_RANGE_MB = float(os.getenv("PARSE_RANGE_MB", "32"))
+
+# Parsed-VCF cache keyed by upload SHA-256: "memory" (per worker), "disk" (shared) or "none"
+PARSE_CACHE = create_parse_cache(
+    os.getenv("PARSE_CACHE_BACKEND", "memory"),
+    int(float(os.getenv("PARSE_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    os.getenv("PARSE_CACHE_DIR") or None,
+)
+
+# Generated LLM explanations keyed by their inputs: "database" (shared by all
+# workers, kept across restarts), "memory" (per worker) or "none"
+EXPLANATION_CACHE = configure_explanation_cache(create_explanation_cache(
+    os.getenv("EXPLANATION_CACHE_BACKEND", "database"),
+    float(os.getenv("EXPLANATION_CACHE_TTL_HOURS", "720")) * 3600,
+    int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "50000")),
+    engine,
+))
+
+# Optional memory-mapped explanations pre-generated for every knowledge base
+# genotype (python -m app.pregenerate_explanations); served before the cache
+EXPLANATION_BUNDLE = configure_explanation_bundle(os.getenv("EXPLANATION_BUNDLE_PATH"))
+
+# Gemini calls in flight per worker process, and the deadline of one call
+# before an explanation falls back to the templates
+configure_explainer(
+    int(os.getenv("LLM_MAX_CONCURRENT_CALLS", "8")),
+    float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "20")),
+    # Stop calling Gemini while it fails or is slow; probe again after a pause
+    CircuitBreaker(
+        window_size=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+        error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "10")),
+        open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+    ),
+    # LLM_PROVIDER=fake answers locally, with optional injected delay and errors
+    FakeLLM(
+        float(os.getenv("FAKE_LLM_DELAY_SECONDS", "0")),
+        float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+    ) if os.getenv("LLM_PROVIDER", "gemini").lower() == "fake" else None,
+)
+# Time an analysis request may spend before its explanations skip the LLM
+LLM_REQUEST_BUDGET_SECONDS = float(os.getenv("LLM_REQUEST_BUDGET_SECONDS", "60"))
+
+# Deferred narratives (analyze-vcf explanations=deferred) by job ID, kept in
+# the database for EXPLANATION_JOB_TTL_SECONDS so any worker can serve them;
+# streams poll it every EXPLANATION_JOB_POLL_SECONDS
+EXPLANATION_JOBS = ExplanationJobStore(
+    engine,
+    float(os.getenv("EXPLANATION_JOB_TTL_SECONDS", "3600")),
+    int(os.getenv("EXPLANATION_JOB_MAX", "10000")),
+    float(os.getenv("EXPLANATION_JOB_POLL_SECONDS", "0.5")),
+)
+
+# analyze-vcf requests in flight by (upload hash, drugs, doses, ...); see run_analysis
+ANALYSIS_FLIGHTS = SingleFlight()
+
+# Background analyses (POST /api/v1/jobs) are kept in the database, so any
+# worker can report on them and they survive restarts; each worker process runs
+# ANALYSIS_JOB_WORKERS of them at a time (0 leaves this worker's pool idle).
+# Uploads are saved to ANALYSIS_JOB_DIR, which all workers must share.
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+ANALYSIS_JOB_DIR = os.getenv("ANALYSIS_JOB_DIR") or os.path.join(tempfile.gettempdir(), "pharmaguard-jobs")
+# Jobs have no client waiting, so their LLM narratives get a longer budget
+ANALYSIS_JOB_LLM_BUDGET_SECONDS = float(os.getenv("ANALYSIS_JOB_LLM_BUDGET_SECONDS", "600"))
+ANALYSIS_JOBS = AnalysisJobStore(engine)
+ANALYSIS_WORKERS = AnalysisWorkerPool(
+    ANALYSIS_JOBS,
+    lambda job, progress: run_analysis_job(job, progress),
+    workers=ANALYSIS_JOB_WORKERS,
+    poll_seconds=float(os.getenv("ANALYSIS_JOB_POLL_SECONDS", "1")),
+    stale_seconds=float(os.getenv("ANALYSIS_JOB_STALE_SECONDS", "300")),
+    max_attempts=int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3")),
+    retention_seconds=float(os.getenv("ANALYSIS_JOB_RETENTION_HOURS", "24")) * 3600,
+)
+
+# Per-line diagnostics collected before /validate-vcf stops reading a file
+VALIDATE_MAX_ERRORS = int(os.getenv("VALIDATE_MAX_ERRORS", "100"))
+
+# Analysis results served by /api/v1/results/{patient_id}: "database"
+# (shared by all workers) or "memory" (per worker), bounded by age, count and size
+RESULTS_STORE = create_results_store(
+    os.getenv("RESULTS_STORE_BACKEND", "database"),
+    float(os.getenv("RESULTS_TTL_HOURS", "24")) * 3600,
+    int(os.getenv("RESULTS_MAX_ENTRIES", "10000")),
+    int(float(os.getenv("RESULTS_MAX_MB", "256")) * 1024 * 1024),
+    engine,
+)
+
+
+def parse_drug_selection(drug: str, knowledge: Optional[KnowledgeBase] = None) -> List[str]:
+    """
+    Parse a comma-separated drug selection
+    
+    Known drugs become uppercase IDs and custom drugs title-case labels;
+    duplicates are dropped preserving order.
+    """
+    supported_drugs = (knowledge or get_knowledge()).supported_drugs
+    raw_drugs = [d.strip() for d in drug.split(",") if d.strip()]
+    if not raw_drugs:
+        raise HTTPException(status_code=400, detail="At least one drug is required")
+
+    # Normalize: known drugs as uppercase IDs, custom drugs as title-case labels
+    drug_list = []
+    for raw_drug in raw_drugs:
+        upper_drug = raw_drug.upper()
+        if upper_drug in supported_drugs:
+            normalized_drug = upper_drug
+        else:
+            normalized_drug = " ".join(raw_drug.split()).title()
+        if normalized_drug:
+            drug_list.append(normalized_drug)
+    
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(drug_list))
+
+
+def relevant_genes_for(drug: str, knowledge: Optional[KnowledgeBase] = None) -> Sequence[str]:
+    """Genes affecting a drug; custom drugs fall back to all key pharmacogenes"""
+    knowledge = knowledge or get_knowledge()
+    drug_info = knowledge.drugs.get(drug)
+    genes = drug_info.get("genes") if drug_info else None
+    if not genes:
+        genes = knowledge.default_relevant_genes
+    return genes
 
 
 @app.get("/")
@@ -225,60 +319,30 @@ async def root():
 @app.get("/api/v1/drugs")
 async def get_supported_drugs():
     """Get list of supported drugs with metadata"""
+    knowledge = get_knowledge()
     drugs_list = [
         {
             "id": drug_id,
             **drug_info
         }
-        for drug_id, drug_info in DRUGS_DATABASE.items()
-        if drug_id in SUPPORTED_DRUGS
+        for drug_id, drug_info in knowledge.drugs.items()
+        if drug_id in knowledge.supported_drugs
     ]
     return {
         "drugs": drugs_list,
         "count": len(drugs_list),
-        "categories": list(set(d["category"] for d in drugs_list))
+        "categories": list(set(d["category"] for d in drugs_list)),
+        "knowledge_base_version": knowledge.version,
     }
 
 
-@app.post("/api/v1/analyze-vcf")
-async def analyze_vcf(
-    file: UploadFile = File(...),
-    drug: str = Query(...),
-    dosage_mg: Optional[float] = Query(None, ge=0),
-    dosage_map: Optional[str] = Query(None)
-):
+def parse_dosage_map(dosage_map: Optional[str], knowledge: KnowledgeBase) -> dict:
     """
-    Upload and analyze VCF file with pre-selected drug(s)
+    Parse an optional per-drug dosage map JSON, e.g. {"WARFARIN": 5, "Metformin": 500}
     
-    Args:
-        file: VCF file
-        drug: Pre-selected drug(s) - single drug (CODEINE) or multiple comma-separated (CODEINE,WARFARIN)
-    
-    Returns:
-        Analysis results in PharmaGuardResponse format or list of results for multiple drugs
+    Drug names are normalized like parse_drug_selection; entries without a
+    usable dose are skipped.
     """
-    
-    # Parse drugs (support known list + free-text custom drugs)
-    raw_drugs = [d.strip() for d in drug.split(",") if d.strip()]
-    if not raw_drugs:
-        raise HTTPException(status_code=400, detail="At least one drug is required")
-
-    # Normalize: known drugs as uppercase IDs, custom drugs as title-case labels
-    drug_list = []
-    for raw_drug in raw_drugs:
-        upper_drug = raw_drug.upper()
-        if upper_drug in SUPPORTED_DRUGS:
-            normalized_drug = upper_drug
-        else:
-            normalized_drug = " ".join(raw_drug.split()).title()
-        if normalized_drug:
-            drug_list.append(normalized_drug)
-    
-    # Remove duplicates while preserving order
-    drug_list = list(dict.fromkeys(drug_list))
-
-    # Parse optional per-drug dosage map JSON, example:
-    # {"WARFARIN": 5, "Metformin": 500}
     per_drug_dosage = {}
     if dosage_map:
         try:
@@ -291,7 +355,7 @@ async def analyze_vcf(
                     if not key_text:
                         continue
                     upper_key = key_text.upper()
-                    normalized_key = upper_key if upper_key in SUPPORTED_DRUGS else " ".join(key_text.split()).title()
+                    normalized_key = upper_key if upper_key in knowledge.supported_drugs else " ".join(key_text.split()).title()
 
                     try:
                         dose_value = float(raw_val)
@@ -307,322 +371,450 @@ async def analyze_vcf(
                 status_code=400,
                 detail="Invalid dosage_map format. Provide valid JSON object, e.g. {\"WARFARIN\":5}"
             )
+    return per_drug_dosage
+
+
+def check_vcf_upload(filename: Optional[str], upload, has_index: bool = False) -> float:
+    """
+    Validate an uploaded VCF's name and size without reading it
     
-    try:
-        # Validate file
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file provided")
-            
-        if not file.filename.endswith('.vcf'):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid file type: '{file.filename}'. Must be .vcf file"
-            )
-        
-        # Read file content
-        content = await file.read()
-        
-        # Check for empty file
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty")
-        
-        # Check file size (5 MB limit)
-        file_size_mb = len(content) / (1024 * 1024)
-        if file_size_mb > 5:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large: {file_size_mb:.2f} MB (max 5 MB)"
-            )
+    Returns:
+        Upload size in MB
+    
+    Raises:
+        HTTPException: 400 for a missing, mistyped, empty, tiny or oversized upload
+    """
+    # Validate file
+    if not filename:
+        raise HTTPException(status_code=400, detail="No file provided")
         
-        # Decode content
-        try:
-            vcf_content = content.decode('utf-8')
-        except UnicodeDecodeError:
-            raise HTTPException(
-                status_code=400, 
-                detail="File encoding error: must be valid UTF-8"
+    compressed = is_gzip_filename(filename)
+    if not filename.endswith('.vcf') and not compressed:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid file type: '{filename}'. Must be .vcf or .vcf.gz file"
+        )
+    if has_index and not compressed:
+        raise HTTPException(
+            status_code=400,
+            detail="A tabix index can only be supplied with a bgzip-compressed .vcf.gz file"
+        )
+    
+    # Measure the spooled upload without reading it into memory
+    upload.seek(0, os.SEEK_END)
+    file_size = upload.tell()
+    upload.seek(0)
+    
+    # Check for empty file
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    
+    # Check file size (configurable, large enough for whole-genome VCFs)
+    file_size_mb = file_size / (1024 * 1024)
+    if file_size_mb > MAX_UPLOAD_MB:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large: {file_size_mb:.2f} MB (max {MAX_UPLOAD_MB:g} MB)"
+        )
+    
+    # Check if file has minimum content
+    if file_size < 10:
+        raise HTTPException(status_code=400, detail="VCF file is too small or invalid")
+    return file_size_mb
+
+
+@app.post("/api/v1/analyze-vcf")
+async def analyze_vcf(
+    file: UploadFile = File(...),
+    index: Optional[UploadFile] = File(None),
+    drug: str = Query(...),
+    dosage_mg: Optional[float] = Query(None, ge=0),
+    dosage_map: Optional[str] = Query(None),
+    passport: bool = Query(False),
+    explanations: str = Query("inline", pattern="^(inline|deferred)$")
+):
+    """
+    Upload and analyze VCF file with pre-selected drug(s)
+    
+    Args:
+        file: VCF file (.vcf, or bgzip-compressed .vcf.gz)
+        index: Optional tabix index (.tbi) for a .vcf.gz; only the blocks covering pharmacogene
+            loci are read, unless the header declares a GENE INFO field
+        drug: Pre-selected drug(s) - single drug (CODEINE) or multiple comma-separated (CODEINE,WARFARIN)
+        passport: Also store a whole-panel passport (every known drug) for later
+            drug queries without re-upload; see /api/v1/passports
+        explanations: "inline" waits for the LLM narratives; "deferred" returns
+            at once with placeholder narratives and an explanation_job_id whose
+            narratives arrive on /api/v1/explanations/{id}/stream (or by polling
+            /api/v1/explanations/{id}) drug by drug as they finish
+    
+    Returns:
+        Analysis results in PharmaGuardResponse format or list of results for multiple drugs
+    """
+    
+    # One knowledge base version answers the whole request, even across a reload
+    risk_engine = get_engine()
+    llm_deadline = time.monotonic() + LLM_REQUEST_BUDGET_SECONDS
+
+    # Parse drugs (support known list + free-text custom drugs) and per-drug doses
+    drug_list = parse_drug_selection(drug, risk_engine.knowledge)
+    per_drug_dosage = parse_dosage_map(dosage_map, risk_engine.knowledge)
+    
+    try:
+        file_size_mb = check_vcf_upload(file.filename, file.file, index is not None)
+        return await analyze_upload(
+            file.file, file.filename, index.file if index is not None else None, file_size_mb,
+            drug_list, per_drug_dosage, dosage_mg, passport, explanations, risk_engine, llm_deadline
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+
+async def analyze_upload(
+    upload,
+    filename: str,
+    index_file,
+    file_size_mb: float,
+    drug_list: List[str],
+    per_drug_dosage: dict,
+    dosage_mg: Optional[float],
+    passport: bool,
+    explanations: str,
+    risk_engine: RiskAssessmentEngine,
+    llm_deadline: Optional[float],
+    progress: Optional[Callable[[str, float], Awaitable[None]]] = None
+):
+    """
+    Parse, profile, assess and explain an uploaded VCF for the selected drugs
+    
+    The pipeline behind analyze-vcf and the analysis job workers.
+    
+    Args:
+        upload: Seekable binary VCF file (plain or bgzip-compressed)
+        filename: Upload file name
+        index_file: Tabix index of a .vcf.gz, or None
+        file_size_mb: Upload size (see check_vcf_upload)
+        progress: Async callback given (stage, fraction done) as the
+            analysis advances; an analysis with one runs on its own rather
+            than joining an identical one in flight
+    
+    Returns:
+        A PharmaGuardResponse, or a dict of analyses for several drugs
+    """
+    knowledge = risk_engine.knowledge
+    compressed = is_gzip_filename(filename)
+    
+    async def report(stage: str, fraction: float):
+        if progress is not None:
+            await progress(stage, fraction)
+    
+    # Re-runs of the same file (e.g. another drug selection) reuse the cached parse
+    parse_mode = parse_cache_mode(compressed, index_file is not None, RSID_INDEX)
+    content_hash = await run_in_threadpool(sha256_stream, upload)
+    
+    async def run_analysis():
+        await report("parsing", 0.05)
+        cache_key = None
+        parsed_data, success = None, True
+        if PARSE_CACHE is not None:
+            cache_key = parse_cache_key(content_hash, parse_mode)
+            parsed_data = await run_in_threadpool(PARSE_CACHE.get, cache_key)
+    
+        if parsed_data is None:
+            # Choose a block source: tabix region seek, sequential gunzip, or plain stream
+            if compressed and index_file is not None:
+                chunks = iter_line_chunks(iter_indexed_lines(upload, index_file))
+            elif compressed:
+                chunks = iter_chunks(open_decompressed(upload))
+            else:
+                chunks = iter_chunks(upload)
+    
+            # Large plain VCFs are split into byte ranges parsed on the process pool
+            use_pool = (
+                not compressed
+                and file_size_mb >= PARALLEL_PARSE_MIN_MB
+                and resolve_workers(PARSE_WORKERS) > 1
+                and shared_path(upload) is not None
             )
+    
+            # Stream-parse VCF in a worker thread so the event loop stays free
+            if use_pool:
+                parsed_data, success = await run_in_threadpool(
+                    parse_vcf_parallel, upload, PARSE_WORKERS, int(PARSE_RANGE_MB * 1024 * 1024)
+                )
+            else:
+                parsed_data, success = await run_in_threadpool(parse_vcf_chunks, chunks)
         
-        # Check if file has minimum content
-        if len(vcf_content.strip()) < 10:
-            raise HTTPException(status_code=400, detail="VCF file is too small or invalid")
-        
-        # Parse VCF
-        parsed_data, success = parse_vcf_file(vcf_content)
-        
+            if success and cache_key is not None:
+                await run_in_threadpool(PARSE_CACHE.put, cache_key, parsed_data)
+    
         if not success:
             error_msg = parsed_data.get('error', 'Unknown parsing error')
             raise HTTPException(
                 status_code=400,
                 detail=f"VCF parsing failed: {error_msg}"
             )
-        
+    
         # Generate patient ID
         patient_id = f"PAT-{uuid.uuid4().hex[:12].upper()}"
-        
+    
         # Extract variants
         variants = parsed_data.get('variants', [])
         target_genes = parsed_data.get('target_genes_found', [])
+    
+        # Star alleles and phenotypes are called once per gene and shared by every drug
+        await report("profiling", 0.4)
+        profile = build_gene_profile(variants, risk_engine)
+    
+        passport_id = None
+        if passport:
+            passport_id = await run_in_threadpool(
+                save_passport, patient_id, content_hash, filename, variants, risk_engine
+            )
+    
+        await report("explaining", 0.5)
+        finished = 0
+        
+        async def tracked(analysis):
+            nonlocal finished
+            result = await analysis
+            finished += 1
+            await report("explaining", 0.5 + 0.45 * finished / len(drug_list))
+            return result
+        
+        # Deferred narratives are generated after the response, drug by drug,
+        # and filled into the stored results once those are written
+        explanation_job = await EXPLANATION_JOBS.create(patient_id) if explanations == "deferred" else None
+        results_stored = asyncio.Event()
+        try:
+            # Several drugs' LLM explanations run concurrently
+            if len(drug_list) > 1:
+                results = await asyncio.gather(*(
+                    tracked(analyze_single_drug(
+                        patient_id, drug_choice, variants, parsed_data, filename,
+                        per_drug_dosage.get(drug_choice, dosage_mg), risk_engine, profile, llm_deadline,
+                        explanation_job, results_stored
+                    ))
+                    for drug_choice in drug_list
+                ))
+            else:
+                result = await analyze_single_drug(
+                    patient_id, drug_list[0], variants, parsed_data, filename,
+                    per_drug_dosage.get(drug_list[0], dosage_mg), risk_engine, profile,
+                    llm_deadline, explanation_job, results_stored
+                )
+                result.passport_id = passport_id
+                results = [result]
+            await run_in_threadpool(RESULTS_STORE.put, patient_id, stored_results(filename, results))
+        finally:
+            results_stored.set()
+            if explanation_job is not None:
+                await explanation_job.seal()
         
         # If multiple drugs, return list of results
         if len(drug_list) > 1:
-            results = []
-            for drug_choice in drug_list:
-                selected_dosage = per_drug_dosage.get(drug_choice, dosage_mg)
-                result = analyze_single_drug(
-                    patient_id, drug_choice, variants, parsed_data, file.filename, selected_dosage
-                )
-                results.append(result)
-            return {"analyses": results, "patient_id": patient_id, "drug_count": len(results)}
-        else:
-            # Single drug analysis
-            selected_dosage = per_drug_dosage.get(drug_list[0], dosage_mg)
-            return analyze_single_drug(
-                patient_id, drug_list[0], variants, parsed_data, file.filename, selected_dosage
-            )
+            return {
+                "analyses": results,
+                "patient_id": patient_id,
+                "drug_count": len(results),
+                "knowledge_base_version": knowledge.version,
+                "passport_id": passport_id,
+                "explanation_job_id": explanation_job.id if explanation_job and explanation_job.drugs else None,
+            }
+        return results[0]
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+    if progress is not None:
+        return await run_analysis()
+    
+    # Identical in-flight requests (e.g. a double-clicked upload) share one analysis
+    flight_key = (
+        content_hash,
+        parse_mode,
+        knowledge.version,
+        tuple(drug_list),
+        tuple(per_drug_dosage.get(drug_choice, dosage_mg) for drug_choice in drug_list),
+        passport,
+        explanations,
+    )
+    return await ANALYSIS_FLIGHTS.run(flight_key, run_analysis)
 
 
-def analyze_single_drug(
-    patient_id: str,
-    drug: str,
-    variants: list,
-    parsed_data: dict,
-    filename: str,
-    dosage_mg: Optional[float] = None
+@app.on_event("startup")
+async def start_analysis_workers():
+    ANALYSIS_WORKERS.start()
+
+
+@app.on_event("shutdown")
+async def stop_analysis_workers():
+    await ANALYSIS_WORKERS.stop()
+
+
+def save_job_upload(upload, job_id: str, suffix: str) -> str:
+    """Copy an upload into ANALYSIS_JOB_DIR for the job workers, returning its path"""
+    os.makedirs(ANALYSIS_JOB_DIR, exist_ok=True)
+    path = os.path.join(ANALYSIS_JOB_DIR, f"{job_id}{suffix}")
+    upload.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(upload, out, 1024 * 1024)
+    return path
+
+
+@app.post("/api/v1/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    index: Optional[UploadFile] = File(None),
+    drug: str = Query(...),
+    dosage_mg: Optional[float] = Query(None, ge=0),
+    dosage_map: Optional[str] = Query(None),
+    passport: bool = Query(False)
 ):
-    """Analyze VCF for a single drug"""
-    
-    # Drug to gene mapping
-    drug_gene_mapping = {drug_id: info["genes"] for drug_id, info in DRUGS_DATABASE.items()}
-    
-    # Get relevant genes for this drug (custom drugs fall back to all key pharmacogenes)
-    relevant_genes = drug_gene_mapping.get(drug)
-    if not relevant_genes:
-        relevant_genes = ["CYP2D6", "CYP2C19", "CYP2C9", "SLCO1B1", "TPMT", "DPYD", "VKORC1"]
-    
-    # Filter variants to relevant genes only
-    relevant_variants = [v for v in variants if v.get('gene') in relevant_genes]
+    """
+    Queue a VCF analysis and return its job ID at once
     
-    # If no relevant variants found
-    if not relevant_variants:
-        return create_no_variants_response(patient_id, drug, variants, dosage_mg)
+    Takes the same upload and parameters as analyze-vcf. Poll
+    /api/v1/jobs/{job_id} for its stage and progress, and for the result
+    (the analyze-vcf response) once it has completed.
+    """
+    knowledge = get_knowledge()
+    drug_list = parse_drug_selection(drug, knowledge)
+    per_drug_dosage = parse_dosage_map(dosage_map, knowledge)
+    check_vcf_upload(file.filename, file.file, index is not None)
     
-    # Prioritize genes for better drug-specific interpretation
-    gene_priority = {
-        "WARFARIN": ["CYP2C9", "VKORC1", "CYP2C19"]
+    job_id = new_job_id()
+    suffix = ".vcf.gz" if is_gzip_filename(file.filename) else ".vcf"
+    upload_path = await run_in_threadpool(save_job_upload, file.file, job_id, suffix)
+    index_path = None
+    if index is not None:
+        index_path = await run_in_threadpool(save_job_upload, index.file, job_id, suffix + ".tbi")
+    request = {
+        "filename": file.filename,
+        "drugs": drug_list,
+        "per_drug_dosage": per_drug_dosage,
+        "dosage_mg": dosage_mg,
+        "passport": passport,
     }
-    preferred_genes = gene_priority.get(drug, [])
-    sorted_variants = sorted(
-        relevant_variants,
-        key=lambda v: preferred_genes.index(v.get("gene")) if v.get("gene") in preferred_genes else 999
-    )
+    await run_in_threadpool(ANALYSIS_JOBS.submit, request, upload_path, index_path, job_id)
+    ANALYSIS_WORKERS.notify()
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/v1/jobs/{job_id}"}
+
+
+async def run_analysis_job(job: dict, progress) -> dict:
+    """Run a claimed analysis job; its result is the JSON analyze-vcf would have returned"""
+    request = job["request"]
+    with ExitStack() as files:
+        upload = files.enter_context(open(job["upload_path"], "rb"))
+        index_file = files.enter_context(open(job["index_path"], "rb")) if job["index_path"] else None
+        result = await analyze_upload(
+            upload, request["filename"], index_file, os.path.getsize(job["upload_path"]) / (1024 * 1024),
+            request["drugs"], request["per_drug_dosage"], request["dosage_mg"], request["passport"], "inline",
+            get_engine(), time.monotonic() + ANALYSIS_JOB_LLM_BUDGET_SECONDS, progress
+        )
+    return jsonable_encoder(result)
 
-    # Use highest-priority relevant gene
-    gene = sorted_variants[0].get('gene')
-
-    # Keep only variants belonging to the selected primary gene
-    gene_specific_variants = [v for v in sorted_variants if v.get('gene') == gene]
-
-    # For CYP2C9 interpretation, only keep known CYP2C9 star-defining SNPs
-    cyp2c9_star_rsids = {
-        "rs9332131",  # *12
-        "rs1057910",  # *3
-        "rs1799853",  # *2
-        "rs28371686",  # *5
-        "rs9332242",  # *6
-        "rs7900194",  # *8
-        "rs28371685",  # *11
-    }
-    cyp2c9_rsid_to_star = {
-        "rs9332131": "*12",
-        "rs1057910": "*3",
-        "rs1799853": "*2",
-        "rs28371686": "*5",
-        "rs9332242": "*6",
-        "rs7900194": "*8",
-        "rs28371685": "*11",
-    }
-    cyp2c19_rsid_to_star = {
-        "rs4244285": "*2",
-        "rs4986893": "*3",
-        "rs28399504": "*4",
-        "rs12769205": "*5",
-        "rs17884712": "*6",
-        "rs56337013": "*8",
-    }
-    slco1b1_rsid_to_star = {
-        "rs4149056": "*5",
-    }
-    dpyd_rsid_to_star = {
-        "rs3918290": "*2A",
-        "rs67376798": "*13",
-        "rs56038477": "HapB3",
-        "rs75017182": "HapB3",
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Status, stage and progress of an analysis job, with its result or error once finished"""
+    job = await run_in_threadpool(ANALYSIS_JOBS.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "drugs": job["request"]["drugs"],
+        "attempts": job["attempts"],
+        "created_at": datetime.utcfromtimestamp(job["created_at"]).isoformat() + "Z",
+        "result": job["result"],
+        "error": job["error"],
     }
 
-    if gene == "CYP2C9":
-        cyp2c9_variants = []
-        for variant in gene_specific_variants:
-            rsid = str(variant.get("rsid") or "").strip().lower()
-            if rsid in cyp2c9_star_rsids:
-                cyp2c9_variants.append(variant)
-        if cyp2c9_variants:
-            gene_specific_variants = cyp2c9_variants
-    
-    star_allele = gene_specific_variants[0].get('star') or '*1'
-
-    # Extract variant data
-    variant_rsids = [
-        (str(v.get('rsid')).strip() if v.get('rsid') else f"chr{v.get('chrom')}_{v.get('pos')}")
-        for v in gene_specific_variants
-    ]
-    variant_rsids = list(dict.fromkeys(variant_rsids))
-
-    if gene == "CYP2C9" and (not star_allele or star_allele == "*1"):
-        inferred_star = cyp2c9_rsid_to_star.get(variant_rsids[0].lower()) if variant_rsids else None
-        if inferred_star:
-            star_allele = inferred_star
-    if gene == "CYP2C19":
-        # Prefer *2 call when rs4244285 is present; otherwise use known allele rsid mapping
-        normalized_rsids_for_inference = [rsid.lower() for rsid in variant_rsids if isinstance(rsid, str)]
-        if "rs4244285" in normalized_rsids_for_inference:
-            star_allele = "*2"
-        elif (not star_allele or star_allele == "*1") and normalized_rsids_for_inference:
-            inferred_star = cyp2c19_rsid_to_star.get(normalized_rsids_for_inference[0])
-            if inferred_star:
-                star_allele = inferred_star
-    if gene == "SLCO1B1" and (not star_allele or star_allele == "*1"):
-        inferred_star = slco1b1_rsid_to_star.get(variant_rsids[0].lower()) if variant_rsids else None
-        if inferred_star:
-            star_allele = inferred_star
-    if gene == "DPYD" and (not star_allele or star_allele == "*1"):
-        inferred_star = dpyd_rsid_to_star.get(variant_rsids[0].lower()) if variant_rsids else None
-        if inferred_star:
-            star_allele = inferred_star
-
-    # Strict CYP2C9 diplotype-to-SNP consistency filtering to prevent contamination
-    if gene == "CYP2C9":
-        cyp2c9_star_to_allowed_rsid = {
-            "*2": "rs1799853",
-            "*3": "rs1057910",
-            "*12": "rs9332131",
-        }
-        allowed_rsid = cyp2c9_star_to_allowed_rsid.get(star_allele)
-        if allowed_rsid:
-            variant_rsids = [rsid for rsid in variant_rsids if rsid.lower() == allowed_rsid]
 
-    if gene == "SLCO1B1":
-        slco1b1_star_to_allowed_rsid = {
-            "*5": "rs4149056",
-        }
-        allowed_rsid = slco1b1_star_to_allowed_rsid.get(star_allele)
-        if allowed_rsid:
-            variant_rsids = [rsid for rsid in variant_rsids if rsid.lower() == allowed_rsid]
-
-    if gene == "CYP2C19":
-        cyp2c19_star_to_allowed_rsid = {
-            "*2": "rs4244285",
-            "*3": "rs4986893",
-            "*4": "rs28399504",
-            "*5": "rs12769205",
-            "*6": "rs17884712",
-            "*8": "rs56337013",
-        }
-        allowed_rsid = cyp2c19_star_to_allowed_rsid.get(star_allele)
-        if allowed_rsid:
-            variant_rsids = [rsid for rsid in variant_rsids if rsid.lower() == allowed_rsid]
-
-    if gene == "DPYD":
-        dpyd_star_to_allowed_rsids = {
-            "*2A": {"rs3918290"},
-            "*13": {"rs67376798"},
-            "HapB3": {"rs56038477", "rs75017182"},
-            "D949V": {"rs67376798"},
-        }
-        allowed_rsids = dpyd_star_to_allowed_rsids.get(star_allele)
-        if allowed_rsids:
-            variant_rsids = [rsid for rsid in variant_rsids if rsid.lower() in allowed_rsids]
-
-    diplotype = f"{star_allele}/{star_allele}"
-    
-    # Infer phenotype
-    risk_engine = RiskAssessmentEngine()
-    if gene == "CYP2C9":
-        phenotype, phenotype_confidence = risk_engine.infer_cyp2c9_phenotype(diplotype)
-    elif gene == "SLCO1B1":
-        phenotype, phenotype_confidence = risk_engine.infer_slco1b1_phenotype(diplotype)
-    elif gene == "DPYD":
-        phenotype, phenotype_confidence = risk_engine.infer_dpyd_phenotype(diplotype)
-    else:
-        phenotype, phenotype_confidence = risk_engine.infer_phenotype([star_allele])
-
-    phenotype_output_map = {
-        "Poor Metabolizer": "PM",
-        "Intermediate Metabolizer": "IM",
-        "Normal Metabolizer": "NM",
-        "Normal function": "NM",
-        "Decreased function": "IM",
-        "Low function": "PM",
-    }
-    output_phenotype = phenotype_output_map.get(phenotype, phenotype)
-    if output_phenotype not in {"PM", "IM", "NM", "RM", "URM", "Unknown"}:
-        output_phenotype = "Unknown"
-    
-    # Assess risk for this drug-gene pair
-    risk = risk_engine.assess_risk(gene, drug, phenotype, variant_rsids, diplotype)
-
-    # Conservative WARFARIN override for known high-risk variants
-    if drug == "WARFARIN":
-        high_risk_warfarin_rsids = {"rs9923231", "rs1799853", "rs1057910"}
-        normalized_rsids = {rsid.lower() for rsid in variant_rsids if isinstance(rsid, str)}
-        if gene == "CYP2C9" and phenotype == "PM":
-            risk = {
-                **risk,
-                "risk_label": "Toxic",
-                "severity": "critical",
-                "confidence_score": max(risk.get("confidence_score", 0.5), 0.95)
-            }
-        elif high_risk_warfarin_rsids.intersection(normalized_rsids):
-            risk = {
-                **risk,
-                "risk_label": "Toxic",
-                "severity": "critical",
-                "confidence_score": max(risk.get("confidence_score", 0.5), 0.9)
-            }
-        elif risk.get("risk_label") == "Safe" and len(sorted_variants) > 0:
-            risk = {
-                **risk,
-                "risk_label": "Adjust Dosage",
-                "severity": "high",
-                "confidence_score": min(max(risk.get("confidence_score", 0.5), 0.8), 0.9)
-            }
+def panel_drug_genes(knowledge: KnowledgeBase) -> dict:
+    """Drug -> relevant genes for every drug in the knowledge base"""
+    return {drug_id: relevant_genes_for(drug_id, knowledge) for drug_id in knowledge.drugs}
 
-    if gene == "DPYD" and drug == "FLUOROURACIL" and phenotype == "Poor Metabolizer":
-        risk = {
-            **risk,
-            "risk_label": "Toxic",
-            "severity": "critical",
-            "confidence_score": max(risk.get("confidence_score", 0.5), 0.99)
-        }
+
+def save_passport(
+    patient_id: str,
+    content_hash: str,
+    filename: str,
+    variants: list,
+    risk_engine: RiskAssessmentEngine
+) -> str:
+    """
+    Store a whole-panel passport for an upload and return its ID
     
-    suppress_dose_context = gene == "CYP2C19" and drug == "CLOPIDOGREL" and phenotype == "PM"
-    llm_dose_context = None if suppress_dose_context else dosage_mg
+    A file already passported under the same knowledge base version reuses
+    the stored panel instead of recomputing it; the new row just links it
+    to this patient ID.
+    """
+    version = risk_engine.knowledge.version
+    db = SessionLocal()
+    try:
+        existing = db.query(PharmacogenomicPassport).filter(
+            PharmacogenomicPassport.content_hash == content_hash,
+            PharmacogenomicPassport.knowledge_base_version == version
+        ).order_by(desc(PharmacogenomicPassport.created_at)).first()
+        
+        if existing is not None:
+            passport_json = existing.passport
+        else:
+            passport_json = json.dumps(build_passport(variants, panel_drug_genes(risk_engine.knowledge), risk_engine))
+        
+        record = PharmacogenomicPassport(
+            id=f"PP-{uuid.uuid4().hex[:12].upper()}",
+            patient_id=patient_id,
+            content_hash=content_hash,
+            knowledge_base_version=version,
+            filename=filename,
+            passport=passport_json
+        )
+        db.add(record)
+        db.commit()
+        return record.id
+    finally:
+        db.close()
 
-    # Generate DUAL-LAYER explanations
-    clinical_summary, patient_summary = generate_dual_explanations(
+
+def find_passport(db: Session, key: str) -> PharmacogenomicPassport:
+    """Latest passport by passport ID, patient ID or VCF SHA-256"""
+    record = db.query(PharmacogenomicPassport).filter(
+        or_(
+            PharmacogenomicPassport.id == key,
+            PharmacogenomicPassport.patient_id == key,
+            PharmacogenomicPassport.content_hash == key
+        )
+    ).order_by(desc(PharmacogenomicPassport.created_at)).first()
+    if record is None:
+        raise HTTPException(status_code=404, detail="Passport not found")
+    return record
+
+
+async def explain_drug(
+    gene: str,
+    drug: str,
+    phenotype: str,
+    risk_label: str,
+    variant_rsids: List[str],
+    diplotype: str,
+    dose_mg: Optional[float] = None,
+    llm_deadline: Optional[float] = None
+) -> Tuple[str, str]:
+    """Clinical and patient narratives of one drug's genotype call"""
+    clinical_summary, patient_summary = await generate_dual_explanations_async(
         gene=gene,
         drug=drug,
         phenotype=phenotype,
-        risk_label=risk['risk_label'],
+        risk_label=risk_label,
         detected_variants=variant_rsids,
         diplotype=diplotype,
-        current_dose_mg=llm_dose_context,
-        api_key=os.getenv("GEMINI_API_KEY")
+        current_dose_mg=dose_mg,
+        api_key=os.getenv("GEMINI_API_KEY"),
+        deadline=llm_deadline
     )
 
     if gene == "DPYD" and drug == "FLUOROURACIL" and phenotype == "Poor Metabolizer":
@@ -639,6 +831,94 @@ def analyze_single_drug(
             "you because it can cause serious side effects. Your oncology team should use an alternative treatment plan that is "
             "safer for your genetics.\n\nVariant citation: RSID rs3918290; STAR allele *2A."
         )
+    return clinical_summary, patient_summary
+
+
+def stored_results(filename: str, responses: list) -> dict:
+    """
+    The /api/v1/results record of an analysis
+    
+    Every drug's assessment is kept under the one patient ID, keyed by
+    drug in request order.
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "assessments": {response.drug: response.model_dump(mode="json") for response in responses},
+        "file_name": filename,
+    }
+
+
+async def store_deferred_explanation(
+    patient_id: str, drug: str, explain, results_stored: asyncio.Event
+) -> Tuple[str, str]:
+    """Await a deferred drug's narratives and put them into the stored results once those are stored"""
+    clinical_summary, patient_summary = await explain
+    await results_stored.wait()
+    
+    def fill_in(stored: dict):
+        assessment = stored["assessments"].get(drug)
+        if assessment is not None:
+            assessment["llm_generated_explanation"] = {
+                "summary": clinical_summary,
+                "patient_summary": patient_summary,
+            }
+    
+    await run_in_threadpool(RESULTS_STORE.update, patient_id, fill_in)
+    return clinical_summary, patient_summary
+
+
+async def analyze_single_drug(
+    patient_id: str,
+    drug: str,
+    variants: list,
+    parsed_data: dict,
+    filename: str,
+    dosage_mg: Optional[float] = None,
+    risk_engine: Optional[RiskAssessmentEngine] = None,
+    profile: Optional[GeneProfile] = None,
+    llm_deadline: Optional[float] = None,
+    explanation_job: Optional[ExplanationJob] = None,
+    results_stored: Optional[asyncio.Event] = None
+):
+    """
+    Analyze VCF for a single drug
+    
+    llm_deadline is the time.monotonic() after which explanations skip the
+    LLM. With an explanation_job the response carries placeholder
+    narratives and the job's ID, and the narratives are generated on the
+    job; they are put into the stored results (see stored_results) once
+    results_stored is set.
+    """
+    risk_engine = risk_engine or get_engine()
+    profile = profile or build_gene_profile(variants, risk_engine)
+    
+    # Get relevant genes for this drug (custom drugs fall back to all key pharmacogenes)
+    relevant_genes = relevant_genes_for(drug, risk_engine.knowledge)
+    
+    # Join the drug against the per-gene calls for its primary gene and risk
+    genotype = profile_drug_genotype(profile, drug, relevant_genes, risk_engine)
+    if genotype is None:
+        return create_no_variants_response(patient_id, drug, variants, dosage_mg, risk_engine.knowledge.version)
+    
+    gene = genotype["gene"]
+    diplotype = genotype["diplotype"]
+    variant_rsids = [variant_id_text(key) for key in genotype["variant_ids"]]
+    phenotype = genotype["phenotype"]
+    output_phenotype = genotype["output_phenotype"]
+    risk = genotype["risk"]
+    
+    suppress_dose_context = gene == "CYP2C19" and drug == "CLOPIDOGREL" and phenotype == "PM"
+    llm_dose_context = None if suppress_dose_context else dosage_mg
+
+    # Generate DUAL-LAYER explanations, now or (deferred) after the response
+    explain = explain_drug(
+        gene, drug, phenotype, risk['risk_label'], variant_rsids, diplotype, llm_dose_context, llm_deadline
+    )
+    if explanation_job is None:
+        clinical_summary, patient_summary = await explain
+    else:
+        explanation_job.run(drug, store_deferred_explanation(patient_id, drug, explain, results_stored))
+        clinical_summary = patient_summary = PENDING_EXPLANATION
 
     dosage_note = ""
     if dosage_mg is not None:
@@ -664,11 +944,10 @@ def analyze_single_drug(
             "detail": "Avoid clopidogrel in CYP2C19 poor metabolizers (CPIC Level A); use an alternative P2Y12 inhibitor such as prasugrel or ticagrelor unless contraindicated."
         }
     else:
+        recommendation = risk_engine.get_clinical_recommendation(risk['risk_label'], drug, phenotype, gene)
         clinical_recommendation = {
-            "action": risk_engine.get_clinical_recommendation(
-                risk['risk_label'], drug, phenotype, gene
-            ),
-            "detail": f"{risk_engine.get_clinical_recommendation(risk['risk_label'], drug, phenotype, gene)}{dosage_note}"
+            "action": recommendation,
+            "detail": f"{recommendation}{dosage_note}"
         }
     
     # Create response
@@ -694,16 +973,11 @@ def analyze_single_drug(
         ),
         quality_metrics=QualityMetrics(
             vcf_parsing_success=True
-        )
+        ),
+        knowledge_base_version=risk_engine.knowledge.version,
+        explanation_job_id=explanation_job.id if explanation_job is not None else None
     )
     
-    # Store results
-    analysis_results[patient_id] = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "assessment": response.model_dump(),
-        "file_name": filename,
-    }
-    
     return response
 
 
@@ -711,7 +985,8 @@ def create_no_variants_response(
     patient_id: str,
     drug: str,
     variants: list,
-    dosage_mg: Optional[float] = None
+    dosage_mg: Optional[float] = None,
+    knowledge_base_version: Optional[str] = None
 ):
     """Create a safe response when no target variants found"""
     return PharmaGuardResponse(
@@ -742,22 +1017,186 @@ def create_no_variants_response(
         ),
         quality_metrics=QualityMetrics(
             vcf_parsing_success=True
+        ),
+        knowledge_base_version=knowledge_base_version
+    )
+
+
+@app.post("/api/v1/analyze-cohort")
+async def analyze_cohort(
+    file: UploadFile = File(...),
+    drug: str = Query(...)
+):
+    """
+    Analyze every sample of a multi-sample (cohort) VCF
+    
+    GT is decoded for target-gene sites into an int8 genotype matrix and
+    phenotype/risk is inferred for all samples at once. Results stream
+    back as NDJSON, one line per sample in header order. Per-sample LLM
+    explanations are not generated for cohorts.
+    
+    Args:
+        file: Multi-sample VCF (.vcf or bgzip-compressed .vcf.gz)
+        drug: Drug(s), comma-separated as for analyze-vcf
+    """
+    risk_engine = get_engine()
+    drug_list = parse_drug_selection(drug, risk_engine.knowledge)
+    
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    compressed = is_gzip_filename(file.filename)
+    if not file.filename.endswith('.vcf') and not compressed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: '{file.filename}'. Must be .vcf or .vcf.gz file"
         )
+    
+    upload = file.file
+    upload.seek(0, os.SEEK_END)
+    file_size_mb = upload.tell() / (1024 * 1024)
+    upload.seek(0)
+    if file_size_mb > MAX_UPLOAD_MB:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large: {file_size_mb:.2f} MB (max {MAX_UPLOAD_MB:g} MB)"
+        )
+    
+    chunks = iter_chunks(open_decompressed(upload) if compressed else upload)
+    parsed, success = await run_in_threadpool(parse_cohort_chunks, chunks)
+    if not success:
+        raise HTTPException(status_code=400, detail=f"VCF parsing failed: {parsed['error']}")
+    
+    cohort = parsed["cohort"]
+    if not cohort.samples:
+        raise HTTPException(status_code=400, detail="VCF has no sample columns")
+    
+    drug_genes = {drug_id: relevant_genes_for(drug_id, risk_engine.knowledge) for drug_id in drug_list}
+    lines = (json.dumps(row) + "\n" for row in assess_cohort(cohort, drug_list, drug_genes, risk_engine))
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={
+            "X-Cohort-Samples": str(len(cohort.samples)),
+            "X-Knowledge-Base-Version": risk_engine.knowledge.version,
+        }
     )
 
 
 @app.get("/api/v1/results/{patient_id}")
 async def get_results(patient_id: str):
-    """Retrieve analysis results for a patient"""
-    if patient_id not in analysis_results:
+    """
+    Retrieve analysis results for a patient
+    
+    Every analysed drug's assessment is under "assessments", keyed by drug;
+    single-drug analyses also fill "assessment" (see results_response).
+    """
+    stored = await run_in_threadpool(RESULTS_STORE.get, patient_id)
+    if stored is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    return analysis_results[patient_id]
+    return results_response(stored)
+
+
+async def find_explanation_job(job_id: str) -> dict:
+    """Snapshot of a live explanation job, or 404"""
+    snapshot = await run_in_threadpool(EXPLANATION_JOBS.snapshot, job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Explanation job not found")
+    return snapshot
+
+
+@app.get("/api/v1/explanations/{job_id}")
+async def get_explanations(job_id: str):
+    """Progress and finished narratives of a deferred analysis (analyze-vcf explanations=deferred)"""
+    return await find_explanation_job(job_id)
+
+
+@app.get("/api/v1/explanations/{job_id}/stream")
+async def stream_explanations(job_id: str):
+    """
+    Server-Sent Events with a deferred analysis's narratives
+    
+    One "explanation" event per drug as its narratives finish (drugs
+    already finished come first), then a "done" event. Any worker can
+    serve the stream; it polls the shared job store.
+    """
+    await find_explanation_job(job_id)
+    
+    async def events():
+        total = 0
+        async for result in EXPLANATION_JOBS.updates(job_id):
+            total += 1
+            yield f"event: explanation\ndata: {json.dumps(result)}\n\n"
+        yield f"event: done\ndata: {json.dumps({'job_id': job_id, 'total': total})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/v1/passports/{key}")
+async def get_passport(key: str, db: Session = Depends(get_db)):
+    """
+    Whole-panel pharmacogenomic passport
+    
+    Args:
+        key: Passport ID, patient ID or SHA-256 of the uploaded VCF
+    """
+    record = find_passport(db, key)
+    data = json.loads(record.passport)
+    data.pop("variants", None)
+    return {
+        "passport_id": record.id,
+        "patient_id": record.patient_id,
+        "content_hash": record.content_hash,
+        "file_name": record.filename,
+        **data,
+    }
+
+
+@app.get("/api/v1/passports/{key}/drugs/{drug}")
+async def get_passport_drug(key: str, drug: str, db: Session = Depends(get_db)):
+    """
+    One drug's risk from a stored passport, without re-uploading the VCF
+    
+    Panel drugs are answered from the stored entry. Drugs outside the panel,
+    and every drug of a passport built under an older knowledge base
+    version, are computed on the spot from the stored variants; the stored
+    passport is never rewritten by a read.
+    
+    Args:
+        key: Passport ID, patient ID or SHA-256 of the uploaded VCF
+        drug: Drug ID or custom drug name
+    """
+    risk_engine = get_engine()
+    knowledge = risk_engine.knowledge
+    drug_id = parse_drug_selection(drug, knowledge)[0]
+    
+    record = find_passport(db, key)
+    data = json.loads(record.passport)
+    return {
+        "passport_id": record.id,
+        "patient_id": record.patient_id,
+        "knowledge_base_version": knowledge.version,
+        **passport_drug(data, drug_id, relevant_genes_for(drug_id, knowledge), risk_engine),
+    }
 
 
 @app.post("/api/v1/validate-vcf")
-async def validate_vcf(file: UploadFile = File(...)):
-    """Validate VCF file with detailed error reporting"""
+async def validate_vcf(
+    file: UploadFile = File(...),
+    max_errors: Optional[int] = Query(None, ge=1)
+):
+    """
+    Validate VCF file with detailed error reporting
+    
+    One pass checks structure, reports per-line errors (stopping after
+    max_errors), and collects samples, contigs, variant counts and the
+    upload's SHA-256. A valid file's parse is cached under that hash, so
+    a following analyze-vcf upload of the same file skips parsing.
+    """
     
     try:
         if not file:
@@ -777,21 +1216,25 @@ async def validate_vcf(file: UploadFile = File(...)):
             }
         
         # Check file extension
-        if not file.filename.lower().endswith('.vcf'):
+        compressed = is_gzip_filename(file.filename)
+        if not file.filename.lower().endswith('.vcf') and not compressed:
             return {
                 "valid": False,
-                "error": f"Invalid file type: '{file.filename}'. Expected .vcf file",
+                "error": f"Invalid file type: '{file.filename}'. Expected .vcf or .vcf.gz file",
                 "errorCode": "INVALID_EXTENSION",
                 "size_mb": 0,
                 "file_name": file.filename
             }
         
-        # Read file content
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
+        # Measure the spooled upload without reading it into memory
+        upload = file.file
+        upload.seek(0, os.SEEK_END)
+        file_size = upload.tell()
+        upload.seek(0)
+        file_size_mb = file_size / (1024 * 1024)
         
         # Check for empty file
-        if len(content) == 0:
+        if file_size == 0:
             return {
                 "valid": False,
                 "error": "File is empty",
@@ -801,30 +1244,17 @@ async def validate_vcf(file: UploadFile = File(...)):
             }
         
         # Check file size
-        if file_size_mb > 5:
+        if file_size_mb > MAX_UPLOAD_MB:
             return {
                 "valid": False,
-                "error": f"File too large: {file_size_mb:.2f} MB (maximum 5 MB)",
+                "error": f"File too large: {file_size_mb:.2f} MB (maximum {MAX_UPLOAD_MB:g} MB)",
                 "errorCode": "FILE_TOO_LARGE",
                 "size_mb": file_size_mb,
                 "file_name": file.filename
             }
         
-        # Try to decode
-        try:
-            vcf_content = content.decode('utf-8')
-        except UnicodeDecodeError as e:
-            return {
-                "valid": False,
-                "error": f"File encoding error: unable to decode as UTF-8. Try saving as UTF-8 text.",
-                "errorCode": "ENCODING_ERROR",
-                "size_mb": file_size_mb,
-                "file_name": file.filename,
-                "details": str(e)
-            }
-        
         # Check if file has minimum content
-        if len(vcf_content.strip()) < 10:
+        if file_size < 10:
             return {
                 "valid": False,
                 "error": "VCF file is too small or contains only whitespace",
@@ -833,20 +1263,42 @@ async def validate_vcf(file: UploadFile = File(...)):
                 "file_name": file.filename
             }
         
-        # Validate VCF structure
-        parser = VCFParser()
-        is_valid, message = parser.validate_vcf_structure(vcf_content)
+        # Validate, count and parse in one streamed pass, hashing the raw upload
+        reader = HashingReader(upload)
+        chunks = iter_chunks(open_decompressed(reader) if compressed else reader)
+        try:
+            summary = await run_in_threadpool(scan_vcf_chunks, chunks, max_errors or VALIDATE_MAX_ERRORS)
+        except VCFEncodingError as e:
+            return {
+                "valid": False,
+                "error": f"File encoding error: unable to decode as UTF-8. Try saving as UTF-8 text.",
+                "errorCode": "ENCODING_ERROR",
+                "size_mb": file_size_mb,
+                "file_name": file.filename,
+                "details": str(e),
+                "byte_offset": e.offset
+            }
         
-        # Count variants
-        variant_count = sum(1 for line in vcf_content.split('\n') if line and not line.startswith('#'))
+        # The hash is only meaningful when the whole upload was read
+        content_hash = reader.hexdigest() if reader.bytes_read == file_size else None
+        parse_result = summary.pop("parse_result")
+        if parse_result is not None and content_hash and PARSE_CACHE is not None:
+            cache_key = parse_cache_key(content_hash, parse_cache_mode(compressed, rsid_index=RSID_INDEX))
+            await run_in_threadpool(PARSE_CACHE.put, cache_key, parse_result)
         
+        is_valid = summary["valid"]
+        if is_valid:
+            error_code = None
+        elif summary["errors"] and summary["errors"][0]["line"] is None:
+            error_code = "INVALID_VCF_STRUCTURE"
+        else:
+            error_code = "INVALID_VCF_RECORDS"
         return {
-            "valid": is_valid,
-            "message": message,
+            **summary,
             "size_mb": file_size_mb,
             "file_name": file.filename,
-            "variant_count": variant_count,
-            "errorCode": None if is_valid else "INVALID_VCF_STRUCTURE"
+            "content_hash": content_hash,
+            "errorCode": error_code
         }
     
     except Exception as e:
@@ -1198,10 +1650,46 @@ async def get_all_records(
     return [VCFRecordResponse.from_orm(r) for r in records]
 
 
+@app.post("/api/v1/admin/knowledge/reload")
+async def reload_knowledge_base(
+    token_data: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Reload the knowledge base file in this worker now
+    
+    Other workers pick the change up on their next file check
+    (KNOWLEDGE_RELOAD_SECONDS). In-flight requests finish on the version
+    they started with.
+    """
+    user = db.query(User).filter(User.id == token_data["sub"]).first()
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    try:
+        await run_in_threadpool(KNOWLEDGE_STORE.reload)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Knowledge base reload failed: {str(e)}")
+    return KNOWLEDGE_STORE.stats()
+
+
 @app.get("/api/v1/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "PharmaGuard"}
+    return {
+        "status": "healthy",
+        "service": "PharmaGuard",
+        "parse_cache": PARSE_CACHE.stats() if PARSE_CACHE is not None else None,
+        "explanation_cache": EXPLANATION_CACHE.stats() if EXPLANATION_CACHE is not None else None,
+        "explanation_bundle": EXPLANATION_BUNDLE.stats() if EXPLANATION_BUNDLE is not None else None,
+        "llm": explainer_stats(),
+        "analysis_single_flight": ANALYSIS_FLIGHTS.stats(),
+        "results_store": RESULTS_STORE.stats(),
+        "explanation_jobs": EXPLANATION_JOBS.stats(),
+        "analysis_jobs": ANALYSIS_WORKERS.stats(),
+        "knowledge_base": KNOWLEDGE_STORE.stats(),
+        "rsid_index": {"path": RSID_INDEX.path, "rsids": len(RSID_INDEX)} if RSID_INDEX else None,
+    }
 
 
 if __name__ == "__main__":
@@ -45,6 +45,10 @@ class PharmaGuardResponse(BaseModel):
     clinical_recommendation: ClinicalRecommendation
     llm_generated_explanation: LLMGeneratedExplanation
     quality_metrics: QualityMetrics
+    knowledge_base_version: Optional[str] = None
+    passport_id: Optional[str] = None
+    # Set when the narratives are deferred (analyze-vcf explanations=deferred)
+    explanation_job_id: Optional[str] = None
 
 
 class VCFUpload(BaseModel):
@@ -0,0 +1,234 @@
+import gzip
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from app.parsers.loci import detect_genome_build, loci_for_build, normalize_chrom
+
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+TABIX_MAGIC = b"TBI\x01"
+
+# Header line of files annotated with GENE= tags (see iter_indexed_lines)
+GENE_INFO_DECLARATION = "##INFO=<ID=GENE,"
+
+# Tabix binning scheme (same as BAI): 16 kb minimum bins, 5 levels
+TABIX_MIN_SHIFT = 14
+_BIN_LEVELS = ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681))
+
+
+def is_gzip_filename(filename: str) -> bool:
+    """Compressed VCF uploads are recognised by extension"""
+    return filename.lower().endswith((".vcf.gz", ".vcf.bgz"))
+
+
+def open_decompressed(stream: BinaryIO) -> BinaryIO:
+    """
+    Wrap a gzip/BGZF stream for sequential decompression
+
+    BGZF is a series of gzip members, so GzipFile reads it block by block
+    without inflating the whole file in memory.
+    """
+    return gzip.GzipFile(fileobj=stream, mode="rb")
+
+
+def reg2bins(beg: int, end: int) -> List[int]:
+    """Tabix bins overlapping the 0-based half-open interval [beg, end)"""
+    end -= 1
+    bins = [0]
+    for shift, offset in _BIN_LEVELS:
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+class BGZFReader:
+    """Random access to a BGZF file through tabix virtual offsets"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.blocks_read = 0
+        self._cached_offset = -1
+        self._cached_block: Tuple[bytes, int] = (b"", 0)
+
+    def read_block(self, coffset: int) -> Tuple[bytes, int]:
+        """
+        Decompress the BGZF block starting at a compressed file offset
+
+        Returns:
+            Tuple of (block data, offset of the next block); data is empty at EOF
+        """
+        if coffset == self._cached_offset:
+            return self._cached_block
+
+        self.stream.seek(coffset)
+        header = self.stream.read(12)
+        if len(header) < 12:
+            return b"", coffset
+        if header[:4] != BGZF_MAGIC:
+            raise ValueError(f"Invalid BGZF block at offset {coffset}")
+
+        xlen = struct.unpack_from("<H", header, 10)[0]
+        extra = self.stream.read(xlen)
+        block_size = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            si1, si2, slen = extra[pos], extra[pos + 1], struct.unpack_from("<H", extra, pos + 2)[0]
+            if si1 == 66 and si2 == 67 and slen == 2:
+                block_size = struct.unpack_from("<H", extra, pos + 4)[0] + 1
+                break
+            pos += 4 + slen
+        if block_size is None:
+            raise ValueError(f"Missing BGZF block size at offset {coffset}")
+
+        payload = self.stream.read(block_size - 12 - xlen)
+        data = zlib.decompress(payload[:-8], -15)
+        self.blocks_read += 1
+
+        self._cached_offset = coffset
+        self._cached_block = (data, coffset + block_size)
+        return self._cached_block
+
+    def iter_range(self, start: int, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield decompressed data between two virtual offsets (end=None reads to EOF)"""
+        coffset, uoffset = start >> 16, start & 0xFFFF
+        end_coffset, end_uoffset = (end >> 16, end & 0xFFFF) if end is not None else (None, 0)
+
+        while end_coffset is None or coffset <= end_coffset:
+            data, next_coffset = self.read_block(coffset)
+            if next_coffset == coffset:
+                break
+            stop = end_uoffset if coffset == end_coffset else len(data)
+            if uoffset < stop:
+                yield data[uoffset:stop]
+            uoffset = 0
+            coffset = next_coffset
+
+    def iter_lines(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield lines between two virtual offsets"""
+        pending = b""
+        for piece in self.iter_range(start, end):
+            lines = (pending + piece).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line[:-1] if line.endswith(b"\r") else line
+        if pending:
+            yield pending[:-1] if pending.endswith(b"\r") else pending
+
+
+class TabixIndex:
+    """In-memory view of a .tbi index (binning + linear index per contig)"""
+
+    def __init__(self, names: List[str], bins: List[Dict[int, List[Tuple[int, int]]]], linear: List[List[int]]):
+        self.names = names
+        self.bins = bins
+        self.linear = linear
+        self._ref_ids = {}
+        for ref_id, name in enumerate(names):
+            self._ref_ids[name] = ref_id
+            self._ref_ids.setdefault(normalize_chrom(name), ref_id)
+
+    @classmethod
+    def load(cls, stream: BinaryIO) -> "TabixIndex":
+        """Load a tabix index from a (BGZF-compressed) .tbi file object"""
+        data = gzip.decompress(stream.read())
+        if data[:4] != TABIX_MAGIC:
+            raise ValueError("Invalid tabix index: bad magic")
+
+        n_ref = struct.unpack_from("<i", data, 4)[0]
+        l_nm = struct.unpack_from("<i", data, 32)[0]
+        names = [name.decode("utf-8") for name in data[36:36 + l_nm].split(b"\0")[:n_ref]]
+        offset = 36 + l_nm
+
+        bins, linear = [], []
+        for _ in range(n_ref):
+            n_bin = struct.unpack_from("<i", data, offset)[0]
+            offset += 4
+            ref_bins = {}
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from("<Ii", data, offset)
+                offset += 8
+                flat = struct.unpack_from(f"<{2 * n_chunk}Q", data, offset)
+                offset += 16 * n_chunk
+                ref_bins[bin_id] = list(zip(flat[::2], flat[1::2]))
+            n_intv = struct.unpack_from("<i", data, offset)[0]
+            offset += 4
+            linear.append(list(struct.unpack_from(f"<{n_intv}Q", data, offset)))
+            offset += 8 * n_intv
+            bins.append(ref_bins)
+
+        return cls(names, bins, linear)
+
+    def query_chunks(self, chrom: str, beg: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Virtual-offset chunks that may hold records in [beg, end)
+
+        Coordinates are 0-based half-open, as in the tabix specification.
+        """
+        ref_id = self._ref_ids.get(chrom, self._ref_ids.get(normalize_chrom(chrom)))
+        if ref_id is None:
+            return []
+
+        ref_linear = self.linear[ref_id]
+        min_offset = ref_linear[min(beg >> TABIX_MIN_SHIFT, len(ref_linear) - 1)] if ref_linear else 0
+
+        ref_bins = self.bins[ref_id]
+        return [
+            chunk
+            for bin_id in reg2bins(beg, end)
+            for chunk in ref_bins.get(bin_id, ())
+            if chunk[1] > min_offset
+        ]
+
+
+def merge_chunks(chunks: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort and merge overlapping virtual-offset chunks"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(chunks):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_indexed_lines(stream: BinaryIO, index_stream: BinaryIO, reader: Optional[BGZFReader] = None) -> Iterator[bytes]:
+    """
+    Yield VCF header lines, then the records of the blocks covering pharmacogene loci
+
+    The header is read from the start of the file to detect the reference
+    build; the tabix index then points straight at the BGZF blocks that
+    overlap the loci, so the rest of the file is never decompressed.
+    Every record of those blocks is yielded: the parser keeps the ones in
+    a locus or carrying a GENE=/rsID hint, as on the streaming path.
+
+    A GENE= tag can sit on a record anywhere in the file, so when the
+    header declares a GENE INFO field the rest of the file is read in
+    order instead, and the parse matches the plain and gzip paths.
+    """
+    reader = reader or BGZFReader(stream)
+    index = TabixIndex.load(index_stream)
+
+    lines = reader.iter_lines(0)
+    header = []
+    for line in lines:
+        if not line.startswith(b"#"):
+            break
+        header.append(line.decode("utf-8", "replace"))
+        yield line
+    else:
+        return
+
+    if any(header_line.startswith(GENE_INFO_DECLARATION) for header_line in header):
+        yield line
+        yield from lines
+        return
+
+    build = detect_genome_build(header)
+    chunks = []
+    for chrom, start, end in loci_for_build(build).values():
+        chunks.extend(index.query_chunks(chrom, start - 1, end))
+
+    for chunk_start, chunk_end in merge_chunks(chunks):
+        for line in reader.iter_lines(chunk_start, chunk_end):
+            if line and not line.startswith(b"#"):
+                yield line
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional
+
+from app.parsers.rsid_index import RsidIndex
+from app.parsers.vcf_parser import DEFAULT_CHUNK_SIZE
+
+
+# Bump when parser output changes so stale cached results are not served
+PARSE_CACHE_VERSION = "3"
+
+
+def sha256_stream(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    SHA-256 hex digest of a seekable binary stream, read in chunks
+
+    The stream is rewound to the start afterwards so it can be parsed.
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def parse_cache_key(content_hash: str, mode: str) -> str:
+    """
+    Cache key for a parse of given content
+
+    mode names the input path (plain, gzip, tabix): they keep slightly
+    different record sets from the same bytes, so they are cached apart.
+    """
+    return f"v{PARSE_CACHE_VERSION}-{mode}-{content_hash}"
+
+
+def parse_cache_mode(compressed: bool, tabix: bool = False, rsid_index: Optional[RsidIndex] = None) -> str:
+    """
+    Input path name for parse_cache_key
+
+    Every endpoint that reads or fills the cache must build its mode here,
+    or parses of the same upload are cached under keys that never meet.
+    With an rsID index the kept records depend on the index build, so each
+    build caches apart.
+    """
+    mode = "tabix" if tabix else ("gzip" if compressed else "plain")
+    if rsid_index is not None:
+        mode += f"-rsid{rsid_index.stamp}"
+    return mode
+
+
+class ParseCache(ABC):
+    """
+    Parsed-VCF cache keyed by content hash, bounded by total bytes
+
+    Results are stored pickled: the pickle size is what the byte bound
+    counts, and callers always get a private copy they may mutate.
+    Subclasses implement the storage; hit/miss counters live here.
+    """
+
+    backend = "none"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached parse result for key, or None"""
+        payload = self._load(key)
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return pickle.loads(payload) if payload is not None else None
+
+    def put(self, key: str, result: Dict):
+        """Store a parse result; results larger than the whole cache are skipped"""
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) <= self.max_bytes:
+            self._store(key, payload)
+
+    def stats(self) -> Dict:
+        """Counters and occupancy for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.entry_count(),
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+    @abstractmethod
+    def _load(self, key: str) -> Optional[bytes]:
+        """Stored payload for key, or None"""
+
+    @abstractmethod
+    def _store(self, key: str, payload: bytes):
+        """Store a payload, evicting as needed to stay within max_bytes"""
+
+    @abstractmethod
+    def entry_count(self) -> int:
+        """Number of cached results"""
+
+    @abstractmethod
+    def total_bytes(self) -> int:
+        """Total size of cached payloads"""
+
+
+class MemoryParseCache(ParseCache):
+    """In-process LRU cache; each server worker process has its own"""
+
+    backend = "memory"
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+
+    def _load(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def _store(self, key: str, payload: bytes):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def entry_count(self) -> int:
+        return len(self._entries)
+
+    def total_bytes(self) -> int:
+        return self._bytes
+
+
+class DiskParseCache(ParseCache):
+    """
+    On-disk LRU cache shared by every worker process on the host
+
+    One file per key; a hit refreshes the file's mtime, and eviction
+    removes the least recently used files until the directory fits.
+    Writes go through a temp file and os.replace, so readers in other
+    processes never see a partial entry.
+
+    Entries are unpickled, so the directory must be private to the
+    service user: it is created with mode 0700, and an existing directory
+    owned by another user or open to group/other is refused.
+    """
+
+    backend = "disk"
+    SUFFIX = ".parse"
+
+    def __init__(self, directory: str, max_bytes: int):
+        super().__init__(max_bytes)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+            raise ValueError(
+                f"Parse cache directory {directory} must be owned by this user and not accessible to others (mode 0700)"
+            )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _load(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return payload
+
+    def _store(self, key: str, payload: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _files(self):
+        """(mtime, size, path) of every cached entry"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((info.st_mtime, info.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def entry_count(self) -> int:
+        return len(self._files())
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+
+def create_parse_cache(backend: str, max_bytes: int, directory: Optional[str] = None) -> Optional[ParseCache]:
+    """
+    Build the configured parse cache
+
+    Args:
+        backend: "memory", "disk" or "none"
+        max_bytes: Bound on the total size of cached results
+        directory: Private cache directory, required by the disk backend
+
+    Returns:
+        A ParseCache, or None when caching is disabled
+    """
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryParseCache(max_bytes)
+    if backend == "disk":
+        if not directory:
+            raise ValueError("The disk parse cache needs a private directory (PARSE_CACHE_DIR)")
+        return DiskParseCache(directory, max_bytes)
+    if backend in ("none", "off", ""):
+        return None
+    raise ValueError(f"Unknown parse cache backend: {backend}")
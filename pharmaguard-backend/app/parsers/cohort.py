@@ -0,0 +1,128 @@
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.parsers.genotype import MISSING_ALLELE, gt_code
+from app.parsers.variant import Variant
+from app.parsers.vcf_parser import DEFAULT_CHUNK_SIZE, VCFParser, iter_chunks
+
+
+def decode_genotypes(sample_columns: bytes, sample_count: int) -> np.ndarray:
+    """
+    Decode the GT of every sample on one record
+
+    Args:
+        sample_columns: Raw FORMAT and sample columns (tab-separated)
+        sample_count: Samples declared in the header
+
+    Returns:
+        int8 array of shape (sample_count, 2)
+    """
+    genotypes = np.full((sample_count, 2), MISSING_ALLELE, dtype=np.int8)
+    fields = sample_columns.rstrip(b"\r").split(b"\t")
+    keys = fields[0].split(b":")
+    if b"GT" not in keys:
+        return genotypes
+
+    gt_index = keys.index(b"GT")
+    samples = fields[1:sample_count + 1]
+    if gt_index == 0:
+        gts = [sample.split(b":", 1)[0] for sample in samples]
+    else:
+        gts = [(sample.split(b":") + [b"."] * gt_index)[gt_index] for sample in samples]
+    if gts:
+        genotypes[:len(gts)] = [gt_code(gt) for gt in gts]
+    return genotypes
+
+
+class CohortGenotypes:
+    """
+    Target-gene sites of a multi-sample VCF with a compact genotype matrix
+
+    genotypes is int8 with shape (variants, samples, 2): allele index per
+    haplotype, 0 for REF, MISSING_ALLELE for no call.
+    """
+
+    def __init__(self, samples: List[str], variants: List[Variant], genotypes: np.ndarray, metadata: Dict):
+        self.samples = samples
+        self.variants = variants
+        self.genotypes = genotypes
+        self.metadata = metadata
+
+    def alt_copies(self) -> np.ndarray:
+        """int8 (variants, samples) matrix: ALT alleles the sample carries (0, 1 or 2)"""
+        return (self.genotypes > 0).sum(axis=2, dtype=np.int8)
+
+    def carriers(self) -> np.ndarray:
+        """Boolean (variants, samples) matrix: sample carries an ALT allele"""
+        return self.alt_copies() > 0
+
+
+class CohortVCFParser(VCFParser):
+    """
+    VCF parser that also decodes GT for every sample on kept records
+
+    FORMAT and sample columns are only split for target-gene sites, so a
+    whole-genome cohort costs the same scan as a single-sample file plus
+    the sample columns of a few hundred records.
+    """
+
+    def __init__(self, max_size_mb: int = 5):
+        super().__init__(max_size_mb)
+        self._sample_columns: List[Optional[bytes]] = []
+
+    def parse_cohort(self, chunks: Iterable[bytes]) -> CohortGenotypes:
+        """
+        Parse newline-aligned byte blocks into a CohortGenotypes
+
+        Raises:
+            ValueError: Invalid VCF structure (same checks as parse_chunks)
+        """
+        metadata: Dict = {}
+        header: List[str] = []
+        self._sample_columns = []
+        variants: List[Variant] = []
+        for chunk, interval_index, chunk_offset in self._iter_data_blocks(chunks, metadata, strict=True, header=header):
+            variants.extend(self._scan_chunk(chunk, interval_index, chunk_offset))
+
+        columns = next((line.lstrip("#").split("\t") for line in header if line.startswith("#CHROM")), [])
+        samples = columns[9:]
+        genotypes = np.full((len(variants), len(samples), 2), MISSING_ALLELE, dtype=np.int8)
+        for row, sample_columns in enumerate(self._sample_columns):
+            if sample_columns is not None:
+                genotypes[row] = decode_genotypes(sample_columns, len(samples))
+        return CohortGenotypes(samples, variants, genotypes, metadata)
+
+    def _parse_variant_bytes(self, line: bytes, locus_gene: Optional[str] = None, offset: int = 0) -> Optional[Variant]:
+        variant = super()._parse_variant_bytes(line, locus_gene, offset)
+        if variant is not None:
+            # Genotypes are per sample, in the matrix; the record is the site
+            variant.alt_copies = None
+            fields = line.split(b"\t", 8)
+            self._sample_columns.append(fields[8] if len(fields) > 8 else None)
+        return variant
+
+
+def parse_cohort_stream(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Dict, bool]:
+    """
+    Parse a multi-sample VCF from a binary file object
+
+    Returns:
+        Tuple of ({"cohort": CohortGenotypes} or {"error": ...}, success_flag)
+    """
+    return parse_cohort_chunks(iter_chunks(stream, chunk_size))
+
+
+def parse_cohort_chunks(chunks: Iterable[bytes]) -> Tuple[Dict, bool]:
+    """
+    Parse a multi-sample VCF from newline-aligned byte blocks
+
+    Returns:
+        Tuple of ({"cohort": CohortGenotypes} or {"error": ...}, success_flag)
+    """
+    parser = CohortVCFParser()
+
+    try:
+        return {"cohort": parser.parse_cohort(chunks)}, True
+    except Exception as e:
+        return {"error": str(e)}, False
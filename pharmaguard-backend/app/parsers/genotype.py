@@ -0,0 +1,69 @@
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+
+# Allele code for a missing call ('.') or an absent second allele (haploid GT)
+MISSING_ALLELE = -1
+
+
+def _decode_gt(gt: bytes) -> Tuple[int, int]:
+    alleles = gt.replace(b"|", b"/").split(b"/")
+    indices = [
+        min(int(allele), 127) if allele.isdigit() else MISSING_ALLELE
+        for allele in alleles[:2]
+    ]
+    if len(indices) < 2:
+        indices.append(MISSING_ALLELE)
+    return indices[0], indices[1]
+
+
+# Decoded GT values VCFs repeat (0/0, 0|1, ./., haploid 1, ...), built once;
+# anything else is decoded on each call, so the table never grows
+_COMMON_ALLELES = (b".", b"0", b"1", b"2", b"3")
+_GT_CODES: Mapping[bytes, Tuple[int, int]] = MappingProxyType({
+    gt: _decode_gt(gt)
+    for gt in list(_COMMON_ALLELES) + [
+        first + separator + second
+        for first in _COMMON_ALLELES
+        for separator in (b"/", b"|")
+        for second in _COMMON_ALLELES
+    ]
+})
+
+
+def gt_code(gt: bytes) -> Tuple[int, int]:
+    """
+    Allele indices of one GT value ("0/1", "1|1", "./.", "1")
+
+    Returns:
+        Tuple of two allele indices; MISSING_ALLELE for '.' or haploid calls
+    """
+    code = _GT_CODES.get(gt)
+    return code if code is not None else _decode_gt(gt)
+
+
+def alt_copies(code: Tuple[int, int]) -> int:
+    """
+    ALT alleles in a GT code: 0 (reference or no call), 1 (heterozygous) or 2 (homozygous)
+
+    A haploid ALT call counts once, as in the cohort carrier matrix.
+    """
+    return (code[0] > 0) + (code[1] > 0)
+
+
+def first_sample_gt(sample_columns: bytes) -> Optional[bytes]:
+    """
+    GT of the first sample, from a record's raw FORMAT and sample columns
+
+    Returns:
+        The GT value, or None when FORMAT has no GT or there is no sample
+    """
+    fields = sample_columns.rstrip(b"\r").split(b"\t", 2)
+    if len(fields) < 2:
+        return None
+    keys = fields[0].split(b":")
+    if b"GT" not in keys:
+        return None
+    values = fields[1].split(b":")
+    gt_index = keys.index(b"GT")
+    return values[gt_index] if gt_index < len(values) else b"."
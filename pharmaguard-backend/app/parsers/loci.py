@@ -0,0 +1,174 @@
+import itertools
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Pharmacogene loci per reference build: gene -> (chrom, start, end)
+# 1-based inclusive gene bodies padded ~2 kb, extended upstream where
+# star-defining promoter variants sit (CYP2C19*17, VKORC1 -1639G>A)
+PHARMACOGENE_LOCI = {
+    "GRCh38": {
+        "CYP2D6": ("22", 42124499, 42132881),
+        "CYP2C19": ("10", 94757681, 94857547),
+        "CYP2C9": ("10", 94936658, 94992091),
+        "VKORC1": ("16", 31088854, 31098000),
+        "SLCO1B1": ("12", 21128388, 21241796),
+        "TPMT": ("6", 18126311, 18157169),
+        "DPYD": ("1", 97075743, 97923049),
+    },
+    "GRCh37": {
+        "CYP2D6": ("22", 42520501, 42528883),
+        "CYP2C19": ("10", 96517438, 96614962),
+        "CYP2C9": ("10", 96696415, 96751847),
+        "VKORC1": ("16", 31100175, 31109000),
+        "SLCO1B1": ("12", 21282128, 21394730),
+        "TPMT": ("6", 18126542, 18157374),
+        "DPYD": ("1", 97541299, 98388615),
+    },
+}
+
+DEFAULT_BUILD = "GRCh38"
+
+# Header tokens that identify a reference build
+BUILD_ALIASES = {
+    "GRCh38": ("grch38", "hg38", "b38"),
+    "GRCh37": ("grch37", "hg19", "b37", "hs37d5"),
+}
+
+
+def normalize_chrom(chrom: str) -> str:
+    """Strip the 'chr' prefix so 'chr22' and '22' compare equal"""
+    if chrom[:3].lower() == "chr":
+        return chrom[3:]
+    return chrom
+
+
+def detect_genome_build(header_lines: Iterable[str]) -> Optional[str]:
+    """
+    Detect the reference build from ##reference / ##contig / ##assembly headers
+
+    Returns:
+        "GRCh38", "GRCh37" or None when the header does not say
+    """
+    for line in header_lines:
+        if not line.startswith(("##reference", "##contig", "##assembly")):
+            continue
+        lowered = line.lower()
+        for build, aliases in BUILD_ALIASES.items():
+            if any(alias in lowered for alias in aliases):
+                return build
+    return None
+
+
+def loci_for_build(build: Optional[str]) -> Dict[str, Tuple[str, int, int]]:
+    """
+    Loci to search for a build; an unknown build searches both
+
+    Returns:
+        Dict of "GENE@BUILD" -> (chrom, start, end)
+    """
+    builds = [build] if build in PHARMACOGENE_LOCI else list(PHARMACOGENE_LOCI)
+    return {
+        f"{gene}@{name}": locus
+        for name in builds
+        for gene, locus in PHARMACOGENE_LOCI[name].items()
+    }
+
+
+class PharmacogeneIntervalIndex:
+    """
+    Pharmacogene lookup by raw CHROM/POS for one reference build
+
+    Works on raw VCF bytes so off-target records can be rejected before
+    they are split or decoded. An unknown build indexes the loci of every
+    build; they do not overlap across genes.
+    """
+
+    def __init__(self, build: Optional[str] = None):
+        self.build = build if build in PHARMACOGENE_LOCI else None
+        builds = [self.build] if self.build else list(PHARMACOGENE_LOCI)
+
+        by_chrom: Dict[str, List[Tuple[int, int, str]]] = {}
+        for name in builds:
+            for gene, (chrom, start, end) in PHARMACOGENE_LOCI[name].items():
+                by_chrom.setdefault(chrom, []).append((start, end, gene))
+
+        self._by_chrom: Dict[bytes, Tuple[Tuple[int, int, str], ...]] = {}
+        for chrom, intervals in by_chrom.items():
+            ordered = tuple(sorted(intervals))
+            for key in (chrom, f"chr{chrom}", f"Chr{chrom}", f"CHR{chrom}"):
+                self._by_chrom[key.encode()] = ordered
+
+        # Matches "CHROM\tPOS\t" at the start of lines whose position shares a
+        # coarse digit prefix with a locus; everything else fails in C
+        alternatives = []
+        for chrom, intervals in by_chrom.items():
+            positions = "|".join(
+                position_prefix_pattern(start, end) for start, end, _ in intervals
+            )
+            alternatives.append(f"{chrom}\t(?:{positions})")
+        body = f"((?:[cC][hH][rR])?(?:{'|'.join(alternatives)}))\t".encode()
+        self._first_line_pattern = re.compile(body)
+        self._next_line_pattern = re.compile(b"\n" + body)
+
+    def gene_at(self, chrom: bytes, pos: int) -> Optional[str]:
+        """Return the pharmacogene whose locus contains chrom:pos, if any"""
+        intervals = self._by_chrom.get(chrom)
+        if not intervals:
+            return None
+        for start, end, gene in intervals:
+            if pos < start:
+                return None
+            if pos <= end:
+                return gene
+        return None
+
+    def scan(self, buffer: bytes) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (line start offset, gene) for each line of buffer inside a locus
+
+        Lines away from the loci are rejected by the regex engine and never
+        reach Python code, which is what keeps whole-genome scans cheap.
+        """
+        matches = self._next_line_pattern.finditer(buffer)
+        first = self._first_line_pattern.match(buffer)
+        if first:
+            matches = itertools.chain((first,), matches)
+
+        for match in matches:
+            chrom, pos = match.group(1).split(b"\t")
+            gene = self.gene_at(chrom, int(pos))
+            if gene:
+                yield match.start(1), gene
+
+
+def position_prefix_pattern(start: int, end: int, max_prefixes: int = 16) -> str:
+    """
+    Regex matching every integer in [start, end] by decimal prefix
+
+    The range is widened to whole prefixes (at most max_prefixes of them),
+    so the pattern may also match nearby positions; callers re-check.
+    """
+    parts = []
+    while start <= end:
+        digits = len(str(start))
+        upper = min(end, 10 ** digits - 1)
+        wildcard = 0
+        while (upper // 10 ** wildcard) - (start // 10 ** wildcard) >= max_prefixes:
+            wildcard += 1
+        prefixes = range(start // 10 ** wildcard, upper // 10 ** wildcard + 1)
+        tail = f"[0-9]{{{wildcard}}}" if wildcard else ""
+        parts.append(f"(?:{'|'.join(str(p) for p in prefixes)}){tail}")
+        start = upper + 1
+    return "|".join(parts)
+
+
+_INTERVAL_INDEXES: Dict[Optional[str], PharmacogeneIntervalIndex] = {}
+
+
+def interval_index_for(build: Optional[str]) -> PharmacogeneIntervalIndex:
+    """Shared, lazily built interval index per build"""
+    index = _INTERVAL_INDEXES.get(build)
+    if index is None:
+        index = _INTERVAL_INDEXES[build] = PharmacogeneIntervalIndex(build)
+    return index
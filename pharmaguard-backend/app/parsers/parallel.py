@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.parsers.loci import interval_index_for
+from app.parsers.variant import Variant
+from app.parsers.vcf_parser import VCFParser, iter_chunks
+
+
+# Bytes of VCF body per worker task
+DEFAULT_RANGE_SIZE = 32 * 1024 * 1024
+
+# Parser (gene, rsID and hint tables) built once per worker process
+_worker_parser: Optional[VCFParser] = None
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _init_worker():
+    """Build the parser tables once when a pool process starts"""
+    global _worker_parser
+    _worker_parser = VCFParser()
+
+
+class _RangeReader:
+    """Read at most `remaining` bytes from the current position of a stream"""
+
+    def __init__(self, stream: BinaryIO, remaining: int):
+        self.stream = stream
+        self.remaining = remaining
+
+    def read(self, size: int) -> bytes:
+        data = self.stream.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+
+def _scan_file_range(path: str, start: int, end: int, build: Optional[str]) -> List[Variant]:
+    """
+    Worker task: kept variants of the newline-aligned byte range [start, end)
+
+    The worker reads the range itself, so only the small result list
+    crosses the process boundary.
+    """
+    interval_index = interval_index_for(build)
+    variants: List[Variant] = []
+    with open(path, "rb") as stream:
+        stream.seek(start)
+        offset = start
+        for chunk in iter_chunks(_RangeReader(stream, end - start)):
+            variants.extend(_worker_parser._scan_chunk(chunk, interval_index, offset))
+            offset += len(chunk)
+    return variants
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Worker count to use; 0 or None means one per CPU"""
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+
+def get_parse_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Shared process pool for VCF parsing, created on first use
+
+    Workers are spawned rather than forked so they do not inherit the
+    server's threads, and are kept alive across requests.
+    """
+    workers = resolve_workers(workers)
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return pool
+
+
+def shutdown_parse_pools():
+    """Stop every parse pool (application shutdown, tests)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
+
+
+def shared_path(stream: BinaryIO) -> Optional[str]:
+    """
+    A path other processes can open to read the same file as stream
+
+    Named files use their name. Unnamed temporary files (large uploads
+    spooled to disk) are reachable through /proc on Linux.
+    """
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    proc_path = f"/proc/{os.getpid()}/fd/{fd}"
+    return proc_path if os.path.exists(proc_path) else None
+
+
+def split_ranges(stream: BinaryIO, start: int, end: int, range_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Split [start, end) of a seekable stream into ranges ending on newlines
+
+    Each cut is moved forward to just after the next newline, so no record
+    straddles two ranges.
+    """
+    while start < end:
+        cut = start + range_size
+        if cut >= end:
+            cut = end
+        else:
+            stream.seek(cut)
+            stream.readline()
+            cut = min(stream.tell(), end)
+        yield start, cut
+        start = cut
+
+
+def parse_vcf_parallel(
+    stream: BinaryIO,
+    workers: Optional[int] = None,
+    range_size: int = DEFAULT_RANGE_SIZE,
+    path: Optional[str] = None,
+) -> Tuple[Dict, bool]:
+    """
+    Parse a large uncompressed VCF across a process pool
+
+    The header is read here to validate the file and pick the reference
+    build. The body is then split on newline boundaries into byte ranges
+    of about range_size, each parsed by a pool worker that reads the range
+    from disk. Results are merged in range order, so variants come back in
+    file order exactly as from parse_vcf_stream (genomic order for a
+    sorted VCF). At most two ranges per worker are in flight.
+
+    Args:
+        stream: Seekable binary file object
+        workers: Process count; 0 or None means one per CPU
+        range_size: Bytes of body per worker task
+        path: Path workers open; defaults to shared_path(stream)
+
+    Returns:
+        Tuple of (parsed_data, success_flag)
+    """
+    workers = resolve_workers(workers)
+    parser = VCFParser()
+    metadata: Dict = {}
+    variants: List[Variant] = []
+    pending: Deque = deque()
+
+    try:
+        path = path or shared_path(stream)
+        if path is None:
+            raise ValueError("Parallel parsing needs a file on disk")
+
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+
+        # Read just far enough to pass the header; the first data block's
+        # offset is where the body starts
+        blocks = parser._iter_data_blocks(iter_chunks(stream), metadata, strict=True)
+        first = next(blocks, None)
+        blocks.close()
+        if first is None:
+            return parser._build_result(metadata, variants), True
+        _, interval_index, body_start = first
+
+        pool = get_parse_pool(workers)
+        for start, end in split_ranges(stream, body_start, size, range_size):
+            pending.append(pool.submit(_scan_file_range, path, start, end, interval_index.build))
+            if len(pending) >= 2 * workers:
+                variants.extend(pending.popleft().result())
+        while pending:
+            variants.extend(pending.popleft().result())
+        return parser._build_result(metadata, variants), True
+    except Exception as e:
+        for future in pending:
+            future.cancel()
+        return {"error": str(e)}, False
@@ -0,0 +1,277 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+
+# File layout: header, JSON label tables, then column arrays sorted by rs number
+#   magic | record count (u64) | labels length (u64) | labels JSON | pad to 8
+#   rs numbers (u32[n]) | gene codes (u8[n]) | star codes (u16[n]) | function codes (u8[n])
+INDEX_MAGIC = b"PGRSIX1\n"
+_HEADER = struct.Struct("<8sQQ")
+
+# Label code 0 means "not annotated"
+NO_LABEL = 0
+
+_RS_NUMBER = re.compile(r"rs([0-9]+)$", re.IGNORECASE)
+
+# rs numbers anywhere in a lowercased VCF data block (ID column, RS= tags).
+# Exactly one match per "rs" followed by a digit, so match k is the k-th
+# such position; a stray or truncated match only costs parsing its line.
+RSID_FIELD_PATTERN = re.compile(rb"rs([0-9]{1,10})")
+
+
+class RsidAnnotation(NamedTuple):
+    """What the index knows about one rsID"""
+
+    gene: Optional[str]
+    star: Optional[str]
+    function: Optional[str]
+
+
+def rs_number(rsid: str) -> Optional[int]:
+    """Integer part of an rsID ("rs4244285" -> 4244285), or None"""
+    match = _RS_NUMBER.match(rsid.strip()) if rsid else None
+    return int(match.group(1)) if match else None
+
+
+class RsidIndex:
+    """
+    Read-only rsID -> gene/star/function index over a memory-mapped file
+
+    rs numbers are stored as one sorted uint32 column with parallel code
+    columns; lookups are a binary search (np.searchsorted) over the mapped
+    keys, touching only the handful of pages on the search path. The file
+    is mapped read-only, so every worker process on a host shares the same
+    page-cache copy and a dbSNP-scale index costs no per-worker heap.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            info = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Identifies this build of the index, e.g. in parse cache keys
+        self.stamp = f"{info.st_size:x}{info.st_mtime_ns:x}"
+        try:
+            magic, count, labels_length = _HEADER.unpack_from(self._mmap, 0)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"Not an rsID index: {self.path}")
+            offset = _HEADER.size
+            labels = json.loads(self._mmap[offset:offset + labels_length])
+            offset = _align(offset + labels_length)
+            self.genes: Tuple[Optional[str], ...] = (None,) + tuple(labels["genes"])
+            self.stars: Tuple[Optional[str], ...] = (None,) + tuple(labels["stars"])
+            self.functions: Tuple[Optional[str], ...] = (None,) + tuple(labels["functions"])
+
+            columns = []
+            for dtype in (np.uint32, np.uint8, np.uint16, np.uint8):
+                columns.append(np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset))
+                offset = _align(offset + count * np.dtype(dtype).itemsize)
+            self.keys, self.gene_codes, self.star_codes, self.function_codes = columns
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            self._mmap.close()
+            raise ValueError(f"Invalid rsID index {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, numbers: np.ndarray) -> np.ndarray:
+        """
+        Row of each rs number in the index
+
+        Args:
+            numbers: Integer array of rs numbers
+
+        Returns:
+            intp array of rows, -1 where the rs number is not indexed
+        """
+        numbers = np.asarray(numbers, dtype=np.int64)
+        keys = self.keys
+        # Search in the keys' own dtype; a mixed-type search would copy the mapped column
+        valid = (numbers >= 0) & (numbers <= 0xFFFFFFFF)
+        probes = np.where(valid, numbers, 0).astype(np.uint32)
+        # Sorted probes walk the keys in order, which is far kinder to the cache
+        order = np.argsort(probes, kind="stable")
+        rows = np.empty(len(probes), dtype=np.intp)
+        rows[order] = np.searchsorted(keys, probes[order])
+        found = valid & (rows < len(keys))
+        found[found] = keys[rows[found]] == probes[found]
+        return np.where(found, rows, -1)
+
+    def lookup(self, rsid: str) -> Optional[RsidAnnotation]:
+        """Annotation for one rsID, or None when it is not indexed"""
+        number = rs_number(rsid)
+        return None if number is None else self.lookup_number(number)
+
+    def lookup_number(self, number: int) -> Optional[RsidAnnotation]:
+        """Annotation for one rs number, or None when it is not indexed"""
+        if not 0 <= number <= 0xFFFFFFFF:
+            return None
+        row = int(np.searchsorted(self.keys, np.uint32(number)))
+        if row >= len(self.keys) or self.keys[row] != number:
+            return None
+        return RsidAnnotation(
+            self.genes[self.gene_codes[row]],
+            self.stars[self.star_codes[row]],
+            self.functions[self.function_codes[row]],
+        )
+
+    def gene(self, rsid: str) -> Optional[str]:
+        """Gene of one rsID, or None"""
+        annotation = self.lookup(rsid)
+        return annotation.gene if annotation else None
+
+    def gene_code_mask(self, genes: Iterable[str]) -> np.ndarray:
+        """Boolean table over gene codes, True for the given genes"""
+        wanted = set(genes)
+        return np.array([label in wanted for label in self.genes], dtype=bool)
+
+    def close(self):
+        """Release the mapping (arrays from this index become invalid)"""
+        self.keys = self.gene_codes = self.star_codes = self.function_codes = None
+        self._mmap.close()
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_rsid_index(
+    path: Union[str, Path],
+    records: Iterable[Tuple[str, Optional[str], Optional[str], Optional[str]]]
+) -> int:
+    """
+    Build an index file from (rsid, gene, star, function) records
+
+    Records may come in any order; for a repeated rsID the first one wins.
+    Records are packed into typed arrays as they stream in (7 bytes each),
+    so building from a dbSNP-sized table needs no per-record objects. The
+    file is written to a temporary name and moved into place, so processes
+    mapping the old file keep a consistent view.
+
+    Returns:
+        Number of indexed rsIDs
+
+    Raises:
+        ValueError: An rsID is malformed or a label table overflows
+    """
+    labels = ({}, {}, {})
+    limits = (0xFF, 0xFFFF, 0xFF)
+    numbers = array("I")
+    codes = (array("B"), array("H"), array("B"))
+    for rsid, *values in records:
+        number = rs_number(rsid)
+        if number is None or number > 0xFFFFFFFF:
+            raise ValueError(f"Invalid rsID: {rsid!r}")
+        numbers.append(number)
+        for value, table, column, limit in zip(values, labels, codes, limits):
+            code = NO_LABEL
+            if value:
+                code = table.get(value)
+                if code is None:
+                    if len(table) >= limit:
+                        raise ValueError("Too many distinct gene, star or function labels")
+                    code = table[value] = len(table) + 1
+            column.append(code)
+
+    keys = np.frombuffer(numbers, dtype=np.uint32)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    order, keys = order[first], keys[first]
+    columns = [keys] + [
+        np.frombuffer(column, dtype=dtype)[order]
+        for column, dtype in zip(codes, (np.uint8, np.uint16, np.uint8))
+    ]
+    label_json = json.dumps({
+        "genes": list(labels[0]), "stars": list(labels[1]), "functions": list(labels[2]),
+    }).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, len(keys), len(label_json)))
+            f.write(label_json)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            for column in columns:
+                f.write(column.tobytes())
+                f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(keys)
+
+
+def read_rsid_table(path: Union[str, Path]) -> Iterable[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """
+    Records of a tab-separated rsid/gene/star/function file
+
+    Blank lines and lines starting with '#' are skipped; missing trailing
+    columns and '.' mean "not annotated".
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\r\n").split("\t")
+            fields += [""] * (4 - len(fields))
+            rsid, gene, star, function = (field.strip() for field in fields[:4])
+            yield rsid, gene if gene != "." else "", star if star != "." else "", function if function != "." else ""
+
+
+_index: Optional[RsidIndex] = None
+_configured = False
+_lock = threading.Lock()
+
+
+def configure_rsid_index(path: Optional[Union[str, Path]]) -> Optional[RsidIndex]:
+    """
+    Use the index at path for rsID annotation (None disables it)
+
+    Opening is eager, so a missing or corrupt file fails at startup.
+    """
+    global _index, _configured
+    index = RsidIndex(path) if path else None
+    with _lock:
+        _index, _configured = index, True
+    return index
+
+
+def get_rsid_index() -> Optional[RsidIndex]:
+    """
+    The process-wide rsID index, or None when none is configured
+
+    Processes that never called configure_rsid_index (parse pool workers)
+    open RSID_INDEX_PATH from the environment on first use.
+    """
+    global _index, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                path = os.getenv("RSID_INDEX_PATH")
+                _index = RsidIndex(path) if path else None
+                _configured = True
+    return _index
+
+
+if __name__ == "__main__":
+    # Build an index: python -m app.parsers.rsid_index table.tsv index.bin
+    if len(sys.argv) != 3:
+        print("Usage: python -m app.parsers.rsid_index <rsid_gene_star_function.tsv> <index file>")
+        sys.exit(2)
+    count = write_rsid_index(sys.argv[2], read_rsid_table(sys.argv[1]))
+    print(f"Indexed {count} rsIDs -> {sys.argv[2]}")
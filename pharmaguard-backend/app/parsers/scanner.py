@@ -0,0 +1,261 @@
+import hashlib
+import re
+from itertools import repeat
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from app.parsers.variant import Variant
+from app.parsers.vcf_parser import VCFEncodingError, VCFParser, decode_field
+
+
+# Errors reported before a scan stops reading the file
+DEFAULT_MAX_ERRORS = 100
+
+_FIELD = rb"[^\t\n]*"
+_INFO_ENTRY = rb"[A-Za-z0-9_][A-Za-z0-9_.]*(?:=[^;\t\n]*)?"
+_INFO = rb"(?:\.|" + _INFO_ENTRY + rb"(?:;" + _INFO_ENTRY + rb")*;?)"
+_INFO_PATTERN = re.compile(_INFO + rb"\r?")
+
+# Lines (after a leading newline) whose CHROM/POS prefix is not a record;
+# also catches comment and blank lines, which the slow path then skips
+_BAD_PREFIX = re.compile(rb"\n(?![^#\t\n\r][^\t\n]*\t[0-9]+\t)")
+
+# Runs of consecutive lines on one contig, one match per run
+_CONTIG_RUNS = re.compile(rb"\n([^\t\n]*)\t[^\n]*(?:\n\1\t[^\n]*)*")
+
+# With ';' and newlines mapped to TAB (and CR dropped), every empty field or
+# INFO entry and every entry without a key shows up as one of these pairs
+_SEPARATORS_AS_TAB = bytes.maketrans(b";\n", b"\t\t")
+_SUSPECT_PAIRS = (b"\t\t", b"\t=")
+
+_CONTIG_ID = re.compile(r"^##contig=<.*?\bID=([^,>]+)")
+
+
+def record_pattern(column_count: int) -> "re.Pattern[bytes]":
+    """Regex matching one well-formed data line with column_count columns"""
+    extra = (rb"\t" + _FIELD) * max(column_count - 8, 0)
+    body = (
+        rb"[^#\t\n\r][^\t\n]*\t[0-9]+\t"
+        + rb"\t".join([_FIELD] * 5)
+        + rb"\t" + _INFO + extra + rb"\r?"
+    )
+    return re.compile(body)
+
+
+def diagnose_line(line: bytes, column_count: int) -> Tuple[str, str]:
+    """
+    Explain why a data line failed the record pattern
+
+    Returns:
+        Tuple of (error code, human-readable message)
+    """
+    fields = line.rstrip(b"\r").split(b"\t")
+    if len(fields) != column_count:
+        return "COLUMN_COUNT", f"Expected {column_count} tab-separated columns, found {len(fields)}"
+    if not fields[0]:
+        return "INVALID_CHROM", "CHROM is empty"
+    if not fields[1].isdigit():
+        return "INVALID_POS", f"POS must be a non-negative integer, got '{fields[1].decode('utf-8', 'replace')}'"
+    if not _INFO_PATTERN.fullmatch(fields[7]):
+        return "MALFORMED_INFO", "INFO must be '.' or semicolon-separated KEY or KEY=VALUE entries"
+    return "MALFORMED_RECORD", "Record could not be parsed"
+
+
+class VCFScanner:
+    """
+    Single-pass VCF validator that also gathers statistics and parses
+
+    One pass over newline-aligned byte blocks checks structure, reports
+    per-line diagnostics, and collects sample names, contigs, variant
+    counts and the parsed target-gene variants (the same result as
+    parse_vcf_chunks, so callers can cache it). Blocks are first checked
+    with a few C-level calls; only suspect blocks are walked line by line.
+    Scanning stops once max_errors diagnostics are collected.
+    """
+
+    def __init__(self, max_errors: int = DEFAULT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.parser = VCFParser()
+
+    def scan(self, chunks: Iterable[bytes]) -> Dict:
+        """
+        Validate and summarise a VCF
+
+        Args:
+            chunks: Newline-aligned byte blocks (see iter_chunks)
+
+        Returns:
+            Dict with valid, message, errors, error_count, truncated,
+            samples, contigs, variant_count, target_variant_count,
+            target_genes_found and parse_result (None unless the whole
+            file was read and is valid)
+
+        Raises:
+            VCFEncodingError: Invalid UTF-8, with its byte offset
+        """
+        metadata: Dict = {}
+        header: List[str] = []
+        errors: List[Dict] = []
+        variants: List[Variant] = []
+        contigs: Dict[str, None] = {}
+        columns: Optional[List[str]] = None
+        pattern = None
+        line_number = 0
+        variant_count = 0
+        truncated = False
+
+        blocks = self.parser._iter_data_blocks(chunks, metadata, strict=True, header=header)
+        try:
+            for chunk, interval_index, chunk_offset in blocks:
+                if columns is None:
+                    columns = self._read_header(header, contigs)
+                    pattern = record_pattern(len(columns))
+                    line_number = len(header)
+                if not chunk.isascii():
+                    decode_field(chunk, chunk_offset)
+
+                body = chunk[:-1] if chunk.endswith(b"\n") else chunk
+                lines = body.split(b"\n")
+                contigs.update(
+                    dict.fromkeys(chrom.decode("utf-8") for chrom in _CONTIG_RUNS.findall(b"\n" + body))
+                )
+
+                if self._is_clean(body, lines, len(columns) - 1):
+                    variant_count += len(lines)
+                else:
+                    variant_count += self._diagnose_block(lines, line_number, len(columns), pattern, errors)
+                    if len(errors) >= self.max_errors:
+                        truncated = True
+                        break
+
+                variants.extend(self.parser._scan_chunk(chunk, interval_index, chunk_offset))
+                line_number += len(lines)
+        except VCFEncodingError:
+            raise
+        except ValueError as e:
+            message = str(e)
+            return self._summary(
+                False, message, [{"line": None, "code": "INVALID_STRUCTURE", "message": message}],
+                False, [], contigs, variant_count, [], None,
+            )
+        finally:
+            blocks.close()
+
+        if columns is None:
+            columns = self._read_header(header, contigs)
+
+        samples = columns[9:]
+        if errors:
+            message = f"{len(errors)} invalid record(s)" + (" (stopped early)" if truncated else "")
+            return self._summary(False, message, errors, truncated, samples, contigs, variant_count, variants, None)
+
+        parse_result = self.parser._build_result(metadata, variants)
+        return self._summary(
+            True, "Valid VCF structure", errors, False, samples, contigs, variant_count, variants, parse_result,
+        )
+
+    def _read_header(self, header: List[str], contigs: Dict[str, None]) -> List[str]:
+        """Record ##contig IDs and return the #CHROM line's column names"""
+        columns: List[str] = []
+        for line in header:
+            match = _CONTIG_ID.match(line)
+            if match:
+                contigs[match.group(1)] = None
+            elif line.startswith("#CHROM"):
+                columns = line.lstrip("#").split("\t")
+        return columns
+
+    def _is_clean(self, body: bytes, lines: List[bytes], tab_count: int) -> bool:
+        """
+        Cheap whole-block checks that every line is a well-formed record
+
+        Column counts, CHROM/POS and empty fields or INFO entries are each
+        checked with one C-level call over the block. A block failing any of
+        them is walked line by line, which also confirms real errors.
+        """
+        if list(map(bytes.count, lines, repeat(b"\t"))).count(tab_count) != len(lines):
+            return False
+        if _BAD_PREFIX.search(b"\n" + body):
+            return False
+        separators = body.translate(_SEPARATORS_AS_TAB, b"\r")
+        if separators.endswith(b"\t"):
+            return False
+        return not any(pair in separators for pair in _SUSPECT_PAIRS)
+
+    def _diagnose_block(
+        self,
+        lines: List[bytes],
+        first_line: int,
+        column_count: int,
+        pattern,
+        errors: List[Dict]
+    ) -> int:
+        """
+        Walk a suspect block, appending one diagnostic per bad line
+
+        Returns:
+            Number of data lines in the block (comment and blank lines excluded)
+        """
+        data_lines = 0
+        for index, line in enumerate(lines, start=first_line + 1):
+            if not line.strip(b"\r") or line.startswith(b"#"):
+                continue
+            data_lines += 1
+            if len(errors) >= self.max_errors or pattern.fullmatch(line):
+                continue
+            code, message = diagnose_line(line, column_count)
+            errors.append({"line": index, "code": code, "message": message})
+        return data_lines
+
+    def _summary(
+        self,
+        valid: bool,
+        message: str,
+        errors: List[Dict],
+        truncated: bool,
+        samples: List[str],
+        contigs: Dict[str, None],
+        variant_count: int,
+        variants: List[Variant],
+        parse_result: Optional[Dict],
+    ) -> Dict:
+        return {
+            "valid": valid,
+            "message": message,
+            "errors": errors,
+            "error_count": len(errors),
+            "truncated": truncated,
+            "samples": samples,
+            "contigs": list(contigs),
+            "variant_count": variant_count,
+            "target_variant_count": len(variants),
+            "target_genes_found": sorted({v.gene for v in variants}),
+            "parse_result": parse_result,
+        }
+
+
+class HashingReader:
+    """Binary file wrapper that feeds every byte read into a SHA-256 digest"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.bytes_read = 0
+        self._digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self._digest.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def scan_vcf_chunks(chunks: Iterable[bytes], max_errors: int = DEFAULT_MAX_ERRORS) -> Dict:
+    """
+    Validate, summarise and parse a VCF from newline-aligned byte blocks
+
+    Returns:
+        Scan summary (see VCFScanner.scan)
+    """
+    return VCFScanner(max_errors).scan(chunks)
@@ -0,0 +1,145 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Union
+
+from app.parsers.variant_id import variant_id
+
+
+InfoValue = Union[str, bool]
+
+VARIANT_KEYS = (
+    "chrom", "pos", "id", "ref", "alt", "qual", "filter", "gene", "star", "rsid", "info", "alt_copies",
+)
+
+
+def parse_info(info_string: str) -> Dict[str, InfoValue]:
+    """
+    Parse INFO field following VCF specification
+    Returns dict with key=value pairs (flags map to True)
+    """
+    info_dict = {}
+    if not info_string or info_string == ".":
+        return info_dict
+
+    for item in info_string.split(';'):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            info_dict[key] = value
+        else:
+            info_dict[item] = True
+
+    return info_dict
+
+
+def info_value(info_string: str, key: str) -> Optional[InfoValue]:
+    """
+    Look up one INFO key without decoding the rest of the field
+
+    Returns the value, True for a flag, or None when the key is absent.
+    """
+    key_length = len(key)
+    start = info_string.find(key)
+    while start >= 0:
+        after = start + key_length
+        if start == 0 or info_string[start - 1] == ';':
+            if after == len(info_string) or info_string[after] == ';':
+                return True
+            if info_string[after] == '=':
+                end = info_string.find(';', after)
+                return info_string[after + 1:end if end >= 0 else len(info_string)]
+        start = info_string.find(key, after)
+    return None
+
+
+class Variant(Mapping):
+    """
+    Compact record for one kept VCF variant
+
+    Holds the raw INFO string and decodes keys on access, so only GENE and
+    RS are looked at during parsing. Reads like the per-variant dict it
+    replaces (variant['gene'], variant.get('rsid'), dict(variant)). key is
+    the integer variant ID (see variant_id), computed once at parse time.
+    alt_copies is the ALT allele count of the sample's GT (0, 1 or 2), or
+    None when the VCF gives no genotype.
+    """
+
+    __slots__ = (
+        "chrom", "pos", "id", "ref", "alt", "qual", "filter", "gene", "rsid", "info_raw", "alt_copies", "key", "_info",
+    )
+
+    # Pickled fields; key is derived from them and recomputed on load
+    _STATE = __slots__[:-2]
+
+    def __init__(
+        self,
+        chrom: str,
+        pos: str,
+        id: Optional[str],
+        ref: str,
+        alt: str,
+        qual: str,
+        filter: str,
+        gene: str,
+        rsid: Optional[InfoValue],
+        info_raw: str,
+        alt_copies: Optional[int] = None,
+    ):
+        self.chrom = chrom
+        self.pos = pos
+        self.id = id
+        self.ref = ref
+        self.alt = alt
+        self.qual = qual
+        self.filter = filter
+        self.gene = gene
+        self.rsid = rsid
+        self.info_raw = info_raw
+        self.alt_copies = alt_copies
+        self.key = variant_id(rsid, chrom, pos)
+        self._info = None
+
+    @property
+    def star(self) -> Optional[InfoValue]:
+        """STAR allele from INFO, decoded on access"""
+        return info_value(self.info_raw, "STAR")
+
+    @property
+    def info(self) -> Dict[str, InfoValue]:
+        """Full INFO dict, decoded on first access"""
+        if self._info is None:
+            self._info = parse_info(self.info_raw)
+        return self._info
+
+    def __getitem__(self, key: str):
+        if key not in VARIANT_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(VARIANT_KEYS)
+
+    def __len__(self) -> int:
+        return len(VARIANT_KEYS)
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self._STATE)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self._STATE, state):
+            setattr(self, slot, value)
+        self.key = variant_id(self.rsid, self.chrom, self.pos)
+        self._info = None
+
+    def with_alt_copies(self, alt_copies: Optional[int]) -> "Variant":
+        """Copy of this record with another genotype (e.g. one cohort sample's)"""
+        variant = Variant.__new__(Variant)
+        for slot in self.__slots__:
+            setattr(variant, slot, getattr(self, slot))
+        variant.alt_copies = alt_copies
+        return variant
+
+    def to_dict(self) -> Dict:
+        """Plain dict in the legacy per-variant layout"""
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Variant({self.chrom}:{self.pos} {self.ref}>{self.alt} gene={self.gene} rsid={self.rsid})"
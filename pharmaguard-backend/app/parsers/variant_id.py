@@ -0,0 +1,96 @@
+from typing import Any, Dict, Optional
+
+
+# Variant IDs are ints, so the analysis path compares and hashes integers
+# instead of re-normalizing strings:
+#   rsIDs ("rs4244285", any case)    rs number                    > 0
+#   bare RS= numbers ("4244285")     rs number | BARE_RS_FLAG     > 0
+#   standard CHROM, numeric POS      -(chrom code << 40 | pos)    in (-TEXT_BASE, -PACKED_BASE]
+#   anything else                    -(TEXT_BASE + text bytes)    <= -TEXT_BASE
+# variant_id_text() gives back the string the response reports. Every ID is
+# computed from the variant alone, so there are no process-global tables to
+# grow with the uploads a worker sees, and IDs mean the same in every process.
+ID_BITS = 40
+BARE_RS_FLAG = 1 << ID_BITS
+PACKED_BASE = 1 << ID_BITS
+TEXT_BASE = 1 << (ID_BITS + 8)
+_ID_LIMIT = 1 << ID_BITS
+
+# CHROM spellings packed with their POS; code 0 is unused so packed IDs stay below -PACKED_BASE
+_CHROM_NAMES = tuple(
+    f"{prefix}{name}"
+    for prefix in ("", "chr")
+    for name in [str(number) for number in range(1, 23)] + ["X", "Y", "M", "MT"]
+)
+_CHROM_CODES: Dict[str, int] = {name: code for code, name in enumerate(_CHROM_NAMES, 1)}
+
+
+def _text_id(text: str) -> int:
+    # A leading 0x01 byte keeps leading NUL bytes of the text
+    return -(TEXT_BASE + int.from_bytes(b"\x01" + text.encode("utf-8"), "big"))
+
+
+def _id_text(magnitude: int) -> str:
+    encoded = magnitude - TEXT_BASE
+    return encoded.to_bytes((encoded.bit_length() + 7) // 8, "big")[1:].decode("utf-8")
+
+
+def _number(digits: str) -> Optional[int]:
+    """Canonical decimal digits (no sign, no leading zero) below 2**40 as an int"""
+    if not digits or not digits.isascii() or not digits.isdigit():
+        return None
+    if digits[0] == "0" and len(digits) > 1:
+        return None
+    number = int(digits)
+    return number if number < _ID_LIMIT else None
+
+
+def rs_key(rsid: str) -> Optional[int]:
+    """ID of a canonical rsID ("rs4244285", any case), or None"""
+    if rsid[:2].lower() != "rs":
+        return None
+    number = _number(rsid[2:])
+    return number if number else None
+
+
+def variant_id(rsid: Any, chrom: Any, pos: Any) -> int:
+    """
+    Integer ID of a variant from its rsID, or its CHROM/POS when it has none
+
+    Two variants get the same ID exactly when they would be reported
+    under the same string (rsIDs compare case-insensitively).
+    """
+    if rsid:
+        text = str(rsid).strip()
+        key = rs_key(text)
+        if key is not None:
+            return key
+        number = _number(text)
+        if number is not None:
+            return number | BARE_RS_FLAG
+        return _text_id(text)
+
+    if isinstance(chrom, str) and isinstance(pos, str):
+        position = _number(pos)
+        code = _CHROM_CODES.get(chrom)
+        if position is not None and code is not None:
+            return -((code << ID_BITS) | position)
+    return _text_id(f"chr{chrom}_{pos}")
+
+
+def variant_id_of(variant) -> int:
+    """ID of a parsed Variant (precomputed) or a variant dict"""
+    key = getattr(variant, "key", None)
+    if key is not None:
+        return key
+    return variant_id(variant.get("rsid"), variant.get("chrom"), variant.get("pos"))
+
+
+def variant_id_text(key: int) -> str:
+    """The reported string for a variant ID"""
+    if key > 0:
+        return str(key & ~BARE_RS_FLAG) if key & BARE_RS_FLAG else f"rs{key}"
+    key = -key
+    if key >= TEXT_BASE:
+        return _id_text(key)
+    return f"chr{_CHROM_NAMES[(key >> ID_BITS) - 1]}_{key & (PACKED_BASE - 1)}"
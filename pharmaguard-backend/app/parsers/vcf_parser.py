@@ -1,5 +1,86 @@
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.parsers.genotype import alt_copies, first_sample_gt, gt_code
+from app.parsers.loci import PharmacogeneIntervalIndex, detect_genome_build, interval_index_for
+from app.parsers.rsid_index import RSID_FIELD_PATTERN, RsidIndex, get_rsid_index
+from app.parsers.variant import Variant, info_value, parse_info
+
+
+# Bytes read per chunk when streaming uploads
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class VCFEncodingError(ValueError):
+    """Invalid UTF-8 in a decoded part of the VCF, with its absolute byte offset"""
+
+    def __init__(self, offset: int):
+        self.offset = offset
+        super().__init__(f"File encoding error: invalid UTF-8 at byte offset {offset}")
+
+    def __reduce__(self):
+        # Rebuild from the offset when raised in a parse worker process
+        return VCFEncodingError, (self.offset,)
+
+
+def decode_field(data: bytes, offset: int) -> str:
+    """Decode bytes taken from absolute file offset, reporting the exact bad byte"""
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise VCFEncodingError(offset + e.start) from None
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield newline-aligned blocks of a binary stream without reading it all
+
+    Each block ends just after a newline (or at EOF), so a line that spans
+    two reads is carried over and stitched into the next block.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        cut = chunk.rfind(b"\n") + 1
+        if not cut:
+            pending += chunk
+            continue
+        yield pending + chunk[:cut] if pending else chunk[:cut]
+        pending = chunk[cut:]
+    if pending:
+        yield pending
+
+
+def iter_line_chunks(lines: Iterable[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Batch individual byte lines into newline-aligned blocks"""
+    batch: List[bytes] = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield b"\n".join(batch) + b"\n"
+            batch, size = [], 0
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+
+def iter_lines(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield lines from a binary stream without reading it all into memory
+
+    Trailing CR characters (CRLF files) are dropped.
+    """
+    for chunk in iter_chunks(stream, chunk_size):
+        lines = chunk.split(b"\n")
+        if not lines[-1]:
+            lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith(b"\r") else line
 
 
 class VCFParser:
@@ -28,6 +109,12 @@ class VCFParser:
             "TPMT": ["AZATHIOPRINE"],
             "DPYD": ["FLUOROURACIL"],
         }
+        # Byte-level hint for records outside pharmacogene loci that the full
+        # parse could still keep through a GENE= tag or a known rsID
+        genes = "|".join(sorted(self.target_genes, key=len, reverse=True))
+        rsids = "|".join(sorted(rsid[2:] for rsid in self.rsid_gene_mapping))
+        self._gene_hint = re.compile(f"GENE=(?:{genes})(?=[;\\t\\r\\n]|$)".encode())
+        self._rsid_hint = re.compile(f"rs(?:{rsids})(?![0-9])".encode())
     
     def parse_vcf(self, content: str) -> Dict:
         """
@@ -39,99 +126,270 @@ class VCFParser:
         Returns:
             Dictionary with parsed variants and metadata
         """
-        lines = content.strip().split('\n')
         metadata = {}
-        variants = []
-        header_line_idx = -1
+        variants = list(self._iter_records([content.strip().encode('utf-8')], metadata))
+        return self._build_result(metadata, variants)
+
+    def parse_stream(self, stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+        """
+        Parse a VCF from a binary file object in fixed-size chunks
+
+        Returns the same structure as parse_vcf. Structure validation
+        (format declaration, header line) happens during the same pass.
+        """
+        return self.parse_chunks(iter_chunks(stream, chunk_size))
+
+    def parse_chunks(self, chunks: Iterable[bytes]) -> Dict:
+        """
+        Parse VCF content supplied as newline-aligned byte blocks
+
+        Returns the same structure as parse_vcf.
+        """
+        metadata = {}
+        variants = list(self._iter_records(chunks, metadata, strict=True))
+        return self._build_result(metadata, variants)
+
+    def iter_variants(
+        self,
+        stream: BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        metadata: Optional[Dict] = None
+    ) -> Iterator[Variant]:
+        """
+        Stream target-gene variants from a binary file object
         
-        # Parse header and extract metadata
-        for idx, line in enumerate(lines):
-            if line.startswith('##fileformat'):
-                metadata['fileformat'] = line.split('=')[1]
-            elif line.startswith('##'):
-                continue
-            elif line.startswith('#CHROM'):
-                header_line_idx = idx
-                break
+        Only the current chunk and the kept variants are held in memory, so
+        whole-genome VCFs can be parsed without materializing the file.
         
-        if header_line_idx == -1:
+        Args:
+            stream: Binary file-like object (UploadFile.file, open(path, 'rb'))
+            chunk_size: Bytes read per chunk
+            metadata: Optional dict populated with header metadata
+            
+        Yields:
+            Variant records for target genes, in file order
+        """
+        return self._iter_records(
+            iter_chunks(stream, chunk_size), metadata if metadata is not None else {}, strict=True
+        )
+
+    def _iter_records(self, chunks: Iterable[bytes], metadata: Dict, strict: bool = False) -> Iterator[Variant]:
+        """
+        Walk header lines, then scan data blocks for target-gene variants
+
+        Data blocks stay as bytes: only lines whose CHROM/POS fall in a
+        locus, or that carry a GENE=/rsID hint, are cut out, decoded and
+        parsed.
+        """
+        for chunk, interval_index, chunk_offset in self._iter_data_blocks(chunks, metadata, strict):
+            yield from self._scan_chunk(chunk, interval_index, chunk_offset)
+
+    def _iter_data_blocks(
+        self,
+        chunks: Iterable[bytes],
+        metadata: Dict,
+        strict: bool = False,
+        header: Optional[List[str]] = None
+    ) -> Iterator[Tuple[bytes, PharmacogeneIntervalIndex, int]]:
+        """
+        Consume the header, then yield (data block, interval index, file offset)
+
+        Header lines are decoded and used to pick the pharmacogene interval
+        index for the reference build. With strict=True the checks of
+        validate_vcf_structure are applied while the header is read, so
+        streamed input needs no separate pass. When a header list is given,
+        every line read before the data (leading blank lines included) is
+        appended to it.
+        """
+        in_header = True
+        header_lines = 0
+        has_fileformat = False
+        build_lines = []
+        interval_index = None
+        base_offset = 0
+
+        for chunk in chunks:
+            chunk_offset = base_offset
+            base_offset += len(chunk)
+            if in_header:
+                offset = 0
+                while in_header and offset < len(chunk):
+                    end = chunk.find(b'\n', offset)
+                    if end < 0:
+                        end = len(chunk)
+                    line = decode_field(chunk[offset:end], chunk_offset + offset).rstrip('\r')
+                    offset = end + 1
+                    if header is not None:
+                        header.append(line)
+
+                    if not header_lines and not line.strip():
+                        continue
+                    header_lines += 1
+                    if line.startswith('##fileformat'):
+                        metadata['fileformat'] = line.split('=')[1]
+                        if header_lines <= 5 and line.startswith('##fileformat=VCF'):
+                            has_fileformat = True
+                    elif line.startswith(('##reference', '##contig', '##assembly')):
+                        build_lines.append(line)
+                    elif line.startswith('#CHROM'):
+                        if strict and not has_fileformat:
+                            raise ValueError("Missing VCF format declaration")
+                        in_header = False
+                        build = detect_genome_build(build_lines)
+                        if build:
+                            metadata['genome_build'] = build
+                        interval_index = interval_index_for(build)
+                if in_header or offset >= len(chunk):
+                    continue
+                chunk = chunk[offset:]
+                chunk_offset += offset
+
+            yield chunk, interval_index, chunk_offset
+
+        if in_header:
+            if strict and not header_lines:
+                raise ValueError("Empty file")
+            if strict and not has_fileformat:
+                raise ValueError("Missing VCF format declaration")
             raise ValueError("Invalid VCF: Missing header line")
-        
-        # Parse variants
-        for line in lines[header_line_idx + 1:]:
-            if not line.strip() or line.startswith('#'):
+
+    def _scan_chunk(self, chunk: bytes, interval_index, chunk_offset: int = 0) -> Iterator[Variant]:
+        """
+        Parse the candidate lines of one newline-aligned data block
+
+        Candidates are located with two regex passes over the raw block, so
+        the 99.9% of whole-genome records outside the loci are never split.
+        chunk_offset is the block's position in the file, for error reports.
+        """
+        candidates = dict(interval_index.scan(chunk))
+        # rsIDs are matched case-insensitively; lower() keeps byte offsets
+        lowered = chunk.lower()
+        for hint, buffer in ((self._gene_hint, chunk), (self._rsid_hint, lowered)):
+            for match in hint.finditer(buffer):
+                candidates.setdefault(chunk.rfind(b'\n', 0, match.start()) + 1, None)
+
+        # With an rsID index, every rsID in the block is looked up in one batch
+        rsid_index = get_rsid_index()
+        if rsid_index is not None:
+            for start in self._indexed_rsid_offsets(lowered, rsid_index):
+                candidates.setdefault(chunk.rfind(b'\n', 0, start) + 1, None)
+
+        for start in sorted(candidates):
+            end = chunk.find(b'\n', start)
+            line = chunk[start:end if end >= 0 else len(chunk)]
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            if not line.strip() or line.startswith(b'#'):
                 continue
-            
-            variant = self._parse_variant_line(line)
+
+            variant = self._parse_variant_bytes(line, candidates[start], chunk_offset + start)
             if variant:
-                variants.append(variant)
-        
+                yield variant
+
+    def _indexed_rsid_offsets(self, lowered: bytes, rsid_index: RsidIndex) -> List[int]:
+        """Offsets of rsIDs in a lowercased block that the index maps to a target gene"""
+        numbers = RSID_FIELD_PATTERN.findall(lowered)
+        if not numbers:
+            return []
+
+        rows = rsid_index.find(np.array(numbers, dtype="S10").astype(np.int64))
+        hits = rows >= 0
+        hits[hits] = rsid_index.gene_code_mask(self.target_genes)[rsid_index.gene_codes[rows[hits]]]
+        hit_indices = np.flatnonzero(hits)
+        if not len(hit_indices):
+            return []
+
+        # Match k starts at the k-th "rs" + digit in the block
+        buffer = np.frombuffer(lowered, dtype=np.uint8)
+        digits = buffer[2:]
+        starts = np.flatnonzero(
+            (buffer[:-2] == ord("r")) & (buffer[1:-1] == ord("s")) & (digits >= ord("0")) & (digits <= ord("9"))
+        )
+        return starts[hit_indices].tolist()
+
+    def _build_result(self, metadata: Dict, variants: List[Variant]) -> Dict:
+        """Assemble the parse result returned to callers"""
         return {
             "metadata": metadata,
             "variants": variants,
             "total_variants": len(variants),
-            "target_genes_found": list(set([v.get("gene") for v in variants if v.get("gene")])),
+            "target_genes_found": list(set([v.gene for v in variants if v.gene])),
         }
     
-    def _parse_variant_line(self, line: str) -> Optional[Dict]:
+    def _parse_variant_line(self, line: str, locus_gene: Optional[str] = None) -> Optional[Variant]:
         """
         Parse a single VCF variant line
         
         VCF format: CHROM POS ID REF ALT QUAL FILTER INFO [FORMAT SAMPLE_DATA...]
+        
+        locus_gene is the pharmacogene whose locus contains CHROM/POS; it
+        annotates records that carry no GENE= tag or known rsID.
+        """
+        return self._parse_variant_bytes(line.encode('utf-8'), locus_gene)
+
+    def _parse_variant_bytes(self, line: bytes, locus_gene: Optional[str] = None, offset: int = 0) -> Optional[Variant]:
         """
-        fields = line.split('\t')
+        Parse a raw VCF record, decoding only the eight fixed columns
+
+        Of the FORMAT and sample columns only the first sample's GT is read,
+        and only for kept records. offset is the line's absolute byte
+        position, used to report encoding errors.
+        """
+        fields = line.split(b'\t', 8)
         if len(fields) < 8:
             return None
         
-        chrom, pos, vid, ref, alt, qual, filt, info = fields[:8]
-        
-        # Parse INFO field for GENE, STAR, RS
-        info_dict = self._parse_info(info)
+        try:
+            chrom, pos, vid, ref, alt, qual, filt, info = [field.decode('utf-8') for field in fields[:8]]
+        except UnicodeDecodeError:
+            decode_field(line, offset)
+            raise
         
-        rsid = info_dict.get("RS")
+        # Look up only GENE and RS; the rest of INFO stays raw until accessed
+        rsid = info_value(info, "RS")
         if not rsid and vid and vid.startswith("rs"):
             rsid = vid
 
         # Resolve gene from annotation, fallback to known rsID mapping
-        gene = info_dict.get("GENE")
+        gene_tag = info_value(info, "GENE")
+        gene = gene_tag
         if gene not in self.target_genes and rsid:
             gene = self.rsid_gene_mapping.get(rsid.lower())
+            if gene is None:
+                rsid_index = get_rsid_index()
+                if rsid_index is not None:
+                    gene = rsid_index.gene(rsid)
+
+        # Unannotated records inside a pharmacogene locus are annotated by coordinate
+        if gene not in self.target_genes and gene_tag is None:
+            gene = locus_gene
 
         # Only keep variants that map to target genes
         if gene not in self.target_genes:
             return None
+
+        gt = first_sample_gt(fields[8]) if len(fields) > 8 else None
         
-        return {
-            "chrom": chrom,
-            "pos": pos,
-            "id": vid if vid != "." else None,
-            "ref": ref,
-            "alt": alt,
-            "qual": qual,
-            "filter": filt,
-            "gene": gene,
-            "star": info_dict.get("STAR"),
-            "rsid": rsid,
-            "info": info_dict,
-        }
+        return Variant(
+            chrom=chrom,
+            pos=pos,
+            id=vid if vid != "." else None,
+            ref=ref,
+            alt=alt,
+            qual=qual,
+            filter=filt,
+            gene=gene,
+            rsid=rsid,
+            info_raw=info,
+            alt_copies=alt_copies(gt_code(gt)) if gt is not None else None,
+        )
     
     def _parse_info(self, info_string: str) -> Dict:
         """
         Parse INFO field following VCF specification
         Returns dict with key=value pairs
         """
-        info_dict = {}
-        if not info_string or info_string == ".":
-            return info_dict
-        
-        for item in info_string.split(';'):
-            if '=' in item:
-                key, value = item.split('=', 1)
-                info_dict[key] = value
-            else:
-                info_dict[item] = True
-        
-        return info_dict
+        return parse_info(info_string)
     
     def validate_vcf_structure(self, content: str) -> Tuple[bool, str]:
         """Validate basic VCF structure"""
@@ -148,6 +406,7 @@ class VCFParser:
         return True, "Valid VCF structure"
 
 
+
 def parse_vcf_file(file_content: str) -> Tuple[Dict, bool]:
     """
     Main function to parse VCF file
@@ -167,3 +426,38 @@ def parse_vcf_file(file_content: str) -> Tuple[Dict, bool]:
         return result, True
     except Exception as e:
         return {"error": str(e)}, False
+
+
+def parse_vcf_stream(stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Dict, bool]:
+    """
+    Parse a VCF from a binary file object without loading it into memory
+    
+    Returns:
+        Tuple of (parsed_data, success_flag)
+    """
+    return parse_vcf_chunks(iter_chunks(stream, chunk_size))
+
+
+def parse_vcf_lines(lines: Iterable[bytes]) -> Tuple[Dict, bool]:
+    """
+    Parse VCF byte lines (e.g. from the tabix region reader)
+    
+    Returns:
+        Tuple of (parsed_data, success_flag)
+    """
+    return parse_vcf_chunks(iter_line_chunks(lines))
+
+
+def parse_vcf_chunks(chunks: Iterable[bytes]) -> Tuple[Dict, bool]:
+    """
+    Parse VCF content from newline-aligned byte blocks (plain or gunzipped stream)
+    
+    Returns:
+        Tuple of (parsed_data, success_flag)
+    """
+    parser = VCFParser()
+    
+    try:
+        return parser.parse_chunks(chunks), True
+    except Exception as e:
+        return {"error": str(e)}, False
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import combinations
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.circuit_breaker import CircuitBreaker
+from app.engines.drug_genotype import profile_drug_genotype
+from app.engines.gene_profile import build_gene_profile
+from app.engines.knowledge import DEFAULT_KNOWLEDGE_PATH, KnowledgeBase, load_knowledge
+from app.engines.risk_engine import RiskAssessmentEngine
+from app.explanation_bundle import ExplanationBundle, write_explanation_bundle
+from app.fake_llm import FakeLLM
+from app.llm_integration import PROMPT_VERSION, LLMExplainer, SummaryRequest, configure_explainer
+from app.parsers.variant_id import variant_id_text
+
+
+class ExplanationInput(NamedTuple):
+    """The inputs of one dual-layer explanation, as analyze_single_drug passes them"""
+
+    gene: str
+    drug: str
+    phenotype: str
+    risk_label: str
+    detected_variants: Tuple[str, ...]
+    diplotype: str
+
+
+def canonical_genotypes(knowledge: KnowledgeBase, gene: str) -> List[List[Dict]]:
+    """
+    Variant lists covering the calls call_gene can make for a gene
+
+    Without STAR tags: every defining variant alone, every allele
+    definition and every pair of them (homozygous and compound
+    heterozygous diplotypes), plus each rsID with a star allele of its
+    own. With STAR tags: each star allele with each variant the knowledge
+    base ties to it.
+    """
+    genotypes: Dict[Tuple, List[Dict]] = {}
+
+    def add(rsids: Iterable[str], star: Optional[str] = None):
+        variants = [{"rsid": rsid, "gene": gene, **({"star": star} if star else {})} for rsid in rsids]
+        genotypes.setdefault(tuple((v["rsid"], star) for v in variants), variants)
+
+    table = knowledge.allele_table(gene)
+    if table is not None:
+        definitions = {
+            allele: [variant_id_text(key) for key in sorted(table.defining_ids((allele,)), key=table.bits.get)]
+            for allele in table.alleles
+        }
+        for key in sorted(table.bits, key=table.bits.get):
+            add([variant_id_text(key)])
+        for allele, rsids in definitions.items():
+            add(rsids)
+            for rsid in rsids:
+                add([rsid], allele)
+        for first, second in combinations(table.alleles, 2):
+            add(list(dict.fromkeys(definitions[first] + definitions[second])))
+    for rsid, star in knowledge.rsid_to_star.get(gene, {}).items():
+        add([rsid])
+        add([rsid], star)
+    for star, rsids in knowledge.star_allowed_rsids.get(gene, {}).items():
+        for rsid in sorted(rsids):
+            add([rsid], star)
+    return list(genotypes.values())
+
+
+def enumerate_explanation_inputs(engine: RiskAssessmentEngine) -> List[ExplanationInput]:
+    """
+    Every distinct explanation the knowledge base's drugs can ask for
+
+    Runs each knowledge base drug through the analysis path
+    (build_gene_profile, profile_drug_genotype) over the canonical
+    genotypes of each of its genes, so phenotypes come from the
+    phenotype inference tables and risk labels from the CPIC table and
+    drug overrides exactly as for an upload. Drugs are named the way
+    parse_drug_selection names them: supported drugs by ID, the others
+    as title-case custom labels analysed against the default genes.
+    """
+    knowledge = engine.knowledge
+    genotypes: Dict[str, List[List[Dict]]] = {}
+    inputs: Dict[ExplanationInput, None] = {}
+    for drug_id in knowledge.drugs:
+        drug = drug_id if drug_id in knowledge.supported_drugs else " ".join(drug_id.split()).title()
+        info = knowledge.drugs.get(drug)
+        relevant_genes = (info.get("genes") if info else None) or knowledge.default_relevant_genes
+        for gene in relevant_genes:
+            if gene not in genotypes:
+                genotypes[gene] = canonical_genotypes(knowledge, gene)
+            for variants in genotypes[gene]:
+                genotype = profile_drug_genotype(build_gene_profile(variants, engine), drug, relevant_genes, engine)
+                if genotype is None:
+                    continue
+                inputs[ExplanationInput(
+                    genotype["gene"],
+                    drug,
+                    genotype["phenotype"],
+                    genotype["risk"]["risk_label"],
+                    tuple(variant_id_text(key) for key in genotype["variant_ids"]),
+                    genotype["diplotype"],
+                )] = None
+    return list(inputs)
+
+
+class RateLimiter:
+    """Spaces call starts at least 1 / calls_per_second apart (0 = unlimited)"""
+
+    def __init__(self, calls_per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self._clock = clock
+        self._next = 0.0
+
+    async def wait(self):
+        """Return when the next call may start"""
+        now = self._clock()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def pregenerate(
+    explainer: LLMExplainer,
+    inputs: Iterable[ExplanationInput],
+    concurrency: int = 4,
+    calls_per_second: float = 2.0,
+    previous: Optional[ExplanationBundle] = None
+) -> Tuple[Dict[str, str], int]:
+    """
+    Generate both explanation layers of every input
+
+    Layers are generated without a dose: the explainer serves a dosed
+    request the dose-free clinical text with a dose note appended, so one
+    text covers every dose.
+
+    Args:
+        explainer: Explainer with a model; its model name and the prompt
+            version go into every key
+        inputs: Explanations to generate
+        concurrency: Model calls in flight at once
+        calls_per_second: Rate limit on starting model calls
+        previous: Bundle whose texts are reused instead of regenerated
+
+    Returns:
+        (explanation key -> text, number of layers that failed)
+    """
+    requests: Dict[str, SummaryRequest] = {}
+    for item in inputs:
+        for key, request in explainer.layer_requests(
+            item.gene, item.drug, item.phenotype, item.risk_label, list(item.detected_variants), item.diplotype
+        ):
+            requests.setdefault(key, request)
+
+    texts: Dict[str, str] = {}
+    if previous is not None:
+        for key in requests:
+            text = previous.get(key)
+            if text is not None:
+                texts[key] = text
+
+    slots = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(calls_per_second)
+    failures = 0
+
+    async def generate(key: str, request: SummaryRequest):
+        nonlocal failures
+        async with slots:
+            await limiter.wait()
+            try:
+                texts[key] = await explainer.complete_async(request)
+            except Exception as e:
+                failures += 1
+                print(f"Skipped {request.label.lower()} {key[:12]}: {e!r}")
+
+    await asyncio.gather(*(generate(key, request) for key, request in requests.items() if key not in texts))
+    return texts, failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.pregenerate_explanations",
+        description="Pre-generate LLM explanations into a bundle served via EXPLANATION_BUNDLE_PATH",
+    )
+    parser.add_argument("output", help="Bundle file to write")
+    parser.add_argument("--knowledge-base", default=os.getenv("KNOWLEDGE_BASE_PATH") or DEFAULT_KNOWLEDGE_PATH)
+    parser.add_argument("--concurrency", type=int, default=4, help="Model calls in flight at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="Model calls started per second (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds one model call may take")
+    parser.add_argument("--previous", help="Earlier bundle whose texts are reused")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the explanation inputs")
+    args = parser.parse_args(argv)
+
+    knowledge = load_knowledge(args.knowledge_base)
+    inputs = enumerate_explanation_inputs(RiskAssessmentEngine(knowledge))
+    combinations_found = {(item.gene, item.drug, item.phenotype, item.risk_label) for item in inputs}
+    print(
+        f"Knowledge base {knowledge.version}: {len(inputs)} explanations over "
+        f"{len(combinations_found)} gene/drug/phenotype/risk combinations"
+    )
+    if args.dry_run:
+        for item in inputs:
+            print("\t".join([item.gene, item.drug, item.phenotype, item.risk_label, item.diplotype, ",".join(item.detected_variants)]))
+        return 0
+
+    # Same provider selection as the API; a long breaker pause rides out rate-limit bursts
+    fake = os.getenv("LLM_PROVIDER", "gemini").lower() == "fake"
+    configure_explainer(
+        args.concurrency,
+        args.timeout,
+        CircuitBreaker(open_seconds=60.0),
+        FakeLLM(float(os.getenv("FAKE_LLM_DELAY_SECONDS", "0"))) if fake else None,
+    )
+    explainer = LLMExplainer()
+    if not explainer.model:
+        print("No model: set GEMINI_API_KEY (or LLM_PROVIDER=fake)")
+        return 2
+
+    previous = ExplanationBundle(args.previous) if args.previous else None
+    started = time.perf_counter()
+    texts, failures = asyncio.run(pregenerate(explainer, inputs, args.concurrency, args.rate, previous))
+    count = write_explanation_bundle(args.output, texts, {
+        "model": explainer.model_name,
+        "prompt_version": PROMPT_VERSION,
+        "knowledge_base_version": knowledge.version,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    })
+    print(
+        f"Bundled {count} explanation texts -> {args.output} "
+        f"({failures} failed, {time.perf_counter() - started:.1f} s)"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+
+
+class ResultsStore(ABC):
+    """
+    Stored analysis results by patient ID, bounded by age, count and size
+
+    Results are kept as JSON. They expire ttl_seconds after they were
+    stored; past max_entries or max_bytes (of JSON) the least recently
+    used are evicted. Subclasses implement the storage; hit, miss, expiry
+    and eviction counters live here.
+    """
+
+    backend = "none"
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.time
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def get(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Stored result of a patient, or None when missing or expired"""
+        data = self._load(patient_id, self.clock())
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(data) if data is not None else None
+
+    def put(self, patient_id: str, result: Dict[str, Any]):
+        """Store a patient's result, replacing any earlier one"""
+        data = json.dumps(result)
+        if self.max_entries > 0 and len(data) <= self.max_bytes:
+            self._store(patient_id, data, self.clock())
+
+    def update(self, patient_id: str, change: Callable[[Dict[str, Any]], None]) -> bool:
+        """
+        Change a stored result in place (e.g. fill in a deferred narrative)
+
+        The changed result only replaces the one it was made from, so
+        concurrent updates (one per deferred drug) are not lost; change is
+        run again on the newer result when another update got there first.
+        Not counted as a lookup; the result's lifetime restarts.
+
+        Returns:
+            False when the patient has no stored result
+        """
+        while True:
+            now = self.clock()
+            data = self._load(patient_id, now)
+            if data is None:
+                return False
+            result = json.loads(data)
+            change(result)
+            changed = json.dumps(result)
+            if self.max_entries <= 0 or len(changed) > self.max_bytes:
+                return True
+            if self._replace(patient_id, data, changed, now):
+                return True
+
+    def _count(self, expired: int = 0, evicted: int = 0):
+        with self._lock:
+            self.expired += expired
+            self.evicted += evicted
+
+    def stats(self) -> Dict:
+        """Counters and occupancy for monitoring"""
+        lookups = self.hits + self.misses
+        entries, size = self.occupancy()
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    @abstractmethod
+    def _load(self, patient_id: str, now: float) -> Optional[str]:
+        """Live stored JSON of a patient (marking it used), or None"""
+
+    @abstractmethod
+    def _store(self, patient_id: str, data: str, now: float):
+        """Store JSON for a patient, evicting as needed to stay within the bounds"""
+
+    @abstractmethod
+    def _replace(self, patient_id: str, old: str, new: str, now: float) -> bool:
+        """Store new for a patient only if old is still its live JSON; False otherwise"""
+
+    @abstractmethod
+    def occupancy(self) -> Tuple[int, int]:
+        """Live entries and their bytes"""
+
+
+class MemoryResultsStore(ResultsStore):
+    """In-process LRU store; each server worker process has its own"""
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.time
+    ):
+        super().__init__(ttl_seconds, max_entries, max_bytes, clock)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+
+    def _load(self, patient_id: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._drop(patient_id)
+                self.expired += 1
+                return None
+            self._entries.move_to_end(patient_id)
+            return entry[1]
+
+    def _store(self, patient_id: str, data: str, now: float):
+        with self._lock:
+            self._insert(patient_id, data, now)
+
+    def _replace(self, patient_id: str, old: str, new: str, now: float) -> bool:
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None or entry[0] <= now or entry[1] != old:
+                return False
+            self._insert(patient_id, new, now)
+            return True
+
+    def _insert(self, patient_id: str, data: str, now: float):
+        # Called with the lock held
+        if patient_id in self._entries:
+            self._drop(patient_id)
+        # Expired entries sit at the front unless they were used since
+        while self._entries:
+            oldest, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._drop(oldest)
+            self.expired += 1
+        self._entries[patient_id] = (now + self.ttl_seconds, data)
+        self._bytes += len(data)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evicted += 1
+
+    def _drop(self, patient_id: str):
+        _, data = self._entries.pop(patient_id)
+        self._bytes -= len(data)
+
+    def occupancy(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+# Table of the database backend; created on first use in whatever database it is given
+_metadata = MetaData()
+results_table = Table(
+    "analysis_results",
+    _metadata,
+    Column("patient_id", String(32), primary_key=True),
+    Column("data", Text, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+    Column("last_used_at", Float, nullable=False, index=True),
+)
+
+
+class DatabaseResultsStore(ResultsStore):
+    """
+    Store in an SQL table, shared by every worker and kept across restarts
+
+    A hit refreshes the row's last_used_at; each store drops expired rows
+    and then the least recently used ones beyond max_entries or max_bytes.
+    An update is a conditional UPDATE on the row's previous data, so
+    workers updating the same result do not overwrite each other.
+    """
+
+    backend = "database"
+
+    def __init__(
+        self,
+        engine: Engine,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.time
+    ):
+        super().__init__(ttl_seconds, max_entries, max_bytes, clock)
+        self.engine = engine
+        _metadata.create_all(engine, tables=[results_table])
+
+    def _load(self, patient_id: str, now: float) -> Optional[str]:
+        table = results_table
+        with self.engine.begin() as conn:
+            data = conn.execute(
+                select(table.c.data).where(table.c.patient_id == patient_id, table.c.expires_at > now)
+            ).scalar()
+            if data is not None:
+                conn.execute(update(table).where(table.c.patient_id == patient_id).values(last_used_at=now))
+        return data
+
+    def _store(self, patient_id: str, data: str, now: float):
+        table = results_table
+        with self.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.patient_id == patient_id))
+            expired = conn.execute(delete(table).where(table.c.expires_at <= now)).rowcount
+            conn.execute(insert(table).values(
+                patient_id=patient_id, data=data, size=len(data),
+                created_at=now, expires_at=now + self.ttl_seconds, last_used_at=now,
+            ))
+            evicted = self._evict(conn)
+        self._count(expired=expired, evicted=evicted)
+
+    def _replace(self, patient_id: str, old: str, new: str, now: float) -> bool:
+        table = results_table
+        with self.engine.begin() as conn:
+            replaced = conn.execute(
+                update(table)
+                .where(table.c.patient_id == patient_id, table.c.data == old, table.c.expires_at > now)
+                .values(
+                    data=new, size=len(new),
+                    created_at=now, expires_at=now + self.ttl_seconds, last_used_at=now,
+                )
+            ).rowcount
+            evicted = self._evict(conn) if replaced else 0
+        self._count(evicted=evicted)
+        return bool(replaced)
+
+    def _evict(self, conn) -> int:
+        """Delete the least recently used rows beyond the bounds, returning how many"""
+        table = results_table
+        evicted = 0
+        entries, size = conn.execute(select(func.count(), func.coalesce(func.sum(table.c.size), 0))).one()
+        if entries > self.max_entries or size > self.max_bytes:
+            # Keep the most recently used rows that fit both bounds
+            rows = conn.execute(
+                select(table.c.patient_id, table.c.size).order_by(table.c.last_used_at.desc())
+            ).all()
+            kept, kept_bytes = 0, 0
+            for row_patient_id, row_size in rows:
+                if kept < self.max_entries and kept_bytes + row_size <= self.max_bytes:
+                    kept += 1
+                    kept_bytes += row_size
+                    continue
+                conn.execute(delete(table).where(table.c.patient_id == row_patient_id))
+                evicted += 1
+        return evicted
+
+    def occupancy(self) -> Tuple[int, int]:
+        table = results_table
+        with self.engine.connect() as conn:
+            entries, size = conn.execute(
+                select(func.count(), func.coalesce(func.sum(table.c.size), 0)).where(table.c.expires_at > self.clock())
+            ).one()
+        return entries, size
+
+
+def create_results_store(
+    backend: str,
+    ttl_seconds: float,
+    max_entries: int,
+    max_bytes: int,
+    engine: Optional[Engine] = None
+) -> ResultsStore:
+    """
+    Build the configured results store
+
+    Args:
+        backend: "database" or "memory"
+        ttl_seconds: Lifetime of a stored result
+        max_entries: Bound on the number of stored results
+        max_bytes: Bound on the total size of stored results (JSON bytes)
+        engine: SQLAlchemy engine for the database backend
+
+    Returns:
+        A ResultsStore
+    """
+    backend = backend.lower()
+    if backend == "database":
+        if engine is None:
+            raise ValueError("The database results store needs a database engine")
+        return DatabaseResultsStore(engine, ttl_seconds, max_entries, max_bytes)
+    if backend == "memory":
+        return MemoryResultsStore(ttl_seconds, max_entries, max_bytes)
+    raise ValueError(f"Unknown results store backend: {backend}")
+
+
+def results_response(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A stored analysis record as /api/v1/results returns it
+
+    Records keep every drug's assessment under "assessments", keyed by
+    drug. The single "assessment" clients read before multi-drug records
+    is filled in next to it for single-drug analyses (None otherwise).
+    Records already in the single-assessment shape are returned as they are.
+    """
+    assessments = stored.get("assessments")
+    if assessments is None:
+        return stored
+    assessment = next(iter(assessments.values())) if len(assessments) == 1 else None
+    return {**stored, "assessment": assessment}
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async work into one execution
+
+    The first caller for a key starts the work as its own task; callers
+    arriving while it runs await the same task instead of repeating the
+    work, and all of them get its result (the same object, so treat it as
+    read-only) or its exception. Callers await the task through
+    asyncio.shield, so a cancelled caller (e.g. a client disconnect) does
+    not cancel the work the others are waiting for. Keys are forgotten as
+    soon as the work finishes: this coalesces, it does not cache.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Result of work() for key, shared with concurrent callers of the same key
+
+        Args:
+            key: Identity of the work; equal keys must mean equal results
+            work: Starts the work (called only when nothing is in flight for key)
+        """
+        with self._lock:
+            self.calls += 1
+            task = self._tasks.get(key)
+            if task is None:
+                self.executions += 1
+                task = self._tasks[key] = asyncio.ensure_future(work())
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        # Nobody may be left awaiting; mark a failure as seen
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._tasks),
+        }
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Drug analysis throughput of the knowledge/risk path (no LLM calls)
+
+Resolves gene, star allele, phenotype, risk and recommendation for every
+sample VCF, and compares a 1-drug request with a 12-drug request both
+with a shared per-VCF gene profile and with per-drug resolution.
+
+Usage:
+    python benchmarks/bench_drug_analysis.py [seconds]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.engines.drug_genotype import profile_drug_genotype, resolve_drug_genotype
+from app.engines.gene_profile import build_gene_profile
+from app.engines.risk_engine import get_engine
+from app.parsers.vcf_parser import parse_vcf_file
+
+
+def load_vcfs():
+    vcfs = []
+    for path in sorted((ROOT / "sample_vcf").glob("*.vcf")):
+        parsed, success = parse_vcf_file(path.read_text())
+        assert success, parsed
+        vcfs.append(parsed["variants"])
+    return vcfs
+
+
+def recommend(engine, drug, genotype):
+    if genotype is not None:
+        risk = genotype["risk"]
+        engine.get_clinical_recommendation(risk["risk_label"], drug, genotype["phenotype"], genotype["gene"])
+
+
+def request_per_drug(engine, variants, drugs):
+    for drug, genes in drugs:
+        recommend(engine, drug, resolve_drug_genotype(drug, variants, genes, engine))
+
+
+def request_with_profile(engine, variants, drugs):
+    profile = build_gene_profile(variants, engine)
+    for drug, genes in drugs:
+        recommend(engine, drug, profile_drug_genotype(profile, drug, genes, engine))
+
+
+def measure(label, request, engine, vcfs, drugs, seconds):
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for variants in vcfs:
+            request(engine, variants, drugs)
+        done += len(vcfs)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {done / elapsed:>10,.0f} requests/s  {done * len(drugs) / elapsed:>10,.0f} drug analyses/s")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    engine = get_engine()
+    vcfs = load_vcfs()
+    all_drugs = [(drug, info["genes"]) for drug, info in engine.knowledge.drugs.items()]
+    print(f"{len(vcfs)} sample VCFs, knowledge base {engine.knowledge.version}")
+
+    for drugs in (all_drugs[:1], all_drugs):
+        print(f"{len(drugs)} drug(s) per request:")
+        measure("per-drug resolution", request_per_drug, engine, vcfs, drugs, seconds)
+        measure("shared gene profile", request_with_profile, engine, vcfs, drugs, seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Star-allele haplotype matching latency
+
+Builds a synthetic gene with CYP2D6-scale allele definitions (hundreds of
+alleles over a few hundred defining positions) and times matching
+samples that carry a few defining variants, with and without genotypes.
+
+Usage:
+    python benchmarks/bench_haplotype.py [alleles] [samples]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.engines.haplotype import AlleleTable
+
+
+def synthetic_definitions(alleles, positions, rng):
+    rsids = [f"rs{1000000 + i}" for i in range(positions)]
+    return {f"*{i + 2}": rng.sample(rsids, rng.randint(1, 6)) for i in range(alleles)}, rsids
+
+
+def main():
+    alleles = int(sys.argv[1]) if len(sys.argv) > 1 else 160
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    rng = random.Random(0)
+    definitions, rsids = synthetic_definitions(alleles, alleles * 2, rng)
+
+    start = time.perf_counter()
+    table = AlleleTable("SYNTH", definitions)
+    print(f"{alleles} alleles over {len(table.bits)} positions, compiled in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    # Each sample carries one or two real alleles plus the odd novel variant
+    observations = []
+    for _ in range(samples):
+        carried = set()
+        for allele in rng.sample(list(definitions), rng.randint(1, 2)):
+            carried.update(definitions[allele])
+        if rng.random() < 0.2:
+            carried.add(rng.choice(rsids))
+        homozygous = [rsid for rsid in carried if rng.random() < 0.3]
+        observations.append((sorted(carried), homozygous))
+
+    for label, with_genotypes in (("no genotypes", False), ("with genotypes", True)):
+        start = time.perf_counter()
+        for carried, homozygous in observations:
+            table.match(carried, homozygous if with_genotypes else None)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<16} {elapsed / samples * 1e6:>8.1f} us/sample  {samples / elapsed:>10,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Whole-file VCF parse throughput: serial stream vs process pool, 1..N workers
+
+Writes a synthetic whole-genome-style VCF (GRCh38, sparse pharmacogene
+records) of the requested size once, then times each configuration.
+
+Usage:
+    python benchmarks/bench_parallel_parse.py [--size-mb 2048] [--workers N] [--range-mb 32] [--path FILE]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.parsers.loci import PHARMACOGENE_LOCI
+from app.parsers.parallel import get_parse_pool, parse_vcf_parallel, shutdown_parse_pools
+from app.parsers.vcf_parser import parse_vcf_stream
+
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##reference=GRCh38\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n"
+)
+
+
+def write_synthetic_vcf(path, size_mb):
+    """Write roughly size_mb of sorted records across chr1-22"""
+    rng = random.Random(7)
+    target = size_mb * 1024 * 1024
+    per_chrom = target // 22
+    loci = PHARMACOGENE_LOCI["GRCh38"]
+    with open(path, "w") as out:
+        out.write(HEADER)
+        for chrom in range(1, 23):
+            pos, written = 10000, 0
+            in_chrom = [(start, end) for c, start, end in loci.values() if c == str(chrom)]
+            while written < per_chrom:
+                pos += rng.randint(50, 1500)
+                if any(start <= pos <= end for start, end in in_chrom):
+                    info = f"DP={rng.randint(10, 60)};AF=0.5"
+                else:
+                    info = f"DP={rng.randint(10, 60)};AF=0.5;MQ=60"
+                line = f"chr{chrom}\t{pos}\t.\tA\tG\t{rng.randint(20, 99)}\tPASS\t{info}\tGT:DP\t0/1:{rng.randint(10, 60)}\n"
+                out.write(line)
+                written += len(line)
+
+
+def timed(label, size_bytes, parse):
+    start = time.perf_counter()
+    result, success = parse()
+    elapsed = time.perf_counter() - start
+    assert success, result
+    print(
+        f"{label:<12} {elapsed:>8.2f} s {size_bytes / elapsed / 1024 / 1024:>9.1f} MB/s"
+        f"  ({result['total_variants']} kept)"
+    )
+    return elapsed
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    cli.add_argument("--size-mb", type=int, default=2048)
+    cli.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    cli.add_argument("--range-mb", type=float, default=32)
+    cli.add_argument("--path", help="Existing VCF to parse instead of a synthetic one")
+    args = cli.parse_args()
+
+    path = args.path
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".vcf")
+        os.close(fd)
+        print(f"Writing {args.size_mb} MB synthetic VCF to {path} ...")
+        write_synthetic_vcf(path, args.size_mb)
+    size_bytes = os.path.getsize(path)
+    range_size = int(args.range_mb * 1024 * 1024)
+
+    try:
+        with open(path, "rb") as stream:
+            serial = timed("serial", size_bytes, lambda: parse_vcf_stream(stream))
+
+        for workers in range(1, args.workers + 1):
+            with open(path, "rb") as stream:
+                # Start the pool up front so process spawn is not timed
+                get_parse_pool(workers).submit(len, b"").result()
+                elapsed = timed(
+                    f"{workers} worker{'s' if workers > 1 else ''}",
+                    size_bytes,
+                    lambda: parse_vcf_parallel(stream, workers, range_size),
+                )
+            print(f"{'':<12} speed-up vs serial: {serial / elapsed:.2f}x")
+    finally:
+        shutdown_parse_pools()
+        if args.path is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
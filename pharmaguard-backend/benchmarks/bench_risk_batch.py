@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Batch risk assessment throughput on integer-coded arrays
+
+Times assess_risk_batch over random (gene, drug, phenotype) codes and
+compares it with calling assess_risk once per triple.
+
+Usage:
+    python benchmarks/bench_risk_batch.py [assessments]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.engines.risk_engine import get_engine
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    engine = get_engine()
+    codebook = engine.codebook()
+    rng = np.random.default_rng(0)
+    genes = rng.integers(-1, len(codebook.genes), count, dtype=np.int16)
+    drugs = rng.integers(-1, len(codebook.drugs), count, dtype=np.int16)
+    phenotypes = rng.integers(-1, len(codebook.phenotypes), count, dtype=np.int16)
+    print(f"{count:,} assessments, knowledge base {engine.knowledge.version}")
+
+    start = time.perf_counter()
+    engine.assess_risk_batch(genes, drugs, phenotypes)
+    elapsed = time.perf_counter() - start
+    print(f"  {'assess_risk_batch':<20} {elapsed * 1000:>10.1f} ms  {count / elapsed:>14,.0f} assessments/s")
+
+    sample = min(count, 100_000)
+    names = [
+        (codebook.genes[g] if g >= 0 else "", codebook.drugs[d] if d >= 0 else "", codebook.phenotypes[p] if p >= 0 else "")
+        for g, d, p in zip(genes[:sample].tolist(), drugs[:sample].tolist(), phenotypes[:sample].tolist())
+    ]
+    start = time.perf_counter()
+    for gene, drug, phenotype in names:
+        engine.assess_risk(gene, drug, phenotype, [])
+    elapsed = (time.perf_counter() - start) * count / sample
+    print(f"  {'assess_risk loop':<20} {elapsed * 1000:>10.1f} ms  {count / elapsed:>14,.0f} assessments/s (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
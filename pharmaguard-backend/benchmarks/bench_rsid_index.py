@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+rsID index size and lookup speed at dbSNP-like scale
+
+Builds a synthetic index (random rs numbers, 0.5% in pharmacogenes), then times scalar lookups, batched lookups and scanning
+an unannotated VCF block with the index enabled. Compares the on-disk
+size with the same mapping held as a Python dict.
+
+Usage:
+    python benchmarks/bench_rsid_index.py [rsids]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.parsers.loci import interval_index_for
+from app.parsers.rsid_index import RsidIndex, configure_rsid_index, write_rsid_index
+from app.parsers.vcf_parser import VCFParser
+
+GENES = ["CYP2D6", "CYP2C19", "CYP2C9", "VKORC1", "SLCO1B1", "TPMT", "DPYD", "ABCB1", "NAT2"]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    rng = np.random.default_rng(0)
+    numbers = np.unique(rng.integers(1, 2_000_000_000, count)).tolist()
+    gene_picks = rng.integers(0, len(GENES) * 200, len(numbers)).tolist()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rsid.idx")
+        start = time.perf_counter()
+        write_rsid_index(path, (
+            (f"rs{number}", GENES[pick] if pick < len(GENES) else "", "", "")
+            for number, pick in zip(numbers, gene_picks)
+        ))
+        print(f"{len(numbers):,} rsIDs indexed in {time.perf_counter() - start:.1f} s, "
+              f"{os.path.getsize(path) / 2 ** 20:.1f} MiB on disk "
+              f"(a dict of the same would be ~{len(numbers) * 180 / 2 ** 20:,.0f} MiB per worker)")
+
+        start = time.perf_counter()
+        index = RsidIndex(path)
+        print(f"  open (mmap)        {(time.perf_counter() - start) * 1e3:>8.2f} ms")
+
+        probes = [f"rs{n}" for n in rng.choice(numbers, 20_000).tolist()]
+        start = time.perf_counter()
+        for rsid in probes:
+            index.lookup(rsid)
+        print(f"  scalar lookup      {(time.perf_counter() - start) / len(probes) * 1e6:>8.2f} us")
+
+        batch = rng.integers(1, 2_000_000_000, 1_000_000)
+        start = time.perf_counter()
+        index.find(batch)
+        print(f"  batch find (1M)    {(time.perf_counter() - start) * 1e3:>8.2f} ms")
+
+        # Unannotated whole-genome-style block: every record has an rsID, no GENE=
+        lines = [
+            f"{chrom}\t{pos}\trs{number}\tA\tG\t50\tPASS\tDP=30".encode()
+            for chrom, pos, number in zip(
+                rng.integers(1, 23, 20_000).tolist(), rng.integers(1, 10 ** 8, 20_000).tolist(),
+                rng.choice(numbers, 20_000).tolist(),
+            )
+        ]
+        block = b"\n".join(lines) + b"\n"
+        parser = VCFParser()
+        interval_index = interval_index_for(None)
+        for label, configured in (("scan without index", None), ("scan with index", path)):
+            configure_rsid_index(configured)
+            start = time.perf_counter()
+            kept = sum(1 for _ in parser._scan_chunk(block, interval_index))
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<18} {len(block) / elapsed / 2 ** 20:>8.1f} MiB/s  ({kept} of {len(lines)} records kept)")
+        configure_rsid_index(None)
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Memory and throughput of kept-variant records: legacy dicts vs Variant
+
+Usage:
+    python benchmarks/bench_variant_records.py [n_variants]
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.parsers.variant import parse_info
+from app.parsers.vcf_parser import VCFParser
+
+
+def legacy_parse_variant_line(parser, line):
+    """Per-variant dict layout used before Variant records"""
+    fields = line.split('\t')
+    if len(fields) < 8:
+        return None
+    chrom, pos, vid, ref, alt, qual, filt, info = fields[:8]
+    info_dict = parse_info(info)
+    rsid = info_dict.get("RS")
+    if not rsid and vid and vid.startswith("rs"):
+        rsid = vid
+    gene = info_dict.get("GENE")
+    if gene not in parser.target_genes and rsid:
+        gene = parser.rsid_gene_mapping.get(rsid.lower())
+    if gene not in parser.target_genes:
+        return None
+    return {
+        "chrom": chrom, "pos": pos, "id": vid if vid != "." else None, "ref": ref, "alt": alt,
+        "qual": qual, "filter": filt, "gene": gene, "star": info_dict.get("STAR"),
+        "rsid": rsid, "info": info_dict,
+    }
+
+
+def make_lines(n):
+    return [
+        f"chr22\t{42126000 + i}\trs{1000000 + i}\tG\tA\t60\tPASS\t"
+        f"GENE=CYP2D6;STAR=*4;RS=rs{1000000 + i};DP=31;AF=0.5;MQ=60;AC=1;AN=2;CSQ=missense_variant"
+        for i in range(n)
+    ]
+
+
+def measure(label, parse_line, lines):
+    start = time.perf_counter()
+    kept = [parse_line(line) for line in lines]
+    elapsed = time.perf_counter() - start
+    del kept
+
+    tracemalloc.start()
+    kept = [parse_line(line) for line in lines]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    genes = sum(1 for v in kept if v["gene"] == "CYP2D6")
+    print(
+        f"{label:<8} {len(lines) / elapsed:>12,.0f} variants/s"
+        f" {current / len(lines):>8.0f} B/variant  ({genes} kept)"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    parser = VCFParser()
+    lines = make_lines(n)
+    measure("dict", lambda line: legacy_parse_variant_line(parser, line), lines)
+    measure("Variant", parser._parse_variant_line, lines)
+
+
+if __name__ == "__main__":
+    main()
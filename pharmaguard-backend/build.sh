@@ -12,4 +12,7 @@ python -m pip install --upgrade pip setuptools wheel
 # Install packages - pydantic-core 2.27.0+ supports Python 3.14
 python -m pip install -r requirements-deploy.txt
 
+echo "Compiling knowledge base snapshot..."
+python -m app.engines.knowledge
+
 echo "Build complete!"
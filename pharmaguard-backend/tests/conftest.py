@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+
+class Clock:
+    """Settable time source"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Settable time source starting at 1000.0; advance it with clock.now += seconds"""
+    return Clock()
+
+
+@pytest.fixture
+def memory_engine():
+    """In-memory SQLite engine whose single connection is shared by every thread"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.analysis_jobs import AnalysisJobStore, AnalysisWorkerPool
+
+
+class TestAnalysisJobStore:
+    """Test the database-backed analysis job queue"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock, memory_engine):
+        """Setup for each test"""
+        self.clock = clock
+        self.engine = memory_engine
+        self.store = AnalysisJobStore(self.engine, clock=self.clock)
+
+    def test_lifecycle(self):
+        """A job is claimed once, reports progress and keeps its result"""
+        job_id = self.store.submit({"drugs": ["CODEINE"]}, "/tmp/upload.vcf")
+        assert self.store.get(job_id)["status"] == "queued"
+
+        job = self.store.claim()
+        assert job["id"] == job_id and job["status"] == "running" and job["attempts"] == 1
+        assert job["request"] == {"drugs": ["CODEINE"]}
+        assert self.store.claim() is None
+
+        self.store.progress(job_id, "profiling", 0.4)
+        assert (self.store.get(job_id)["stage"], self.store.get(job_id)["progress"]) == ("profiling", 0.4)
+        self.store.complete(job_id, {"patient_id": "PAT-1"})
+        job = self.store.get(job_id)
+        assert job["status"] == "completed" and job["result"] == {"patient_id": "PAT-1"}
+        assert self.store.counts()["completed"] == 1
+
+    def test_shared_between_stores(self):
+        """A job submitted through one store is visible to and claimed by another on the same database"""
+        job_id = self.store.submit({}, "/tmp/upload.vcf")
+        other = AnalysisJobStore(self.engine, clock=self.clock)
+        assert other.claim()["id"] == job_id
+        assert self.store.claim() is None
+        assert self.store.get(job_id)["status"] == "running"
+
+    def test_stale_jobs_are_requeued(self):
+        """Jobs of a worker that stopped heartbeating are retried, up to max_attempts"""
+        job_id = self.store.submit({}, "/tmp/upload.vcf")
+        self.store.claim()
+        self.clock.now += 100
+        assert self.store.requeue_stale(300, 2) == 0
+        self.clock.now += 300
+        assert self.store.requeue_stale(300, 2) == 1
+        assert self.store.get(job_id)["status"] == "queued"
+
+        self.store.claim()
+        self.clock.now += 400
+        self.store.requeue_stale(300, 2)
+        job = self.store.get(job_id)
+        assert job["status"] == "failed" and job["attempts"] == 2 and "2 attempts" in job["error"]
+
+    def test_purge(self):
+        """Finished jobs are deleted after the retention period, returning their files"""
+        job_id = self.store.submit({}, "/tmp/a.vcf.gz", "/tmp/a.vcf.gz.tbi")
+        self.store.claim()
+        self.store.fail(job_id, "VCF parsing failed")
+        assert self.store.purge(60) == []
+        self.clock.now += 61
+        assert self.store.purge(60) == ["/tmp/a.vcf.gz", "/tmp/a.vcf.gz.tbi"]
+        assert self.store.get(job_id) is None
+
+
+class TestAnalysisWorkerPool:
+    """Test running queued jobs in the background"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.store = None
+
+    def teardown_method(self):
+        """Close the job database"""
+        self.store.engine.dispose()
+
+    def use_store(self, tmp_path):
+        # Workers reach the database from several threads at once, so each needs its own connection
+        self.store = AnalysisJobStore(create_engine(f"sqlite:///{tmp_path / 'jobs.db'}"))
+
+    def run_pool(self, run_job, job_count, workers=2):
+        async def run():
+            pool = AnalysisWorkerPool(self.store, run_job, workers=workers, poll_seconds=0.01)
+            pool.start()
+            while pool.running or pool.completed + pool.failed < job_count:
+                await asyncio.sleep(0.01)
+            await pool.stop()
+            return pool
+
+        return asyncio.run(asyncio.wait_for(run(), 5))
+
+    def test_jobs_run_concurrently(self, tmp_path):
+        """Workers run jobs side by side, report progress and remove the uploads"""
+        running = []
+        peak = []
+
+        async def run_job(job, progress):
+            running.append(job["id"])
+            peak.append(len(running))
+            await progress("explaining", 0.5)
+            await asyncio.sleep(0.05)
+            running.remove(job["id"])
+            return {"drugs": job["request"]["drugs"]}
+
+        self.use_store(tmp_path)
+        uploads = [tmp_path / f"{i}.vcf" for i in range(3)]
+        ids = []
+        for i, upload in enumerate(uploads):
+            upload.write_text("##fileformat=VCFv4.2\n")
+            ids.append(self.store.submit({"drugs": [f"DRUG{i}"]}, str(upload)))
+
+        pool = self.run_pool(run_job, 3)
+        assert max(peak) == 2
+        assert [self.store.get(job_id)["result"] for job_id in ids] == [{"drugs": [f"DRUG{i}"]} for i in range(3)]
+        assert pool.stats()["completed_here"] == 3
+        assert not any(upload.exists() for upload in uploads)
+
+    def test_failures_are_recorded(self, tmp_path):
+        """An error fails its job with the error's detail and the worker carries on"""
+        class Rejected(Exception):
+            detail = "VCF parsing failed: no header"
+
+        async def run_job(job, progress):
+            if job["request"]["bad"]:
+                raise Rejected()
+            return {}
+
+        self.use_store(tmp_path)
+        bad = self.store.submit({"bad": True}, "/nonexistent/bad.vcf")
+        good = self.store.submit({"bad": False}, "/nonexistent/good.vcf")
+        pool = self.run_pool(run_job, 2, workers=1)
+        assert self.store.get(bad)["error"] == "VCF parsing failed: no header"
+        assert self.store.get(good)["status"] == "completed"
+        assert (pool.failed, pool.completed) == (1, 1)
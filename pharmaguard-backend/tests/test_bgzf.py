@@ -0,0 +1,161 @@
+import io
+import struct
+import zlib
+
+import pytest
+from app.parsers.bgzf import (
+    BGZF_MAGIC,
+    TABIX_MAGIC,
+    BGZFReader,
+    TabixIndex,
+    iter_indexed_lines,
+    open_decompressed,
+)
+from app.parsers.vcf_parser import iter_chunks, parse_vcf_chunks, parse_vcf_lines
+
+
+def bgzf_block(data: bytes) -> bytes:
+    """Compress one BGZF block"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    block_size = 12 + 6 + len(cdata) + 8
+    header = struct.pack("<4sIBBHBBHH", BGZF_MAGIC, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def bgzip_with_index(lines, block_bytes=256):
+    """Build a BGZF file and matching tabix index for sorted VCF lines"""
+    raw = "".join(line + "\n" for line in lines).encode()
+    blocks, block_starts = [], []
+    compressed_offset = 0
+    for start in range(0, len(raw), block_bytes):
+        block = bgzf_block(raw[start:start + block_bytes])
+        block_starts.append(compressed_offset)
+        blocks.append(block)
+        compressed_offset += len(block)
+    blocks.append(bgzf_block(b""))
+
+    def virtual_offset(uncompressed):
+        block_idx, within = divmod(uncompressed, block_bytes)
+        if block_idx == len(block_starts):
+            return compressed_offset << 16
+        return (block_starts[block_idx] << 16) | within
+
+    names, bins, linear = [], {}, {}
+    offset = 0
+    for line in lines:
+        length = len(line) + 1
+        if not line.startswith("#"):
+            chrom, pos = line.split("\t")[0], int(line.split("\t")[1])
+            if chrom not in names:
+                names.append(chrom)
+            beg = pos - 1
+            chunk = (virtual_offset(offset), virtual_offset(offset + length))
+            bins.setdefault(chrom, {}).setdefault(4681 + (beg >> 14), []).append(chunk)
+            windows = linear.setdefault(chrom, {})
+            windows.setdefault(beg >> 14, chunk[0])
+        offset += length
+
+    name_blob = b"".join(name.encode() + b"\0" for name in names)
+    index = TABIX_MAGIC + struct.pack("<8i", len(names), 2, 1, 2, 0, ord("#"), 0, len(name_blob)) + name_blob
+    for chrom in names:
+        index += struct.pack("<i", len(bins[chrom]))
+        for bin_id, chunks in bins[chrom].items():
+            index += struct.pack("<Ii", bin_id, len(chunks))
+            for chunk in chunks:
+                index += struct.pack("<QQ", *chunk)
+        windows = linear[chrom]
+        ioff, last = [], 0
+        for window in range(max(windows) + 1):
+            last = windows.get(window, last)
+            ioff.append(last)
+        index += struct.pack(f"<i{len(ioff)}Q", len(ioff), *ioff)
+
+    return b"".join(blocks), bgzf_block(index) + bgzf_block(b"")
+
+
+HEADER = [
+    "##fileformat=VCFv4.2",
+    "##reference=GRCh38",
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO",
+]
+
+
+def record(chrom, pos, info="."):
+    return f"{chrom}\t{pos}\t.\tA\tG\t60\tPASS\t{info}"
+
+
+class TestBGZFInput:
+    """Test compressed VCF input and tabix region seeking"""
+
+    def setup_method(self):
+        body = [record("chr1", pos) for pos in range(1000000, 97000000, 150000)]
+        body.append(record("chr1", 97450058, "GENE=DPYD;STAR=*2A;RS=rs3918290"))
+        body.extend(record("chr1", pos) for pos in range(98000000, 120000000, 150000))
+        body.extend(record("chr22", pos) for pos in range(20000000, 42000000, 150000))
+        body.append(record("chr22", 42130692, "GENE=CYP2D6;STAR=*4;RS=rs1065852"))
+        body.extend(record("chr22", pos) for pos in range(43000000, 50000000, 150000))
+        self.lines = HEADER + body
+        self.vcf_gz, self.tbi = bgzip_with_index(self.lines)
+
+    def test_sequential_decompression(self):
+        """Test .vcf.gz without index is gunzipped as a stream"""
+        chunks = iter_chunks(open_decompressed(io.BytesIO(self.vcf_gz)))
+        result, success = parse_vcf_chunks(chunks)
+
+        assert success is True
+        assert [v['rsid'] for v in result['variants']] == ['rs3918290', 'rs1065852']
+
+    def test_indexed_region_seek(self):
+        """Test tabix seeking only decompresses blocks overlapping pharmacogene loci"""
+        reader = BGZFReader(io.BytesIO(self.vcf_gz))
+        lines = list(iter_indexed_lines(io.BytesIO(self.vcf_gz), io.BytesIO(self.tbi), reader=reader))
+        result, success = parse_vcf_lines(lines)
+
+        assert success is True
+        assert [v['rsid'] for v in result['variants']] == ['rs3918290', 'rs1065852']
+        assert len(lines) < len(self.lines) / 10
+        total_blocks = self.vcf_gz.count(BGZF_MAGIC)
+        assert reader.blocks_read < total_blocks / 10
+
+    def parse_both_ways(self, lines):
+        vcf_gz, tbi = bgzip_with_index(lines)
+        plain, success = parse_vcf_chunks(iter_chunks(io.BytesIO("".join(line + "\n" for line in lines).encode())))
+        assert success is True
+        reader = BGZFReader(io.BytesIO(vcf_gz))
+        indexed, success = parse_vcf_lines(iter_indexed_lines(io.BytesIO(vcf_gz), io.BytesIO(tbi), reader=reader))
+        assert success is True
+        return plain, indexed, reader.blocks_read
+
+    def test_indexed_keeps_hinted_records_near_loci(self):
+        """Test records in the sought blocks but outside a locus are kept by their hints, as in plain parsing"""
+        lines = list(self.lines)
+        at = lines.index(record("chr22", 42130692, "GENE=CYP2D6;STAR=*4;RS=rs1065852"))
+        lines.insert(at + 1, record("chr22", 42132900, "GENE=CYP2D6;STAR=*10;RS=rs1065852"))
+        plain, indexed, _ = self.parse_both_ways(lines)
+
+        assert indexed['variants'] == plain['variants']
+        assert [v['pos'] for v in indexed['variants']] == ['97450058', '42130692', '42132900']
+
+    def test_indexed_matches_plain_for_gene_tagged_files(self):
+        """Test an off-locus GENE= record is kept on the tabix path when the header declares GENE"""
+        header = HEADER[:2] + ['##INFO=<ID=GENE,Number=1,Type=String,Description="Gene">'] + HEADER[2:]
+        lines = [line for line in self.lines if line not in HEADER]
+        lines.insert(0, record("chr1", 1000001, "GENE=TPMT;STAR=*3C"))
+        plain, indexed, blocks_read = self.parse_both_ways(header + lines)
+
+        assert indexed['variants'] == plain['variants']
+        assert [v['gene'] for v in indexed['variants']] == ['TPMT', 'DPYD', 'CYP2D6']
+        assert blocks_read >= self.vcf_gz.count(BGZF_MAGIC) - 1
+
+    def test_index_query_unknown_contig(self):
+        """Test querying a contig absent from the index"""
+        index = TabixIndex.load(io.BytesIO(self.tbi))
+
+        assert index.query_chunks("chrX", 0, 1000) == []
+        assert index.query_chunks("22", 42124498, 42132881)
+
+    def test_invalid_index(self):
+        """Test a non-tabix file is rejected"""
+        with pytest.raises(ValueError):
+            TabixIndex.load(io.BytesIO(bgzf_block(b"not an index") + bgzf_block(b"")))
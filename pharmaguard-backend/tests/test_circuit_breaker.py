@@ -0,0 +1,65 @@
+import pytest
+
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class TestCircuitBreaker:
+    """Test opening, half-open probing and closing"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock):
+        """Setup for each test"""
+        self.clock = clock
+        self.breaker = CircuitBreaker(
+            window_size=10, min_calls=4, error_rate_threshold=0.5,
+            slow_call_seconds=5.0, slow_call_rate_threshold=0.5, open_seconds=30.0, clock=self.clock,
+        )
+
+    def record(self, *outcomes):
+        for succeeded, seconds in outcomes:
+            assert self.breaker.allow()
+            self.breaker.record(succeeded, seconds)
+
+    def test_stays_closed_below_thresholds(self):
+        """A few errors or slow calls do not open the breaker"""
+        self.record((False, 0.1), (True, 0.1), (True, 6.0), (True, 0.1), (True, 0.1))
+        assert self.breaker.state == CLOSED
+        stats = self.breaker.stats()
+        assert stats["error_rate"] == 0.2 and stats["slow_call_rate"] == 0.2
+
+    def test_opens_on_error_rate(self):
+        """Reaching the error rate opens the breaker and rejects calls"""
+        self.record((False, 0.1), (True, 0.1), (False, 0.1))
+        assert self.breaker.state == CLOSED  # fewer than min_calls
+        self.record((True, 0.1))
+        assert self.breaker.state == OPEN
+        assert not self.breaker.allow()
+        assert self.breaker.stats()["rejected"] == 1
+
+    def test_opens_on_slow_calls(self):
+        """Calls that succeed but are slow open the breaker too"""
+        self.record((True, 6.0), (True, 7.0), (True, 0.1), (True, 8.0))
+        assert self.breaker.state == OPEN
+
+    def test_half_open_probe_closes(self):
+        """After open_seconds one probe is let through; its success closes the breaker"""
+        self.record(*[(False, 0.1)] * 4)
+        self.clock.now += 30
+        assert self.breaker.stats()["state"] == HALF_OPEN
+        assert self.breaker.allow()
+        assert not self.breaker.allow()  # only one probe
+        self.breaker.record(True, 0.2)
+        assert self.breaker.state == CLOSED
+        assert self.breaker.stats()["window_calls"] == 0
+
+    def test_failed_probe_reopens(self):
+        """A failed or released probe does not close the breaker"""
+        self.record(*[(False, 0.1)] * 4)
+        self.clock.now += 30
+        assert self.breaker.allow()
+        self.breaker.release()
+        assert self.breaker.allow()
+        self.breaker.record(False, 0.1)
+        assert self.breaker.state == OPEN
+        assert self.breaker.times_opened == 2
+        assert not self.breaker.allow()
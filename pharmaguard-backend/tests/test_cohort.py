@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+from app.engines.cohort import assess_cohort
+from app.engines.drug_genotype import resolve_drug_genotype
+from app.parsers import genotype
+from app.parsers.cohort import MISSING_ALLELE, decode_genotypes, gt_code, parse_cohort_stream
+
+
+COHORT_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3\tS4\n"
+    "chr1\t100\t.\tA\tG\t60\tPASS\tDP=30\tGT\t0/1\t0/1\t0/1\t0/1\n"
+    "chr22\t42130692\trs3892097\tC\tT\t60\tPASS\tGENE=CYP2D6;STAR=*4;RS=rs3892097\tGT:DP\t1/1:20\t0/0:31\t0|1:25\t./.:0\n"
+    "chr10\t94781859\trs4244285\tG\tA\t60\tPASS\tGENE=CYP2C19;STAR=*2;RS=rs4244285\tGT\t0/0\t1/1\t0/0\t0/0\n"
+    "chr10\t94942290\trs1799853\tC\tT\t60\tPASS\tGENE=CYP2C9;STAR=*2;RS=rs1799853\tDP:GT\t9:0/1\t9:0/0\t9:0/0\t9:1\n"
+)
+
+DRUG_GENES = {"CODEINE": ["CYP2D6"], "WARFARIN": ["CYP2C9", "VKORC1", "CYP2C19"]}
+
+
+class TestCohortGenotypes:
+    """Test multi-sample GT decoding and per-sample risk inference"""
+
+    def setup_method(self):
+        result, success = parse_cohort_stream(io.BytesIO(COHORT_VCF.encode()))
+        assert success is True
+        self.cohort = result["cohort"]
+
+    def test_gt_codes(self):
+        """Test phased, unphased, missing and haploid calls"""
+        assert gt_code(b"0/1") == (0, 1)
+        assert gt_code(b"1|2") == (1, 2)
+        assert gt_code(b"./.") == (MISSING_ALLELE, MISSING_ALLELE)
+        assert gt_code(b"1") == (1, MISSING_ALLELE)
+
+    def test_uncommon_gt_codes_not_cached(self):
+        """Test GT values outside the common table are decoded without growing it"""
+        size = len(genotype._GT_CODES)
+        assert gt_code(b"0/12") == (0, 12)
+        assert gt_code(b"1/300") == (1, 127)
+        assert gt_code(b"2|.") == (2, MISSING_ALLELE)
+        assert len(genotype._GT_CODES) == size
+
+    def test_genotype_matrix(self):
+        """Test only target-gene sites are kept, as an int8 sites x samples x 2 matrix"""
+        gt = self.cohort.genotypes
+
+        assert self.cohort.samples == ["S1", "S2", "S3", "S4"]
+        assert gt.dtype == np.int8
+        assert gt.shape == (3, 4, 2)
+        assert gt[0].tolist() == [[1, 1], [0, 0], [0, 1], [-1, -1]]
+        assert gt[2].tolist() == [[0, 1], [0, 0], [0, 0], [1, -1]]
+
+    def test_alt_copies(self):
+        """Test ALT counts keep zygosity; a haploid ALT call counts once"""
+        assert self.cohort.alt_copies().tolist() == [[2, 0, 1, 0], [0, 2, 0, 0], [1, 0, 0, 1]]
+        assert self.cohort.carriers()[0].tolist() == [True, False, True, False]
+
+    def test_gt_not_first_format_key(self):
+        """Test GT is found wherever it sits in FORMAT"""
+        assert decode_genotypes(b"DP:GT\t9:1/1\t7", 3).tolist() == [[1, 1], [-1, -1], [-1, -1]]
+
+    def test_results_per_sample(self):
+        """Test each sample gets the outcome of its own carried variants"""
+        rows = list(assess_cohort(self.cohort, ["CODEINE", "WARFARIN"], DRUG_GENES))
+
+        assert [row["sample"] for row in rows] == ["S1", "S2", "S3", "S4"]
+        codeine = [row["results"][0] for row in rows]
+        assert [r["phenotype"] for r in codeine] == ["PM", "Unknown", "IM", "Unknown"]
+        assert [codeine[i]["diplotype"] for i in (0, 2)] == ["*4/*4", "*4/*1"]
+        assert codeine[1]["primary_gene"] == "No Target Genes"
+        warfarin = [row["results"][1] for row in rows]
+        assert [r["primary_gene"] for r in warfarin] == ["CYP2C9", "CYP2C19", "No Target Genes", "CYP2C9"]
+
+    def test_matches_single_sample_logic(self):
+        """Test a cohort row equals resolving that sample's variants alone"""
+        rows = list(assess_cohort(self.cohort, ["WARFARIN"], DRUG_GENES))
+        copies = self.cohort.alt_copies()
+
+        for index, row in enumerate(rows):
+            carried = [
+                v.with_alt_copies(int(count))
+                for v, count in zip(self.cohort.variants, copies[:, index]) if count
+            ]
+            expected = resolve_drug_genotype("WARFARIN", carried, DRUG_GENES["WARFARIN"])
+            outcome = row["results"][0]
+            if expected is None:
+                assert outcome["primary_gene"] == "No Target Genes"
+            else:
+                assert outcome["risk_label"] == expected["risk"]["risk_label"]
+                assert outcome["diplotype"] == expected["diplotype"]
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import time
+
+import pytest
+
+from app.engines.risk_engine import get_engine
+from app.explanation_bundle import ExplanationBundle, configure_explanation_bundle, write_explanation_bundle
+from app.fake_llm import FakeLLM
+from app.llm_integration import LLMExplainer, configure_explainer, explainer_stats
+from app.pregenerate_explanations import (
+    ExplanationInput,
+    RateLimiter,
+    canonical_genotypes,
+    enumerate_explanation_inputs,
+    pregenerate,
+)
+
+CLOPIDOGREL_PM = ExplanationInput("CYP2C19", "CLOPIDOGREL", "PM", "Ineffective", ("rs4244285",), "*2/*2")
+
+
+def key(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class TestExplanationBundle:
+    """Test the memory-mapped explanation bundle file"""
+
+    def test_lookup(self, tmp_path):
+        """Texts are found by key; unknown keys miss"""
+        texts = {key(str(i)): f"Explanation {i} — *2/*2" for i in range(50)}
+        path = tmp_path / "explanations.bundle"
+        assert write_explanation_bundle(path, texts, {"model": "gemini-pro", "prompt_version": "1"}) == 50
+
+        bundle = ExplanationBundle(path)
+        assert len(bundle) == 50
+        assert all(bundle.get(k) == text for k, text in texts.items())
+        assert bundle.get(key("missing")) is None
+        assert bundle.stats()["model"] == "gemini-pro" and bundle.stats()["entries"] == 50
+        bundle.close()
+
+    def test_empty(self, tmp_path):
+        """A bundle may hold no texts"""
+        path = tmp_path / "empty.bundle"
+        write_explanation_bundle(path, {})
+        assert ExplanationBundle(path).get(key("a")) is None
+
+    def test_invalid_file(self, tmp_path):
+        """Files that are not bundles are rejected when opened"""
+        path = tmp_path / "other.bundle"
+        path.write_bytes(b"not a bundle at all, just some bytes")
+        with pytest.raises(ValueError):
+            ExplanationBundle(path)
+        with pytest.raises(ValueError):
+            write_explanation_bundle(path, {"abcd": "too short a key"})
+
+
+class TestPregeneration:
+    """Test enumerating and pre-generating the explanation corpus"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.fake = FakeLLM()
+        configure_explainer(model=self.fake)
+        configure_explanation_bundle(None)
+
+    def teardown_method(self):
+        """Restore the default explainer and serve no bundle"""
+        configure_explainer()
+        configure_explanation_bundle(None)
+
+    def test_enumerated_inputs(self):
+        """Inputs come from the allele tables, phenotype inference and CPIC risks"""
+        inputs = enumerate_explanation_inputs(get_engine())
+        assert CLOPIDOGREL_PM in inputs
+        assert ("CYP2C9", "WARFARIN", "PM", "Toxic", ("rs1057910",), "*3/*3") in inputs
+        assert ("DPYD", "FLUOROURACIL", "Poor Metabolizer", "Toxic", ("rs3918290",), "*2A/*2A") in inputs
+        # Knowledge base drugs that are not supported are analysed as custom labels
+        assert any(item.drug == "Metoprolol" for item in inputs)
+        assert len(set(inputs)) == len(inputs)
+
+    def test_canonical_genotypes(self):
+        """Compound heterozygous and STAR-tagged genotypes are covered"""
+        genotypes = canonical_genotypes(get_engine().knowledge, "TPMT")
+        rsid_sets = [[v["rsid"] for v in variants] for variants in genotypes]
+        assert ["rs1800462", "rs1800460", "rs1142345"] in rsid_sets
+        assert [{"rsid": "rs1142345", "gene": "TPMT", "star": "*3C"}] in genotypes
+
+    def test_pregenerate_and_serve(self, tmp_path):
+        """Bundled texts are served without calling the model, and reused by the next build"""
+        explainer = LLMExplainer(api_key="")
+        texts, failures = asyncio.run(pregenerate(explainer, [CLOPIDOGREL_PM, CLOPIDOGREL_PM], 2, 0))
+        assert failures == 0 and len(texts) == 2 and self.fake.calls == 2
+        path = tmp_path / "explanations.bundle"
+        write_explanation_bundle(path, texts)
+
+        configure_explanation_bundle(path)
+        before = explainer_stats()["bundled_layers"]
+        clinical, patient = asyncio.run(explainer.generate_explanations_async(
+            *CLOPIDOGREL_PM[:4], list(CLOPIDOGREL_PM.detected_variants), CLOPIDOGREL_PM.diplotype
+        ))
+        assert clinical.startswith("[fake LLM]") and "rs4244285" in patient
+        assert self.fake.calls == 2
+        assert explainer_stats()["bundled_layers"] == before + 2
+
+        texts, failures = asyncio.run(pregenerate(explainer, [CLOPIDOGREL_PM], previous=ExplanationBundle(path)))
+        assert len(texts) == 2 and self.fake.calls == 2
+
+    def test_dosed_request_served_from_bundle(self, tmp_path):
+        """A dose the bundle was not built with gets the dose-free clinical text and a dose note"""
+        explainer = LLMExplainer(api_key="")
+        texts, _ = asyncio.run(pregenerate(explainer, [CLOPIDOGREL_PM], 2, 0))
+        path = tmp_path / "explanations.bundle"
+        write_explanation_bundle(path, texts)
+        configure_explanation_bundle(path)
+
+        args = (*CLOPIDOGREL_PM[:4], list(CLOPIDOGREL_PM.detected_variants), CLOPIDOGREL_PM.diplotype, 75.0)
+        clinical, patient = asyncio.run(explainer.generate_explanations_async(*args))
+        assert clinical.startswith("[fake LLM]")
+        assert clinical.endswith("Current dose is 75.0 mg; dose should be titrated cautiously due to uncertain genotype-drug effect.")
+        assert explainer.generate_explanations(*args) == (clinical, patient)
+        assert self.fake.calls == 2
+
+    def test_failures_are_counted(self):
+        """Layers the model fails on are left out of the bundle"""
+        self.fake.fail_next = 1
+        texts, failures = asyncio.run(pregenerate(LLMExplainer(api_key=""), [CLOPIDOGREL_PM], 1, 0))
+        assert failures == 1 and len(texts) == 1
+
+    def test_rate_limit(self):
+        """Call starts are spaced by the rate limit"""
+        limiter = RateLimiter(50)
+
+        async def run():
+            for _ in range(4):
+                await limiter.wait()
+
+        started = time.monotonic()
+        asyncio.run(run())
+        assert time.monotonic() - started >= 0.05
@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.explanation_cache import (
+    DatabaseExplanationCache,
+    MemoryExplanationCache,
+    create_explanation_cache,
+    dose_bucket,
+    explanation_key,
+)
+from app.llm_integration import LLMExplainer
+
+
+class CountingModel:
+    """Gemini model double that counts generate_content calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        return SimpleNamespace(text=f"Explanation {self.calls} citing rs4244285 and *2.")
+
+
+class TestExplanationKey:
+    """Test cache keys and dose buckets"""
+
+    def test_key_is_canonical(self):
+        """Field order does not matter, field values do"""
+        key = explanation_key({"gene": "CYP2C19", "drug": "CLOPIDOGREL"})
+        assert key == explanation_key({"drug": "CLOPIDOGREL", "gene": "CYP2C19"})
+        assert key != explanation_key({"gene": "CYP2C19", "drug": "WARFARIN"})
+        assert len(key) == 64
+
+    def test_dose_bucket(self):
+        """Doses are rounded half up to three significant figures"""
+        assert dose_bucket(None) is None
+        assert dose_bucket(100.2) == dose_bucket(100) == 100.0
+        assert dose_bucket(12.25) == 12.3
+        assert dose_bucket(1234) == 1230.0
+        assert dose_bucket(0.0125) == 0.0125
+        assert dose_bucket(0) == 0.0
+
+
+class TestExplanationCacheBackends:
+    """Test TTL and size-bounded eviction in every backend"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock, memory_engine):
+        """Setup for each test"""
+        self.clock = clock
+        self.caches = [
+            MemoryExplanationCache(60, 2, clock=self.clock),
+            DatabaseExplanationCache(memory_engine, 60, 2, clock=self.clock),
+        ]
+
+    def test_round_trip_and_stats(self):
+        """Stored texts are returned and counted as hits"""
+        for cache in self.caches:
+            assert cache.get("a") is None
+            cache.put("a", "text a")
+            assert cache.get("a") == "text a"
+            stats = cache.stats()
+            assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_ttl(self):
+        """Entries expire ttl_seconds after they were stored"""
+        for cache in self.caches:
+            cache.put("a", "text a")
+        self.clock.now += 61
+        for cache in self.caches:
+            assert cache.get("a") is None
+            assert cache.entry_count() == 0
+
+    def test_lru_eviction(self):
+        """Past max_entries the least recently used entry goes"""
+        for cache in self.caches:
+            cache.put("a", "text a")
+            self.clock.now += 1
+            cache.put("b", "text b")
+            self.clock.now += 1
+            assert cache.get("a") == "text a"
+            self.clock.now += 1
+            cache.put("c", "text c")
+            assert cache.get("b") is None
+            assert cache.get("a") == "text a"
+            assert cache.get("c") == "text c"
+            assert cache.entry_count() == 2
+
+    def test_create(self):
+        """Backends are chosen by name"""
+        assert create_explanation_cache("none", 60, 10) is None
+        assert isinstance(create_explanation_cache("memory", 60, 10), MemoryExplanationCache)
+
+
+class TestCachedExplainer:
+    """Test explanation generation through the cache"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.model = CountingModel()
+        self.explainer = LLMExplainer(api_key="", cache=MemoryExplanationCache(3600, 100))
+        self.explainer.model = self.model
+
+    def explain(self, dose_mg=None, phenotype="PM"):
+        return self.explainer.generate_explanations(
+            "CYP2C19", "CLOPIDOGREL", phenotype, "Ineffective", ["rs4244285"], "*2/*2", dose_mg
+        )
+
+    def test_repeat_is_served_from_cache(self):
+        """The second identical request makes no model calls"""
+        first = self.explain(75.0)
+        assert self.model.calls == 2
+        assert self.explain(75.0) == first
+        assert self.model.calls == 2
+
+    def test_near_identical_dose_shares_entries(self):
+        """Doses in one bucket share texts; other doses only regenerate the clinical layer"""
+        self.explain(75.0)
+        self.explain(75.02)
+        assert self.model.calls == 2
+        self.explain(80.0)
+        assert self.model.calls == 3
+        self.explain(80.0, phenotype="IM")
+        assert self.model.calls == 5
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.explanation_jobs import ExplanationJobStore
+
+
+async def narratives(drug, delay):
+    await asyncio.sleep(delay)
+    return f"Clinical {drug}", f"Patient {drug}"
+
+
+async def failing():
+    await asyncio.sleep(0.01)
+    raise RuntimeError("model unavailable")
+
+
+class TestExplanationJob:
+    """Test deferred narratives delivered as each drug finishes"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, memory_engine):
+        """Setup for each test"""
+        self.store = ExplanationJobStore(memory_engine, ttl_seconds=60, max_jobs=10, poll_seconds=0.005)
+
+    def test_updates_in_completion_order(self):
+        """A stream opened before any drug finishes gets every result, then ends"""
+        async def run():
+            job = await self.store.create("PAT-1")
+            job.run("WARFARIN", narratives("WARFARIN", 0.05))
+            job.run("CODEINE", narratives("CODEINE", 0.01))
+            await job.seal()
+            assert self.store.snapshot(job.id)["status"] == "pending"
+            return job, [result async for result in self.store.updates(job.id)]
+
+        job, results = asyncio.run(run())
+        assert [result["drug"] for result in results] == ["CODEINE", "WARFARIN"]
+        assert results[0] == {"drug": "CODEINE", "status": "complete", "summary": "Clinical CODEINE", "patient_summary": "Patient CODEINE"}
+        snapshot = self.store.snapshot(job.id)
+        assert snapshot["status"] == "complete" and snapshot["completed"] == snapshot["total"] == 2
+        # Drug order, not completion order
+        assert [entry["drug"] for entry in snapshot["explanations"]] == ["WARFARIN", "CODEINE"]
+
+    def test_unsealed_job_is_pending(self):
+        """Finished drugs do not complete a job that may still get more"""
+        async def run():
+            job = await self.store.create("PAT-1")
+            job.run("CODEINE", narratives("CODEINE", 0))
+            await asyncio.sleep(0.01)
+            assert self.store.snapshot(job.id)["status"] == "pending"
+            await job.seal()
+            return job
+
+        job = asyncio.run(run())
+        assert job.done and self.store.snapshot(job.id)["status"] == "complete"
+
+    def test_failure(self):
+        """A failed explanation is reported, not raised"""
+        async def run():
+            job = await self.store.create("PAT-1")
+            job.run("CODEINE", failing())
+            await job.seal()
+            return [result async for result in self.store.updates(job.id)]
+
+        assert asyncio.run(run()) == [{"drug": "CODEINE", "status": "failed", "error": "model unavailable"}]
+
+    def test_shared_between_stores(self):
+        """Another worker's store on the same database serves the job"""
+        other = ExplanationJobStore(self.store.engine, ttl_seconds=60, max_jobs=10, poll_seconds=0.005)
+
+        async def run():
+            job = await self.store.create("PAT-1")
+            job.run("CODEINE", narratives("CODEINE", 0.01))
+            await job.seal()
+            return job, [result["drug"] async for result in other.updates(job.id)]
+
+        job, drugs = asyncio.run(run())
+        assert drugs == ["CODEINE"]
+        assert other.snapshot(job.id)["patient_id"] == "PAT-1"
+
+
+class TestExplanationJobStore:
+    """Test job lookup, expiry and eviction"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock, memory_engine):
+        """Setup for each test"""
+        self.clock = clock
+        self.store = ExplanationJobStore(memory_engine, ttl_seconds=60, max_jobs=2, clock=self.clock)
+
+    def create(self, patient_id):
+        return asyncio.run(self.store.create(patient_id))
+
+    def test_expiry(self):
+        """Jobs are dropped ttl_seconds after they were created"""
+        job = self.create("PAT-1")
+        assert self.store.snapshot(job.id)["patient_id"] == "PAT-1"
+        self.clock.now += 61
+        assert self.store.snapshot(job.id) is None
+        self.create("PAT-2")
+        assert self.store.stats()["expired"] == 1
+
+    def test_eviction(self):
+        """Past max_jobs the oldest job is dropped"""
+        jobs = []
+        for i in range(3):
+            self.clock.now += 1
+            jobs.append(self.create(f"PAT-{i}"))
+        first, second, third = jobs
+        assert self.store.snapshot(first.id) is None
+        assert self.store.snapshot(second.id) is not None and self.store.snapshot(third.id) is not None
+        stats = self.store.stats()
+        assert (stats["jobs"], stats["evicted"], stats["created"]) == (2, 1, 3)
@@ -0,0 +1,70 @@
+from app.engines.drug_genotype import profile_drug_genotype, resolve_drug_genotype
+from app.engines.gene_profile import build_gene_profile
+from app.parsers.vcf_parser import parse_vcf_file
+
+
+VCF_HEADER = """##fileformat=VCFv4.2
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+"""
+
+DRUG_GENES = {
+    "WARFARIN": ["CYP2C19", "CYP2C9", "VKORC1"],
+    "CLOPIDOGREL": ["CYP2C19"],
+    "PHENYTOIN": ["CYP2C19", "CYP2C9"],
+    "CODEINE": ["CYP2D6"],
+}
+
+
+class TestGeneProfile:
+    """Test per-VCF gene calls shared across drugs"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        vcf = VCF_HEADER + "".join([
+            "10\t94781859\trs4244285\tG\tA\t.\tPASS\tGENE=CYP2C19;STAR=*2;RS=rs4244285\n",
+            "10\t94981296\trs1057910\tA\tC\t.\tPASS\tGENE=CYP2C9;STAR=*3;RS=rs1057910\n",
+            "16\t31096368\trs9923231\tC\tT\t.\tPASS\tGENE=VKORC1;RS=rs9923231\n",
+        ])
+        parsed, success = parse_vcf_file(vcf)
+        assert success, parsed
+        self.variants = parsed["variants"]
+
+    def test_genes_called_once(self):
+        """Drugs sharing a gene reuse the same call"""
+        profile = build_gene_profile(self.variants)
+        clopidogrel = profile_drug_genotype(profile, "CLOPIDOGREL", DRUG_GENES["CLOPIDOGREL"])
+        phenytoin = profile_drug_genotype(profile, "PHENYTOIN", DRUG_GENES["PHENYTOIN"])
+
+        assert clopidogrel["gene"] == phenytoin["gene"] == "CYP2C19"
+        assert clopidogrel["variant_ids"] is phenytoin["variant_ids"]
+        assert profile.call("CYP2C19")["diplotype"] == "*2/*2"
+        assert profile.call("CYP2D6") is None
+
+    def test_primary_gene(self):
+        """Gene priority wins, then the gene seen first in the VCF"""
+        profile = build_gene_profile(self.variants)
+        assert profile_drug_genotype(profile, "WARFARIN", DRUG_GENES["WARFARIN"])["gene"] == "CYP2C9"
+        assert profile_drug_genotype(profile, "PHENYTOIN", DRUG_GENES["PHENYTOIN"])["gene"] == "CYP2C19"
+        assert profile_drug_genotype(profile, "CODEINE", DRUG_GENES["CODEINE"]) is None
+
+    def test_matches_per_drug_resolution(self):
+        """Joining against the profile gives the per-drug result"""
+        profile = build_gene_profile(self.variants)
+        for drug, genes in DRUG_GENES.items():
+            assert profile_drug_genotype(profile, drug, genes) == resolve_drug_genotype(drug, self.variants, genes)
+
+    def test_sample_genotypes(self):
+        """A sample's GT decides zygosity; records it does not carry are skipped"""
+        header = VCF_HEADER.replace("INFO\n", "INFO\tFORMAT\tSAMPLE\n")
+        vcf = header + "".join([
+            "22\t42524947\trs3892097\tG\tA\t.\tPASS\tGENE=CYP2D6;STAR=*4;RS=rs3892097\tGT:DP\t0/1:30\n",
+            "10\t94981296\trs1057910\tA\tC\t.\tPASS\tGENE=CYP2C9;RS=rs1057910\tGT\t1|1\n",
+            "10\t94781859\trs4244285\tG\tA\t.\tPASS\tGENE=CYP2C19;STAR=*2;RS=rs4244285\tGT\t0/0\n",
+        ])
+        parsed, success = parse_vcf_file(vcf)
+        assert success, parsed
+        assert [v.get("alt_copies") for v in parsed["variants"]] == [1, 2, 0]
+        profile = build_gene_profile(parsed["variants"])
+        assert profile.call("CYP2D6")["diplotype"] == "*4/*1"
+        assert profile.call("CYP2C9")["diplotype"] == "*3/*3"
+        assert profile.call("CYP2C19") is None
@@ -0,0 +1,89 @@
+import pytest
+
+from app.engines.gene_profile import call_gene
+from app.engines.haplotype import AlleleTable
+from app.engines.risk_engine import get_engine
+from app.parsers.variant_id import rs_key
+
+
+class TestAlleleTable:
+    """Test bitset star-allele matching"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.table = AlleleTable("TPMT", {
+            "*2": ["rs1800462"],
+            "*3A": ["rs1800460", "rs1142345"],
+            "*3B": ["rs1800460"],
+            "*3C": ["rs1142345"],
+        })
+
+    def test_reference_when_nothing_defining(self):
+        """No defining variants gives *1/*1"""
+        assert self.table.match([]).diplotype == "*1/*1"
+        assert self.table.match(["rs999"]).diplotype == "*1/*1"
+
+    def test_unknown_zygosity_reads_homozygous(self):
+        """Without genotypes a single allele is called star/star"""
+        assert self.table.match(["rs1800462"]).diplotype == "*2/*2"
+        assert self.table.match(["RS1800460", "rs1142345"]).diplotype == "*3A/*3A"
+
+    def test_compound_heterozygote(self):
+        """Two different alleles are both explained"""
+        match = self.table.match(["rs1800462", "rs1142345"])
+        assert match.diplotype == "*2/*3C"
+        assert match.unexplained == 0
+
+    def test_zygosity(self):
+        """Known genotypes rule out contradicting diplotypes"""
+        assert self.table.match(["rs1800462"], homozygous=[]).diplotype == "*1/*2"
+        assert self.table.match(["rs1800462"], homozygous=["rs1800462"]).diplotype == "*2/*2"
+        ranked = self.table.rank(["rs1800460", "rs1142345"], homozygous=[])
+        assert [m.diplotype for m in ranked[:2]] == ["*1/*3A", "*3B/*3C"]
+        assert all(m.conflicts == 0 for m in ranked[:2])
+
+    def test_partial_haplotype(self):
+        """An allele seen only in part still beats leaving the variant unexplained"""
+        assert self.table.match(["rs1800460"]).diplotype == "*3B/*3B"
+        table = AlleleTable("DPYD", {"HapB3": ["rs56038477", "rs75017182"]})
+        match = table.match(["rs75017182"])
+        assert match.diplotype == "HapB3/HapB3"
+        assert match.missing == 1
+
+    def test_defining_ids(self):
+        """Defining variant IDs of a diplotype's alleles"""
+        assert self.table.defining_ids(("*1", "*3A")) == frozenset({rs_key("rs1800460"), rs_key("rs1142345")})
+
+    def test_invalid_definition(self):
+        """Definitions must use canonical rsIDs"""
+        with pytest.raises(ValueError):
+            AlleleTable("TPMT", {"*3A": ["chr6_18130918"]})
+
+
+class TestGeneCallMatching:
+    """Test haplotype matching inside per-gene calls"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.engine = get_engine()
+
+    def test_untagged_vcf_is_matched(self):
+        """Variants without a STAR tag are matched against allele definitions"""
+        call = call_gene("CYP2C9", [{"rsid": "rs1799853"}, {"rsid": "rs1057910"}], self.engine)
+        assert call["diplotype"] == "*2/*3"
+        assert call["phenotype"] == "IM"
+
+    def test_star_tag_wins(self):
+        """A STAR tag is used as given"""
+        call = call_gene("TPMT", [{"rsid": "rs1142345", "star": "*3C"}], self.engine)
+        assert call["diplotype"] == "*3C/*3C"
+        assert call["phenotype"] == "PM"
+
+    def test_genotypes_are_matched(self):
+        """Known genotypes are passed to the matcher and kept for tagged calls"""
+        het = call_gene("CYP2C9", [{"rsid": "rs1057910", "alt_copies": 1}], self.engine)
+        hom = call_gene("CYP2C9", [{"rsid": "rs1057910", "alt_copies": 2}], self.engine)
+        assert (het["diplotype"], hom["diplotype"]) == ("*1/*3", "*3/*3")
+        tagged = call_gene("CYP2D6", [{"rsid": "rs3892097", "star": "*4", "alt_copies": 1}], self.engine)
+        assert tagged["diplotype"] == "*4/*1"
+        assert tagged["phenotype"] == "IM"
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from app.engines.knowledge import (
+    DEFAULT_KNOWLEDGE_PATH,
+    KnowledgeStore,
+    compile_knowledge,
+    get_knowledge,
+    load_knowledge,
+    read_snapshot,
+    snapshot_path_for,
+)
+from app.engines.risk_engine import RiskAssessmentEngine, assess_patient_risk, get_engine
+from app.parsers.variant_id import rs_key
+
+
+def read_source():
+    with open(DEFAULT_KNOWLEDGE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_source(path, source):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(source, f)
+
+
+class TestKnowledgeBase:
+    """Test compiled knowledge tables and the shared engine"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.source = read_source()
+        self.knowledge = compile_knowledge(self.source)
+
+    def test_tables_are_read_only(self):
+        """Compiled tables cannot be mutated by callers"""
+        with pytest.raises(TypeError):
+            self.knowledge.cpic_risk[("CYP2D6", "CODEINE", "PM")] = ("Safe", "none", 1.0)
+        with pytest.raises(TypeError):
+            self.knowledge.rsid_to_star["CYP2C9"]["rs1"] = "*99"
+        assert isinstance(self.knowledge.star_allowed_rsids["DPYD"]["HapB3"], frozenset)
+
+    def test_cpic_table_is_flattened(self):
+        """Every nested CPIC entry is reachable by one (gene, drug, phenotype) key"""
+        entries = [
+            (gene, drug, phenotype, tuple(risk))
+            for gene, drugs in self.source["cpic_risk"].items()
+            for drug, phenotypes in drugs.items()
+            for phenotype, risk in phenotypes.items()
+        ]
+        assert len(self.knowledge.cpic_risk) == len(entries)
+        for gene, drug, phenotype, risk in entries:
+            assert self.knowledge.cpic_risk[(gene, drug, phenotype)] == risk
+
+    def test_lookups(self):
+        """Helper lookups fall back cleanly for genes without tables"""
+        assert self.knowledge.star_for_id("CYP2C19", rs_key("rs4244285")) == "*2"
+        assert self.knowledge.star_for_id("CYP2D6", rs_key("rs4244285")) is None
+        assert self.knowledge.allowed_ids("CYP2C9", "*3") == frozenset({rs_key("rs1057910")})
+        assert self.knowledge.allowed_ids("TPMT", "*3A") is None
+        assert self.knowledge.gene_priority["WARFARIN"]["CYP2C9"] == 0
+        assert "CODEINE" in self.knowledge.supported_drugs
+        assert self.knowledge.drugs["WARFARIN"]["genes"] == ("CYP2C19", "CYP2C9", "VKORC1")
+
+    def test_invalid_source(self):
+        """Missing version or tables are rejected"""
+        with pytest.raises(ValueError):
+            compile_knowledge({k: v for k, v in self.source.items() if k != "version"})
+        with pytest.raises(ValueError):
+            compile_knowledge({k: v for k, v in self.source.items() if k != "cpic_risk"})
+
+    def test_shared_engine(self):
+        """One engine serves every caller; custom knowledge gets its own engine"""
+        assert get_engine() is get_engine()
+        assert get_engine().knowledge is get_knowledge()
+        assert assess_patient_risk("TPMT", "AZATHIOPRINE", "PM", [])["risk_label"] == "Toxic"
+
+        source = dict(self.source, cpic_risk={"TPMT": {"AZATHIOPRINE": {"PM": ["Safe", "none", 0.5]}}})
+        engine = RiskAssessmentEngine(compile_knowledge(source))
+        assert engine.assess_risk("TPMT", "AZATHIOPRINE", "PM", [])["risk_label"] == "Safe"
+        assert get_engine().assess_risk("TPMT", "AZATHIOPRINE", "PM", [])["risk_label"] == "Toxic"
+
+
+class TestKnowledgeFile:
+    """Test loading, snapshots and hot reload of the knowledge base file"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.source = read_source()
+
+    def test_snapshot_written_and_used(self, tmp_path):
+        """First load writes a snapshot; later loads of the same JSON read it"""
+        path = tmp_path / "kb.json"
+        write_source(path, self.source)
+        snapshot = snapshot_path_for(path)
+
+        first = load_knowledge(path)
+        assert os.path.exists(snapshot)
+        digest = hashlib.sha256(path.read_bytes()).digest()
+        assert read_snapshot(snapshot, digest) == self.source
+
+        second = load_knowledge(path)
+        assert second.version == first.version
+        assert second.cpic_risk == first.cpic_risk
+
+    def test_stale_snapshot_ignored(self, tmp_path):
+        """Editing the JSON invalidates the snapshot"""
+        path = tmp_path / "kb.json"
+        write_source(path, self.source)
+        load_knowledge(path)
+
+        write_source(path, dict(self.source, version="next"))
+        assert load_knowledge(path).version == "next"
+
+    def test_invalid_json(self, tmp_path):
+        """Unparseable files raise ValueError"""
+        path = tmp_path / "kb.json"
+        path.write_text("{not json")
+        with pytest.raises(ValueError):
+            load_knowledge(path)
+
+    def test_store_hot_reload(self, tmp_path):
+        """A changed file is swapped in; holders of the old version keep it"""
+        path = tmp_path / "kb.json"
+        write_source(path, dict(self.source, version="v1"))
+        store = KnowledgeStore(path, check_interval=0)
+        old = store.current()
+        assert old.version == "v1"
+
+        write_source(path, dict(self.source, version="v2-longer"))
+        new = store.current()
+        assert new.version == "v2-longer"
+        assert old.version == "v1"
+        assert store.current() is new
+
+    def test_store_keeps_version_on_bad_file(self, tmp_path, caplog):
+        """A broken edit leaves the last good version in service"""
+        path = tmp_path / "kb.json"
+        write_source(path, dict(self.source, version="v1"))
+        store = KnowledgeStore(path, check_interval=0)
+        store.current()
+
+        path.write_text("{broken")
+        assert store.current().version == "v1"
+        assert store.stats()["last_error"]
+        assert "Knowledge base reload failed, keeping version v1" in caplog.text
+        with pytest.raises(ValueError):
+            store.reload()
+        assert store.current().version == "v1"
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from app.circuit_breaker import OPEN, CircuitBreaker
+from app.explanation_cache import MemoryExplanationCache
+from app.fake_llm import FakeLLM
+from app.llm_integration import (
+    DEFAULT_CALL_TIMEOUT_SECONDS,
+    DEFAULT_MAX_CONCURRENT_CALLS,
+    LLMExplainer,
+    configure_explainer,
+    explainer_stats,
+)
+
+DRUGS = ["CODEINE", "WARFARIN", "CLOPIDOGREL", "SIMVASTATIN", "AZATHIOPRINE", "FLUOROURACIL"]
+
+
+class SlowModel:
+    """Gemini model double answering after a delay; tracks calls in flight"""
+
+    def __init__(self, delay: float, fail_on: str = None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("quota exceeded")
+        return SimpleNamespace(text="Generated text citing rs4244285 and *2.")
+
+
+class TestAsyncExplainer:
+    """Test concurrent explanation generation with limits and deadlines"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        configure_explainer(DEFAULT_MAX_CONCURRENT_CALLS, DEFAULT_CALL_TIMEOUT_SECONDS)
+
+    def teardown_method(self):
+        """Restore the default limits"""
+        configure_explainer(DEFAULT_MAX_CONCURRENT_CALLS, DEFAULT_CALL_TIMEOUT_SECONDS)
+
+    def explainer(self, model, cache=None):
+        explainer = LLMExplainer(api_key="", cache=cache)
+        explainer.model = model
+        return explainer
+
+    def explain(self, explainer, drug="CLOPIDOGREL"):
+        return explainer.generate_explanations_async("CYP2C19", drug, "PM", "Ineffective", ["rs4244285"], "*2/*2", 75.0)
+
+    def test_drugs_and_layers_run_concurrently(self):
+        """Twelve calls take about one round trip, not twelve"""
+        configure_explainer(max_concurrent_calls=12)
+        model = SlowModel(0.1)
+        explainer = self.explainer(model)
+
+        async def run():
+            return await asyncio.gather(*(self.explain(explainer, drug) for drug in DRUGS))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        assert model.calls == 12
+        assert model.peak == 12
+        assert elapsed < 0.6
+        assert all(clinical.startswith("Generated text") for clinical, _ in results)
+
+    def test_concurrency_limit(self):
+        """No more than max_concurrent_calls are in flight"""
+        configure_explainer(max_concurrent_calls=3)
+        model = SlowModel(0.02)
+        explainer = self.explainer(model)
+
+        async def run():
+            await asyncio.gather(*(self.explain(explainer, drug) for drug in DRUGS))
+
+        asyncio.run(run())
+        assert model.calls == 12
+        assert model.peak == 3
+
+    def test_identical_layers_are_coalesced(self):
+        """Concurrent requests needing the same text share one model call"""
+        model = SlowModel(0.05)
+        explainer = self.explainer(model)
+
+        async def run():
+            before = explainer_stats()["single_flight"]["coalesced"]
+            await asyncio.gather(*(
+                explainer.generate_explanations_async(
+                    "CYP2C19", "CLOPIDOGREL", "PM", "Ineffective", ["rs4244285"], "*2/*2", dose
+                )
+                for dose in (75.0, 75.0, 300.0)
+            ))
+            return explainer_stats()["single_flight"]["coalesced"] - before
+
+        # Two distinct clinical texts (two doses) and one patient text
+        assert asyncio.run(run()) == 3
+        assert model.calls == 3
+
+    def test_timeout_falls_back(self, caplog):
+        """A call past its deadline gives the template explanations, counted rather than logged"""
+        caplog.set_level(logging.WARNING, logger="app.llm_integration")
+        configure_explainer(call_timeout_seconds=0.05)
+        explainer = self.explainer(SlowModel(1.0))
+        start = time.perf_counter()
+        result = asyncio.run(self.explain(explainer))
+        assert time.perf_counter() - start < 0.5
+        assert result == explainer._fallback_explanations(
+            "CYP2C19", "CLOPIDOGREL", "PM", "Ineffective", ["rs4244285"], "*2/*2", 75.0
+        )
+        assert not caplog.records
+
+    def test_error_falls_back_and_keeps_good_layer(self, caplog):
+        """One failing layer falls back and is logged; the layer that generated is still cached"""
+        caplog.set_level(logging.WARNING, logger="app.llm_integration")
+        cache = MemoryExplanationCache(3600, 100)
+        model = SlowModel(0, fail_on="patient educator")
+        explainer = self.explainer(model, cache)
+        clinical, _ = asyncio.run(self.explain(explainer))
+        assert not clinical.startswith("Generated text")
+        assert cache.entry_count() == 1
+        assert [record.levelname for record in caplog.records] == ["WARNING"]
+        assert "quota exceeded" in caplog.records[0].getMessage()
+
+        model.fail_on = None
+        clinical, patient = asyncio.run(self.explain(explainer))
+        assert clinical.startswith("Generated text") and patient.startswith("Generated text")
+        assert model.calls == 3
+
+    def test_matches_sync_explainer_without_model(self):
+        """Without an API key both paths give the same template texts"""
+        explainer = LLMExplainer(api_key="")
+        explainer.model = None
+        args = ("CYP2C9", "WARFARIN", "IM", "Adjust Dosage", ["rs1057910"], "*3/*3", 5.0)
+        assert asyncio.run(explainer.generate_explanations_async(*args)) == explainer.generate_explanations(*args)
+
+
+class TestExplainerResilience:
+    """Test the circuit breaker and latency budget with the fake LLM"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.fake = FakeLLM()
+        self.breaker = CircuitBreaker(window_size=10, min_calls=4, open_seconds=60)
+        configure_explainer(breaker=self.breaker, model=self.fake)
+
+    def teardown_method(self):
+        """Restore the default explainer"""
+        configure_explainer()
+
+    def explain(self, deadline=None):
+        explainer = LLMExplainer(api_key="")
+        return asyncio.run(explainer.generate_explanations_async(
+            "CYP2C9", "WARFARIN", "IM", "Adjust Dosage", ["rs1057910"], "*3/*3", 5.0, deadline
+        ))
+
+    def test_fake_llm_answers(self):
+        """The configured fake model stands in for Gemini"""
+        clinical, patient = self.explain()
+        assert clinical.startswith("[fake LLM]") and patient.startswith("[fake LLM]")
+        assert "rs1057910" in clinical and "*3" in clinical
+        assert self.fake.calls == 2
+
+    def test_open_breaker_skips_llm(self):
+        """Once errors open the breaker, explanations fall back without calling the model"""
+        before = explainer_stats()
+        self.fake.error_rate = 1.0
+        self.explain()
+        self.explain()
+        assert self.breaker.state == OPEN
+        assert self.fake.calls == 4
+        clinical, _ = self.explain()
+        assert self.fake.calls == 4
+        assert not clinical.startswith("[fake LLM]")
+
+        stats = explainer_stats()
+        assert stats["explanations"] - before["explanations"] == 3
+        assert stats["fallbacks"] - before["fallbacks"] == 3
+        assert stats["fallback_reasons"]["circuit_open"] - before["fallback_reasons"].get("circuit_open", 0) == 1
+        assert stats["breaker"]["state"] == OPEN
+
+    def test_exhausted_budget_skips_llm(self):
+        """A passed deadline means no model calls at all"""
+        clinical, _ = self.explain(deadline=time.monotonic() - 1)
+        assert self.fake.calls == 0
+        assert not clinical.startswith("[fake LLM]")
+
+    def test_deadline_cuts_calls_short(self):
+        """Calls end at the request deadline even when the per-call timeout is longer"""
+        self.fake.delay_seconds = 1.0
+        start = time.perf_counter()
+        clinical, _ = self.explain(deadline=time.monotonic() + 0.05)
+        assert time.perf_counter() - start < 0.5
+        assert not clinical.startswith("[fake LLM]")
@@ -0,0 +1,82 @@
+import io
+import tempfile
+
+from app.parsers.parallel import parse_vcf_parallel, shutdown_parse_pools, split_ranges
+from app.parsers.vcf_parser import parse_vcf_stream
+
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##reference=GRCh38\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+)
+
+
+def record(chrom, pos, info="."):
+    return f"{chrom}\t{pos}\t.\tA\tG\t60\tPASS\t{info}\n"
+
+
+class TestParallelVCFParser:
+    """Test process-pool parsing of large VCFs"""
+
+    def setup_method(self):
+        body = []
+        for i in range(400):
+            body.append(record("chr1", 1000000 + i * 1000))
+            if i % 50 == 0:
+                body.append(record("chr22", 42126000 + i, f"GENE=CYP2D6;RS=rs{i}"))
+        body.append(record("chr1", 97450058))
+        self.content = (HEADER + "".join(body)).encode()
+
+    def parse(self, content, **kwargs):
+        with tempfile.TemporaryFile() as upload:
+            upload.write(content)
+            return parse_vcf_parallel(upload, workers=2, range_size=2048, **kwargs)
+
+    @classmethod
+    def teardown_class(cls):
+        shutdown_parse_pools()
+
+    def test_matches_serial_parser(self):
+        """Test ranges parsed in workers merge back in file order"""
+        expected, _ = parse_vcf_stream(io.BytesIO(self.content))
+        result, success = self.parse(self.content)
+
+        assert success is True
+        assert result['variants'] == expected['variants']
+        assert result['metadata'] == {'fileformat': 'VCFv4.2', 'genome_build': 'GRCh38'}
+        assert [v['rsid'] for v in result['variants']][:3] == ['rs0', 'rs50', 'rs100']
+        assert result['variants'][-1]['gene'] == 'DPYD'
+
+    def test_worker_encoding_error(self):
+        """Test an encoding error raised in a worker keeps its file offset"""
+        content = self.content + b"chr1\t1\t.\tA\tG\t.\t.\tGENE=TPMT;NOTE=\xff\n"
+        result, success = self.parse(content)
+
+        assert success is False
+        bad_offset = content.index(b"\xff")
+        assert result['error'] == f"File encoding error: invalid UTF-8 at byte offset {bad_offset}"
+
+    def test_header_errors_reported(self):
+        """Test structure validation still runs before work is dispatched"""
+        result, success = self.parse(b"#CHROM\tPOS\n" + self.content)
+
+        assert success is False
+        assert result['error'] == "Missing VCF format declaration"
+
+    def test_ranges_end_on_newlines(self):
+        """Test byte ranges tile the body and never split a record"""
+        stream = io.BytesIO(self.content)
+        body_start = len(HEADER)
+        ranges = list(split_ranges(stream, body_start, len(self.content), 1000))
+
+        assert ranges[0][0] == body_start and ranges[-1][1] == len(self.content)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        assert all(self.content[end - 1:end] == b"\n" for _, end in ranges)
+
+    def test_stream_without_file(self):
+        """Test in-memory streams are refused rather than parsed wrongly"""
+        result, success = parse_vcf_parallel(io.BytesIO(self.content), workers=2)
+
+        assert success is False
+        assert result['error'] == "Parallel parsing needs a file on disk"
@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+from app.parsers.cache import (
+    DiskParseCache,
+    MemoryParseCache,
+    create_parse_cache,
+    parse_cache_key,
+    parse_cache_mode,
+    sha256_stream,
+)
+from app.parsers.vcf_parser import parse_vcf_stream
+
+
+VCF_CONTENT = b"""##fileformat=VCFv4.2
+#CHROM	POS	ID	REF	ALT	QUAL	FILTER	INFO
+chr22	42127941	rs1065852	G	A	60	PASS	GENE=CYP2D6;STAR=*4;RS=rs1065852
+"""
+
+
+def result_of_size(n):
+    return {"variants": [], "padding": "x" * n}
+
+
+class TestParseCache:
+    """Test the content-hash keyed parse cache"""
+
+    def setup_method(self):
+        self.parsed, _ = parse_vcf_stream(io.BytesIO(VCF_CONTENT))
+        self.key = parse_cache_key(sha256_stream(io.BytesIO(VCF_CONTENT)), "plain")
+
+    def test_sha256_stream(self):
+        """Test the streamed hash matches hashlib and rewinds the stream"""
+        stream = io.BytesIO(VCF_CONTENT)
+        digest = sha256_stream(stream, chunk_size=7)
+
+        assert digest == hashlib.sha256(VCF_CONTENT).hexdigest()
+        assert stream.tell() == 0
+
+    def test_parse_cache_mode(self):
+        """Test the input path and rsID index build are part of the mode"""
+        assert parse_cache_mode(False) == "plain"
+        assert parse_cache_mode(True) == "gzip"
+        assert parse_cache_mode(True, tabix=True) == "tabix"
+        assert parse_cache_mode(False, rsid_index=SimpleNamespace(stamp="1f2e")) == "plain-rsid1f2e"
+
+    def test_hit_returns_private_copy(self):
+        """Test a hit returns the parse result and counts hits and misses"""
+        cache = MemoryParseCache(1024 * 1024)
+        assert cache.get(self.key) is None
+        cache.put(self.key, self.parsed)
+
+        cached = cache.get(self.key)
+        cached['variants'].clear()
+
+        assert cache.get(self.key)['variants'] == self.parsed['variants']
+        assert (cache.hits, cache.misses) == (2, 1)
+        assert cache.stats()['hit_rate'] == pytest.approx(2 / 3, abs=1e-4)
+
+    def test_lru_bounded_by_bytes(self):
+        """Test eviction keeps total bytes under the bound, oldest first"""
+        cache = MemoryParseCache(2500)
+        for key in ("a", "b"):
+            cache.put(key, result_of_size(1000))
+        cache.get("a")
+        cache.put("c", result_of_size(1000))
+
+        assert cache.total_bytes() <= 2500
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+
+    def test_oversized_result_not_cached(self):
+        """Test a result bigger than the whole cache is skipped"""
+        cache = MemoryParseCache(100)
+        cache.put("big", result_of_size(1000))
+
+        assert cache.entry_count() == 0
+
+    def test_disk_cache_shared_between_instances(self, tmp_path):
+        """Test entries written by one process's cache are hits for another"""
+        writer = DiskParseCache(str(tmp_path), 1024 * 1024)
+        reader = DiskParseCache(str(tmp_path), 1024 * 1024)
+        writer.put(self.key, self.parsed)
+
+        assert reader.get(self.key)['variants'] == self.parsed['variants']
+        assert reader.hits == 1
+
+    def test_disk_cache_evicts_least_recently_used(self, tmp_path):
+        """Test the disk backend honours its byte bound"""
+        cache = DiskParseCache(str(tmp_path), 2500)
+        for key in ("a", "b", "c"):
+            cache.put(key, result_of_size(1000))
+
+        assert cache.total_bytes() <= 2500
+        assert cache.get("a") is None
+        assert cache.get("c") is not None
+
+    def test_create_parse_cache(self, tmp_path):
+        """Test backend selection from configuration"""
+        assert isinstance(create_parse_cache("memory", 10), MemoryParseCache)
+        assert isinstance(create_parse_cache("disk", 10, str(tmp_path)), DiskParseCache)
+        assert create_parse_cache("none", 10) is None
+        with pytest.raises(ValueError):
+            create_parse_cache("redis", 10)
+        with pytest.raises(ValueError):
+            create_parse_cache("disk", 10)
+
+    def test_disk_cache_directory_is_private(self, tmp_path):
+        """Test the disk backend creates its directory 0700 and refuses one others can write to"""
+        DiskParseCache(str(tmp_path / "cache"), 10)
+        assert os.stat(tmp_path / "cache").st_mode & 0o777 == 0o700
+
+        shared = tmp_path / "shared"
+        shared.mkdir()
+        shared.chmod(0o777)
+        with pytest.raises(ValueError):
+            DiskParseCache(str(shared), 10)
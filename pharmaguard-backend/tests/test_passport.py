@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+from app.engines.drug_genotype import drug_outcome, resolve_drug_genotype
+from app.engines.knowledge import compile_knowledge, DEFAULT_KNOWLEDGE_PATH
+from app.engines.passport import build_passport, passport_drug
+from app.engines.risk_engine import RiskAssessmentEngine, get_engine
+from app.parsers.vcf_parser import parse_vcf_file
+
+SAMPLE_VCF_DIR = Path(__file__).resolve().parent.parent / "sample_vcf"
+
+
+class TestPassport:
+    """Test whole-panel passports"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.engine = get_engine()
+        self.drug_genes = {drug: info["genes"] for drug, info in self.engine.knowledge.drugs.items()}
+        self.vcfs = []
+        for path in sorted(SAMPLE_VCF_DIR.glob("*.vcf")):
+            parsed, success = parse_vcf_file(path.read_text())
+            assert success
+            self.vcfs.append(parsed["variants"])
+
+    def test_covers_every_drug(self):
+        """Every panel drug gets an outcome and the passport is JSON-serialisable"""
+        for variants in self.vcfs:
+            passport = build_passport(variants, self.drug_genes, self.engine)
+            assert set(passport["drugs"]) == set(self.drug_genes)
+            assert passport["knowledge_base_version"] == self.engine.knowledge.version
+            assert json.loads(json.dumps(passport)) == passport
+
+    def test_matches_per_drug_resolution(self):
+        """Stored outcomes equal a fresh per-drug analysis of the same VCF"""
+        for variants in self.vcfs:
+            passport = json.loads(json.dumps(build_passport(variants, self.drug_genes, self.engine)))
+            for drug, genes in self.drug_genes.items():
+                genotype = resolve_drug_genotype(drug, variants, genes, self.engine)
+                expected = json.loads(json.dumps(drug_outcome(drug, genotype, self.engine)))
+                result = passport_drug(passport, drug, genes, self.engine)
+                assert result.pop("source") == "passport"
+                assert result == expected
+
+    def test_recomputed_when_stale(self):
+        """Other knowledge versions and off-panel drugs are computed from stored variants"""
+        passport = build_passport(self.vcfs[0], self.drug_genes, self.engine)
+        with open(DEFAULT_KNOWLEDGE_PATH, encoding="utf-8") as f:
+            source = json.load(f)
+        newer = RiskAssessmentEngine(compile_knowledge(dict(source, version="next")))
+
+        stale = passport_drug(passport, "CODEINE", self.drug_genes["CODEINE"], newer)
+        assert stale["source"] == "computed"
+        assert stale["risk_label"] == passport["drugs"]["CODEINE"]["risk_label"]
+
+        custom = passport_drug(passport, "MYSTERY_DRUG", ["CYP2D6"], self.engine)
+        assert custom["source"] == "computed"
@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from app.results_store import DatabaseResultsStore, MemoryResultsStore, create_results_store, results_response
+
+
+def result(patient_id, padding=""):
+    return {"assessment": {"patient_id": patient_id, "drug": "CODEINE", "notes": padding}}
+
+
+def size(value):
+    return len(json.dumps(value))
+
+
+class ResultsStoreContract:
+    """Behaviour shared by every results store backend"""
+
+    def make_store(self, clock, max_entries=3, max_bytes=1024 * 1024):
+        raise NotImplementedError
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock, memory_engine):
+        """Setup for each test"""
+        self.clock = clock
+        self.engine = memory_engine
+        self.store = self.make_store(self.clock)
+
+    def test_round_trip(self):
+        """Stored results are returned, unknown patients miss"""
+        self.store.put("PAT-1", result("PAT-1"))
+        assert self.store.get("PAT-1") == result("PAT-1")
+        assert self.store.get("PAT-2") is None
+        stats = self.store.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+        assert stats["bytes"] == size(result("PAT-1"))
+
+    def test_expiry(self):
+        """Results expire ttl_seconds after they were stored"""
+        self.store.put("PAT-1", result("PAT-1"))
+        self.clock.now += 59
+        assert self.store.get("PAT-1") is not None
+        self.clock.now += 2
+        assert self.store.get("PAT-1") is None
+        self.store.put("PAT-2", result("PAT-2"))
+        stats = self.store.stats()
+        assert stats["expired"] == 1 and stats["entries"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Past max_entries the least recently used result is evicted"""
+        for i in range(3):
+            self.clock.now += 1
+            self.store.put(f"PAT-{i}", result(f"PAT-{i}"))
+        self.clock.now += 1
+        self.store.get("PAT-0")
+        self.clock.now += 1
+        self.store.put("PAT-3", result("PAT-3"))
+        assert self.store.get("PAT-1") is None
+        assert all(self.store.get(f"PAT-{i}") is not None for i in (0, 2, 3))
+        assert self.store.stats()["evicted"] == 1
+
+    def test_size_bound(self):
+        """Past max_bytes results are evicted; one larger than the bound is not stored"""
+        store = self.make_store(self.clock, max_entries=100, max_bytes=2 * size(result("PAT-0", "x" * 100)) + 10)
+        for i in range(3):
+            self.clock.now += 1
+            store.put(f"PAT-{i}", result(f"PAT-{i}", "x" * 100))
+        assert store.get("PAT-0") is None and store.get("PAT-2") is not None
+        store.put("PAT-big", result("PAT-big", "x" * 1000))
+        assert store.get("PAT-big") is None
+        stats = store.stats()
+        assert stats["entries"] == 2 and stats["bytes"] <= stats["max_bytes"]
+
+    def test_update(self):
+        """A stored result can be changed in place; missing ones are reported"""
+        self.store.put("PAT-1", result("PAT-1"))
+
+        def fill_in(stored):
+            stored["assessment"]["notes"] = "narrative"
+
+        assert self.store.update("PAT-1", fill_in)
+        assert self.store.get("PAT-1")["assessment"]["notes"] == "narrative"
+        assert not self.store.update("PAT-2", fill_in)
+
+    def test_concurrent_updates_kept(self):
+        """An update landing between another's read and write is not overwritten"""
+        self.store.put("PAT-1", result("PAT-1"))
+        raced = []
+
+        def fill_in_codeine(stored):
+            if not raced:
+                raced.append(True)
+                assert self.store.update("PAT-1", fill_in_warfarin)
+            stored["assessment"]["codeine"] = "narrative"
+
+        def fill_in_warfarin(stored):
+            stored["assessment"]["warfarin"] = "narrative"
+
+        assert self.store.update("PAT-1", fill_in_codeine)
+        stored = self.store.get("PAT-1")["assessment"]
+        assert stored["codeine"] == stored["warfarin"] == "narrative"
+
+
+class TestMemoryResultsStore(ResultsStoreContract):
+    """Test the in-process results store"""
+
+    def make_store(self, clock, max_entries=3, max_bytes=1024 * 1024):
+        return MemoryResultsStore(60, max_entries, max_bytes, clock=clock)
+
+
+class TestDatabaseResultsStore(ResultsStoreContract):
+    """Test the SQL results store"""
+
+    def make_store(self, clock, max_entries=3, max_bytes=1024 * 1024):
+        return DatabaseResultsStore(self.engine, 60, max_entries, max_bytes, clock=clock)
+
+    def test_shared_between_stores(self):
+        """Stores on the same database (e.g. two server workers) see each other's results"""
+        self.store.put("PAT-1", result("PAT-1"))
+        other = DatabaseResultsStore(self.store.engine, 60, 3, 1024 * 1024, clock=self.clock)
+        assert other.get("PAT-1") == result("PAT-1")
+
+
+class TestCreateResultsStore:
+    """Test backend selection"""
+
+    def test_backends(self):
+        """Backends are chosen by name; the database one needs an engine"""
+        assert create_results_store("memory", 60, 10, 1024).backend == "memory"
+        with pytest.raises(ValueError):
+            create_results_store("database", 60, 10, 1024)
+        with pytest.raises(ValueError):
+            create_results_store("redis", 60, 10, 1024)
+
+
+class TestResultsResponse:
+    """Test the /api/v1/results response shape"""
+
+    def test_single_drug_keeps_assessment(self):
+        """Single-drug records still answer with the one "assessment" older clients read"""
+        codeine = {"patient_id": "PAT-1", "drug": "CODEINE"}
+        response = results_response({"file_name": "a.vcf", "assessments": {"CODEINE": codeine}})
+        assert response["assessment"] == codeine
+        assert response["assessments"] == {"CODEINE": codeine}
+
+    def test_multi_drug(self):
+        """Multi-drug records are keyed by drug only"""
+        assessments = {"CODEINE": {"drug": "CODEINE"}, "WARFARIN": {"drug": "WARFARIN"}}
+        response = results_response({"assessments": assessments})
+        assert response["assessment"] is None
+        assert response["assessments"] == assessments
+
+    def test_single_assessment_records(self):
+        """Records stored with only "assessment" are returned as they are"""
+        assert results_response(result("PAT-1")) == result("PAT-1")
@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+
 from app.engines.risk_engine import RiskAssessmentEngine, Phenotype
 
 
@@ -88,3 +90,50 @@ class TestRiskAssessmentEngine:
         
         assert "WARFARIN" in rec
         assert "dose adjustment" in rec.lower()
+
+
+class TestRiskAssessmentBatch:
+    """Test vectorized batch risk assessment against assess_risk"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.engine = RiskAssessmentEngine()
+        self.codebook = self.engine.codebook()
+
+    def test_matches_assess_risk(self):
+        """Random triples, including names outside the table, match the scalar path"""
+        rng = np.random.default_rng(20261017)
+        genes = np.array(self.codebook.genes + ("VKORC1", ""), dtype=object)
+        drugs = np.array(self.codebook.drugs + ("ATENOLOL", "custom"), dtype=object)
+        phenotypes = np.array(self.codebook.phenotypes + ("Ultra", "pm"), dtype=object)
+        gene_names = rng.choice(genes, 5000)
+        drug_names = rng.choice(drugs, 5000)
+        phenotype_names = rng.choice(phenotypes, 5000)
+
+        risk_codes, severity_scores, confidences = self.engine.assess_risk_batch(
+            self.codebook.encode_genes(gene_names),
+            self.codebook.encode_drugs(drug_names),
+            self.codebook.encode_phenotypes(phenotype_names),
+        )
+        for i in range(len(gene_names)):
+            expected = self.engine.assess_risk(gene_names[i], drug_names[i], phenotype_names[i], [])
+            assert self.codebook.risk_labels[risk_codes[i]] == expected["risk_label"]
+            assert severity_scores[i] == expected["severity_score"]
+            assert confidences[i] == expected["confidence_score"]
+
+    def test_every_table_entry(self):
+        """Each CPIC entry is reachable and inputs broadcast"""
+        codebook = self.codebook
+        risk_codes, _, _ = self.engine.assess_risk_batch(
+            np.arange(len(codebook.genes))[:, None, None],
+            np.arange(len(codebook.drugs))[None, :, None],
+            np.arange(len(codebook.phenotypes))[None, None, :],
+        )
+        for (gene, drug, phenotype), (label, _, _) in self.engine.knowledge.cpic_risk.items():
+            at = (codebook.genes.index(gene), codebook.drugs.index(drug), codebook.phenotypes.index(phenotype))
+            assert codebook.risk_labels[risk_codes[at]] == label
+
+    def test_tensors_are_read_only(self):
+        """Shared lookup tensors cannot be mutated through results"""
+        with pytest.raises(ValueError):
+            self.codebook.risk_codes[0, 0, 0] = 0
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from app.engines.gene_profile import call_gene
+from app.engines.risk_engine import get_engine
+from app.parsers.rsid_index import RsidIndex, configure_rsid_index, read_rsid_table, write_rsid_index
+from app.parsers.vcf_parser import parse_vcf_file
+
+RECORDS = [
+    ("rs9923231", "VKORC1", "-1639A", "decreased"),
+    ("rs3892097", "CYP2D6", "*4", "no function"),
+    ("RS1065852", "CYP2D6", "*10", "decreased"),
+    ("rs3892097", "TPMT", "*9", ""),
+    ("rs12345", "", "", ""),
+    ("rs4000000000", "DPYD", "", "no function"),
+]
+
+UNANNOTATED_VCF = """##fileformat=VCFv4.2
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+22\t100\trs3892097\tA\tG\t60\tPASS\tDP=40
+5\t1000\trs12345\tA\tG\t60\tPASS\t.
+7\t2000\t.\tC\tT\t60\tPASS\tRS=rs4000000000
+3\t3000\trs77\tC\tT\t60\tPASS\t.
+"""
+
+
+class TestRsidIndex:
+    """Test the memory-mapped rsID index"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        configure_rsid_index(None)
+
+    def teardown_method(self):
+        """Leave no index configured for other tests"""
+        configure_rsid_index(None)
+
+    def build(self, tmp_path):
+        path = tmp_path / "rsid.idx"
+        assert write_rsid_index(path, RECORDS) == 5
+        return RsidIndex(path)
+
+    def test_lookup(self, tmp_path):
+        """Annotations are found by binary search; the first record of an rsID wins"""
+        index = self.build(tmp_path)
+        assert len(index) == 5
+        assert index.lookup("rs3892097") == ("CYP2D6", "*4", "no function")
+        assert index.lookup("rs1065852").star == "*10"
+        assert index.lookup("rs12345") == (None, None, None)
+        assert index.lookup("rs4000000000").gene == "DPYD"
+        assert index.lookup("rs1") is None
+        assert index.lookup("chr1_100") is None
+        assert index.gene("RS9923231") == "VKORC1"
+        assert list(index.keys) == sorted(index.keys)
+
+    def test_batch_find(self, tmp_path):
+        """Vectorized lookups report -1 for missing rsIDs"""
+        index = self.build(tmp_path)
+        rows = index.find(np.array([3892097, 5, 9923231, 10 ** 10]))
+        assert rows[1] == -1 and rows[3] == -1
+        assert index.genes[index.gene_codes[rows[0]]] == "CYP2D6"
+        assert index.genes[index.gene_codes[rows[2]]] == "VKORC1"
+
+    def test_invalid_files(self, tmp_path):
+        """Malformed input and foreign files are rejected"""
+        with pytest.raises(ValueError):
+            write_rsid_index(tmp_path / "bad.idx", [("chr1_100", "TPMT", "", "")])
+        other = tmp_path / "other.bin"
+        other.write_bytes(b"x" * 64)
+        with pytest.raises(ValueError):
+            RsidIndex(other)
+
+    def test_read_table(self, tmp_path):
+        """TSV tables may omit trailing columns and use '.' for missing values"""
+        table = tmp_path / "table.tsv"
+        table.write_text("# rsid\tgene\tstar\tfunction\nrs1\tTPMT\n\nrs2\tDPYD\t.\tno function\n")
+        assert list(read_rsid_table(table)) == [("rs1", "TPMT", "", ""), ("rs2", "DPYD", "", "no function")]
+
+    def test_parser_uses_index(self, tmp_path):
+        """Records without GENE= are kept when the index maps their rsID to a target gene"""
+        parsed, success = parse_vcf_file(UNANNOTATED_VCF)
+        assert success
+        assert parsed["variants"] == []
+
+        configure_rsid_index(self.build(tmp_path).path)
+        parsed, success = parse_vcf_file(UNANNOTATED_VCF)
+        assert success
+        assert [(v.rsid, v.gene) for v in parsed["variants"]] == [
+            ("rs3892097", "CYP2D6"),
+            ("rs4000000000", "DPYD"),
+        ]
+
+    def test_gene_call_uses_index_star(self, tmp_path):
+        """Genes without allele definitions take the indexed star allele"""
+        engine = get_engine()
+        variants = [{"gene": "VKORC1", "rsid": "rs9923231"}]
+        assert call_gene("VKORC1", variants, engine)["star_allele"] == "*1"
+
+        configure_rsid_index(self.build(tmp_path).path)
+        assert call_gene("VKORC1", variants, engine)["star_allele"] == "-1639A"
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical work"""
+
+    def setup_method(self):
+        """Setup for each test"""
+        self.flights = SingleFlight()
+        self.executions = 0
+
+    async def work(self, value, delay=0.02):
+        self.executions += 1
+        await asyncio.sleep(delay)
+        return {"value": value}
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Concurrent callers of one key get the same result from one execution"""
+        async def run():
+            return await asyncio.gather(*(self.flights.run("a", lambda: self.work(1)) for _ in range(5)))
+
+        results = asyncio.run(run())
+        assert self.executions == 1
+        assert all(result is results[0] for result in results)
+        stats = self.flights.stats()
+        assert (stats["calls"], stats["executions"], stats["coalesced"], stats["in_flight"]) == (5, 1, 4, 0)
+
+    def test_different_keys_and_later_calls_run_again(self):
+        """Only identical in-flight work is coalesced; nothing is cached"""
+        async def run():
+            await asyncio.gather(self.flights.run("a", lambda: self.work(1)), self.flights.run("b", lambda: self.work(2)))
+            await self.flights.run("a", lambda: self.work(1))
+
+        asyncio.run(run())
+        assert self.executions == 3
+        assert self.flights.stats()["coalesced"] == 0
+
+    def test_errors_are_shared(self):
+        """Every waiting caller sees the work's exception"""
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad upload")
+
+        async def run():
+            return await asyncio.gather(*(self.flights.run("a", fail) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert self.flights.stats()["in_flight"] == 0
+
+    def test_cancelled_caller_does_not_cancel_work(self):
+        """The work keeps running for the other callers when the first one goes away"""
+        async def run():
+            first = asyncio.ensure_future(self.flights.run("a", lambda: self.work(1, delay=0.05)))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(self.flights.run("a", lambda: self.work(1, delay=0.05)))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(run()) == {"value": 1}
+        assert self.executions == 1
@@ -0,0 +1,62 @@
+import pickle
+
+from app.parsers.variant import Variant
+from app.parsers.variant_id import BARE_RS_FLAG, _text_id, rs_key, variant_id, variant_id_of, variant_id_text
+
+
+class TestVariantId:
+    """Test integer variant IDs"""
+
+    def test_rsid(self):
+        """rsIDs map to their rs number whatever the case"""
+        assert rs_key("rs4244285") == 4244285
+        assert variant_id("RS4244285", "10", "94781859") == 4244285
+        assert variant_id(" rs4244285 ", None, None) == 4244285
+        assert variant_id_text(4244285) == "rs4244285"
+
+    def test_non_canonical_rsids(self):
+        """Leading zeros and overflowing numbers are not rs numbers"""
+        assert rs_key("rs0123") is None
+        assert rs_key("rs0") is None
+        assert rs_key("rs" + "9" * 20) is None
+        assert rs_key("chr1_100") is None
+
+    def test_bare_number(self):
+        """A bare RS= number keeps its own ID and reported form"""
+        key = variant_id("4244285", None, None)
+        assert key == 4244285 | BARE_RS_FLAG
+        assert key != rs_key("rs4244285")
+        assert variant_id_text(key) == "4244285"
+
+    def test_position_fallback(self):
+        """Variants without an rsID are identified by CHROM/POS"""
+        key = variant_id(None, "10", "94781859")
+        assert key < 0
+        assert key == variant_id("", "10", "94781859")
+        assert key != variant_id(None, "10", "94781860")
+        assert key != variant_id(None, "X", "94781859")
+        assert variant_id_text(key) == "chr10_94781859"
+
+    def test_odd_text_round_trips(self):
+        """Anything else is encoded whole and reported as given"""
+        for rsid, chrom, pos in (("rs0123", None, None), ("esv3587", None, None), (None, "1", "012"), (None, None, None)):
+            key = variant_id(rsid, chrom, pos)
+            expected = str(rsid).strip() if rsid else f"chr{chrom}_{pos}"
+            assert variant_id_text(key) == expected
+            assert key == variant_id(rsid, chrom, pos)
+
+    def test_ids_need_no_process_state(self):
+        """IDs are computed from the variant alone, so they match across processes"""
+        assert variant_id(None, "1", "012") == _text_id("chr1_012")
+        assert variant_id("esv3587", None, None) == _text_id("esv3587")
+        assert variant_id(None, "chrUn_gl000220", "100") == _text_id("chrchrUn_gl000220_100")
+        assert variant_id_text(variant_id(None, "chrX", "5")) == "chrchrX_5"
+        assert variant_id_text(_text_id("\x00x")) == "\x00x"
+
+    def test_parsed_variant_key(self):
+        """Variants carry their ID, also after pickling"""
+        variant = Variant("10", "94781859", "RS4244285", "G", "A", ".", "PASS", "CYP2C19", "RS4244285", "GENE=CYP2C19")
+        assert variant.key == 4244285
+        assert variant_id_of(variant) == 4244285
+        assert pickle.loads(pickle.dumps(variant)).key == 4244285
+        assert variant_id_of({"rsid": None, "chrom": "10", "pos": "94781859"}) == variant_id(None, "10", "94781859")
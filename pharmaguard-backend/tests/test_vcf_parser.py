@@ -1,5 +1,10 @@
+import io
+import pickle
+
 import pytest
-from app.parsers.vcf_parser import VCFParser, parse_vcf_file
+from app.parsers.genotype import alt_copies, first_sample_gt, gt_code
+from app.parsers.variant import Variant, info_value
+from app.parsers.vcf_parser import VCFParser, parse_vcf_file, parse_vcf_stream
 
 
 class TestVCFParser:
@@ -64,3 +69,159 @@ chr22	42127941	rs1065852	G	A	60	PASS	GENE=CYP2D6;STAR=*4;RS=rs1065852"""
         assert success is True
         assert result['total_variants'] == 1
         assert 'CYP2D6' in result['target_genes_found']
+
+
+class TestStreamingVCFParser:
+    """Test chunked streaming parser"""
+    
+    VCF_CONTENT = """##fileformat=VCFv4.2
+##fileDate=20240219
+#CHROM	POS	ID	REF	ALT	QUAL	FILTER	INFO
+chr1	100	rs123	G	A	60	PASS	GENE=UNKNOWN;STAR=*1;RS=rs123
+chr22	42127941	rs1065852	G	A	60	PASS	GENE=CYP2D6;STAR=*4;RS=rs1065852
+chr10	96621094	rs2687119	G	C	60	PASS	GENE=CYP2C19;STAR=*2;RS=rs2687119
+"""
+    
+    def test_matches_in_memory_parser(self):
+        """Test stream parsing gives the same result as parse_vcf"""
+        expected = VCFParser().parse_vcf(self.VCF_CONTENT)
+        result, success = parse_vcf_stream(io.BytesIO(self.VCF_CONTENT.encode()))
+        
+        assert success is True
+        assert result['variants'] == expected['variants']
+        assert result['metadata'] == {'fileformat': 'VCFv4.2'}
+    
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64])
+    def test_lines_spanning_chunk_boundaries(self, chunk_size):
+        """Test lines split across chunks are reassembled"""
+        stream = io.BytesIO(self.VCF_CONTENT.replace("\n", "\r\n").encode())
+        variants = list(VCFParser().iter_variants(stream, chunk_size=chunk_size))
+        
+        assert [v['rsid'] for v in variants] == ['rs1065852', 'rs2687119']
+        assert variants[1]['info']['RS'] == 'rs2687119'
+    
+    def test_missing_format_declaration(self):
+        """Test structure validation happens during the stream pass"""
+        content = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+        result, success = parse_vcf_stream(io.BytesIO(content.encode()))
+        
+        assert success is False
+        assert result['error'] == "Missing VCF format declaration"
+    
+    def test_empty_stream(self):
+        """Test handling empty upload"""
+        result, success = parse_vcf_stream(io.BytesIO(b""))
+        
+        assert success is False
+        assert result['error'] == "Empty file"
+    
+    def test_invalid_utf8(self):
+        """Test encoding errors are reported"""
+        content = self.VCF_CONTENT.encode() + b"chr1\t1\t.\tA\tG\t.\t.\tGENE=CYP2D6;NOTE=\xff\n"
+        result, success = parse_vcf_stream(io.BytesIO(content), chunk_size=64)
+        
+        assert success is False
+        bad_offset = content.index(b'\xff')
+        assert result['error'] == f"File encoding error: invalid UTF-8 at byte offset {bad_offset}"
+    
+    def test_sample_columns_not_decoded(self):
+        """Test only the fixed columns of kept records are decoded"""
+        content = self.VCF_CONTENT.encode() + b"chr1\t1\t.\tA\tG\t.\t.\tGENE=TPMT\tGT\t\xff\n"
+        result, success = parse_vcf_stream(io.BytesIO(content))
+        
+        assert success is True
+        assert result['variants'][-1]['gene'] == 'TPMT'
+
+
+class TestCoordinateAnnotation:
+    """Test pharmacogene interval index and early line rejection"""
+    
+    HEADER = "##fileformat=VCFv4.2\n{reference}#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+    
+    def parse(self, body, reference="##reference=GRCh38\n"):
+        content = self.HEADER.format(reference=reference) + body
+        result, success = parse_vcf_stream(io.BytesIO(content.encode()))
+        assert success is True
+        return result
+    
+    def test_unannotated_variant_annotated_by_coordinate(self):
+        """Test records inside a locus get the gene from the interval index"""
+        result = self.parse("chr22\t42130692\trs1065852\tG\tA\t60\tPASS\t.\n")
+        
+        assert result['metadata']['genome_build'] == 'GRCh38'
+        assert result['variants'][0]['gene'] == 'CYP2D6'
+        assert result['variants'][0]['rsid'] == 'rs1065852'
+    
+    def test_coordinates_follow_reference_build(self):
+        """Test the same coordinate is off-target on the other build"""
+        body = "22\t42130692\t.\tG\tA\t60\tPASS\t.\n22\t42526694\t.\tG\tA\t60\tPASS\t.\n"
+        
+        grch37 = self.parse(body, reference="##reference=file:///ref/hs37d5.fa\n")
+        assert [v['pos'] for v in grch37['variants']] == ['42526694']
+        
+        unknown = self.parse(body, reference="")
+        assert [v['pos'] for v in unknown['variants']] == ['42130692', '42526694']
+    
+    def test_off_locus_lines_rejected(self):
+        """Test off-target records are dropped, annotated ones are kept"""
+        body = (
+            "chr1\t1000\trs1\tA\tG\t60\tPASS\tGENE=BRCA1\n"
+            "chr1\t2000\trs9923231\tA\tG\t60\tPASS\t.\n"
+            "chr2\t3000\t.\tA\tG\t60\tPASS\tGENE=TPMT;STAR=*3C\n"
+            "chr22\t42130692\t.\tG\tA\t60\tPASS\tGENE=CYP2D6-AS1\n"
+        )
+        result = self.parse(body)
+        
+        assert [(v['pos'], v['gene']) for v in result['variants']] == [('2000', 'VKORC1'), ('3000', 'TPMT')]
+    
+    def test_locus_boundaries(self):
+        """Test interval edges are inclusive and neighbours are rejected"""
+        body = "".join(
+            f"chr22\t{pos}\t.\tG\tA\t60\tPASS\t.\n"
+            for pos in (42124498, 42124499, 42132881, 42132882)
+        )
+        result = self.parse(body)
+        
+        assert [v['pos'] for v in result['variants']] == ['42124499', '42132881']
+
+
+class TestVariantRecord:
+    """Test compact lazily-decoded variant records"""
+    
+    LINE = "chr22\t42127941\trs1065852\tG\tA\t60\tPASS\tDP=12;GENE=CYP2D6;STAR=*4;SOMATIC\tGT\t1/1"
+    
+    def test_dict_compatible_view(self):
+        """Test records read like the legacy per-variant dict"""
+        variant = VCFParser()._parse_variant_line(self.LINE)
+        
+        assert isinstance(variant, Variant)
+        assert variant['gene'] == 'CYP2D6'
+        assert variant.get('star') == '*4'
+        assert variant.get('missing') is None
+        assert variant['info'] == {'DP': '12', 'GENE': 'CYP2D6', 'STAR': '*4', 'SOMATIC': True}
+        assert variant.to_dict()['rsid'] == 'rs1065852'
+        assert set(variant) == {'chrom', 'pos', 'id', 'ref', 'alt', 'qual', 'filter', 'gene', 'star', 'rsid', 'info', 'alt_copies'}
+        assert variant['alt_copies'] == 2
+    
+    def test_first_sample_genotype(self):
+        """Test the first sample's GT is read from the FORMAT columns"""
+        assert first_sample_gt(b"GT:DP\t0/1:30\t1/1:12") == b"0/1"
+        assert first_sample_gt(b"DP:GT\t30:1|1") == b"1|1"
+        assert first_sample_gt(b"DP\t30") is None
+        assert first_sample_gt(b"GT") is None
+        assert [alt_copies(gt_code(gt)) for gt in (b"0/0", b"0|1", b"1/1", b"./.", b"1")] == [0, 1, 2, 0, 1]
+    
+    def test_pickle_round_trip(self):
+        """Test records survive pickling (process pools, caches)"""
+        variant = VCFParser()._parse_variant_line(self.LINE)
+        
+        assert pickle.loads(pickle.dumps(variant)) == variant
+    
+    def test_info_value_lookup(self):
+        """Test single-key INFO lookup respects key boundaries"""
+        info = "XGENE=BRCA1;GENE=TPMT;GENES=x;FLAG"
+        
+        assert info_value(info, "GENE") == "TPMT"
+        assert info_value(info, "FLAG") is True
+        assert info_value(info, "STAR") is None
+        assert info_value(".", "GENE") is None
@@ -0,0 +1,110 @@
+import hashlib
+import io
+
+import pytest
+from app.parsers.scanner import HashingReader, VCFScanner, diagnose_line, scan_vcf_chunks
+from app.parsers.vcf_parser import VCFEncodingError, iter_chunks, parse_vcf_stream
+
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##contig=<ID=chr22,length=50818468>\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tNA12878\tNA12891\n"
+)
+
+RECORDS = (
+    "chr1\t100\t.\tA\tG\t60\tPASS\tDP=30\tGT\t0/1\t0/0\n"
+    "chr22\t42127941\trs1065852\tG\tA\t60\tPASS\tGENE=CYP2D6;STAR=*4;RS=rs1065852\tGT\t0/1\t1/1\n"
+    "chr10\t94781859\trs4244285\tG\tA\t60\tPASS\tRS=rs4244285;DB\tGT\t0/1\t0/1\n"
+)
+
+
+class TestVCFScanner:
+    """Test the single-pass validation and statistics scanner"""
+
+    def setup_method(self):
+        self.content = (HEADER + RECORDS).encode()
+
+    def scan(self, content, chunk_size=64, max_errors=100):
+        return scan_vcf_chunks(iter_chunks(io.BytesIO(content), chunk_size), max_errors)
+
+    def test_valid_file_statistics(self):
+        """Test structure, samples, contigs and counts come from one pass"""
+        summary = self.scan(self.content)
+
+        assert summary['valid'] is True
+        assert summary['errors'] == []
+        assert summary['samples'] == ['NA12878', 'NA12891']
+        assert summary['contigs'] == ['chr22', 'chr1', 'chr10']
+        assert summary['variant_count'] == 3
+        assert summary['target_variant_count'] == 2
+        assert summary['target_genes_found'] == ['CYP2C19', 'CYP2D6']
+
+    def test_parse_result_matches_parser(self):
+        """Test the scan's parse result equals a normal parse"""
+        expected, _ = parse_vcf_stream(io.BytesIO(self.content))
+
+        assert self.scan(self.content)['parse_result'] == expected
+
+    def test_line_diagnostics(self):
+        """Test bad records are reported with their line numbers"""
+        bad = (
+            "chr1\t200\t.\tA\tG\t60\tPASS\tDP=30\tGT\t0/1\n"
+            "chr1\tabc\t.\tA\tG\t60\tPASS\tDP=30\tGT\t0/1\t0/1\n"
+            "chr1\t300\t.\tA\tG\t60\tPASS\tDP=30;;AF=1\tGT\t0/1\t0/1\n"
+        )
+        summary = self.scan(self.content + bad.encode())
+
+        assert summary['valid'] is False
+        assert summary['parse_result'] is None
+        assert [(e['line'], e['code']) for e in summary['errors']] == [
+            (7, 'COLUMN_COUNT'), (8, 'INVALID_POS'), (9, 'MALFORMED_INFO'),
+        ]
+        assert summary['variant_count'] == 6
+
+    def test_comment_and_blank_lines_skipped(self):
+        """Test blank and comment lines in the body are not errors"""
+        summary = self.scan(self.content + b"\n# trailing note\n", chunk_size=1 << 20)
+
+        assert summary['valid'] is True
+        assert summary['variant_count'] == 3
+
+    def test_stops_after_max_errors(self):
+        """Test scanning stops early on a badly broken file"""
+        bad = "chr1\tx\t.\tA\tG\t60\tPASS\t.\tGT\t0/1\t0/1\n" * 10000
+        chunks = iter_chunks(io.BytesIO(self.content + bad.encode()), 1024)
+        summary = VCFScanner(max_errors=5).scan(chunks)
+
+        assert summary['truncated'] is True
+        assert summary['error_count'] == 5
+        assert next(chunks, None) is not None
+
+    def test_structure_error(self):
+        """Test header problems are reported without a line number"""
+        summary = self.scan(b"#CHROM\tPOS\n")
+
+        assert summary['valid'] is False
+        assert summary['errors'] == [
+            {"line": None, "code": "INVALID_STRUCTURE", "message": "Missing VCF format declaration"}
+        ]
+
+    def test_encoding_error_offset(self):
+        """Test invalid UTF-8 in the body raises with its byte offset"""
+        content = self.content + b"chr1\t1\t.\tA\tG\t.\t.\tNOTE=\xff\tGT\t0/1\t0/1\n"
+
+        with pytest.raises(VCFEncodingError) as excinfo:
+            self.scan(content)
+        assert excinfo.value.offset == content.index(b"\xff")
+
+    def test_diagnose_line(self):
+        """Test error classification of single lines"""
+        assert diagnose_line(b"chr1\t1\t.\tA\tG\t.\t.\t\r", 8)[0] == 'MALFORMED_INFO'
+        assert diagnose_line(b"\t1\t.\tA\tG\t.\t.\t.", 8)[0] == 'INVALID_CHROM'
+
+    def test_hashing_reader(self):
+        """Test the scan input is hashed as it is read"""
+        reader = HashingReader(io.BytesIO(self.content))
+        scan_vcf_chunks(iter_chunks(reader, 16))
+
+        assert reader.bytes_read == len(self.content)
+        assert reader.hexdigest() == hashlib.sha256(self.content).hexdigest()
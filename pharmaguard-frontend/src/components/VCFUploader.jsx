@@ -11,6 +11,7 @@ const ERROR_MESSAGES = {
   'ENCODING_ERROR': 'File encoding error. Make sure the file is saved as UTF-8 text.',
   'CONTENT_TOO_SMALL': 'VCF file is too small or contains only whitespace.',
   'INVALID_VCF_STRUCTURE': 'VCF file structure is invalid. Check VCF format compliance.',
+  'INVALID_VCF_RECORDS': 'Some VCF records are malformed. Check the listed lines.',
   'VALIDATION_ERROR': 'An unexpected validation error occurred.',
 };
 
@@ -93,7 +94,10 @@ export default function VCFUploader({ onFileSelect, onValidationStart, onValidat
           valid: false,
           error: errorMessage,
           errorCode: result.errorCode,
-          details: result.details,
+          details: result.details || (result.errors || [])
+            .slice(0, 5)
+            .map((e) => (e.line ? `Line ${e.line}: ${e.message}` : e.message))
+            .join('; '),
         });
       } else if (result.valid === true) {
         setValidationStatus({